@@ -0,0 +1,182 @@
+import re
+import numpy as np
+import pandas as pd
+from DataRetrievalTools.Sketches import HyperLogLog, QuantileSketch, hash_values
+
+FREQ_MAP = {
+    "1m": "1min", "5m": "5min", "15m": "15min", "30m": "30min",
+    "1h": "1h", "2h": "2h", "6h": "6h", "12h": "12h",
+    "1d": "1D"
+}
+
+NUMERIC_OPS = {"sum", "avg", "min", "max", "median"}
+DISTINCT_OPS = {"distinct", "approx_distinct"}
+_PERCENTILE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+
+
+def parse_metric(metric):
+    """Validate one {"op", "column"} metric; returns (op, column, quantile or None)"""
+    op = str(metric.get("op", "")).lower()
+    column = metric.get("column")
+    percentile = _PERCENTILE.match(op)
+    if op == "count":
+        return op, column, None
+    if not (op in NUMERIC_OPS or op in DISTINCT_OPS or percentile):
+        raise ValueError(f"Unknown metric op: {op}")
+    if not column:
+        raise ValueError(f"Metric {op} needs a column")
+    if op == "median":
+        return op, column, 0.5
+    if percentile:
+        return op, column, float(percentile.group(1)) / 100
+    return op, column, None
+
+
+def metric_name(metric):
+    op, column, _ = parse_metric(metric)
+    return f"{op}({column})" if column else op
+
+
+def metric_columns(metrics):
+    return [metric.get("column") for metric in metrics if metric.get("column")]
+
+
+def group_by_columns(group_by):
+    return group_by if isinstance(group_by, list) else [group_by]
+
+
+def group_keys(df, group_by, time_bucket):
+    """Series to group df by, with timestamp_full floored to time_bucket and named time_bucket"""
+    keys = []
+    for column in group_by_columns(group_by):
+        if time_bucket and column == "timestamp_full":
+            keys.append(df['timestamp_full'].dt.floor(FREQ_MAP.get(time_bucket, "1h")).rename("time_bucket"))
+        else:
+            keys.append(df[column])
+    return keys
+
+
+def _group_positions(keys, n_rows):
+    if not keys:
+        return {(): np.arange(n_rows)}
+    grouped = pd.Series(np.arange(n_rows)).groupby([key.reset_index(drop=True) for key in keys], observed=True)
+    return {
+        (name if isinstance(name, tuple) else (name,)): positions
+        for name, positions in grouped.indices.items()
+    }
+
+
+def partial_metrics(df, keys, metrics):
+    """Per-group mergeable states for each metric.
+
+    keys are Series aligned with df (already time-bucketed where needed).
+    Returns {group key tuple: {"rows": n, "states": [state per metric]}}; merge
+    partials from different row sets with merge_partials, then finalize_metrics.
+    """
+    parsed = [parse_metric(metric) for metric in metrics]
+    series = {}
+    numeric = {}
+    for op, column, quantile in parsed:
+        if column is None:
+            continue
+        if column not in df.columns:
+            raise ValueError(f"Column {column} not found")
+        series[column] = df[column].reset_index(drop=True)
+        if op in NUMERIC_OPS or quantile is not None:
+            if not pd.api.types.is_numeric_dtype(df[column]):
+                raise ValueError(f"Metric {op} needs a numeric column, {column} is not")
+            numeric[column] = df[column].to_numpy(dtype=float, na_value=np.nan)
+
+    partials = {}
+    for group, positions in _group_positions(keys, len(df)).items():
+        states = []
+        for op, column, quantile in parsed:
+            if op == "count":
+                count = len(positions) if column is None else int(series[column].iloc[positions].notna().sum())
+                states.append(count)
+            elif op == "distinct":
+                states.append(set(series[column].iloc[positions].dropna().astype(object)))
+            elif op == "approx_distinct":
+                states.append(HyperLogLog().add_hashes(hash_values(series[column].iloc[positions])))
+            elif quantile is not None:
+                states.append(QuantileSketch().add(numeric[column][positions]))
+            else:
+                values = numeric[column][positions]
+                values = values[~np.isnan(values)]
+                states.append({
+                    "sum": float(values.sum()),
+                    "n": len(values),
+                    "min": float(values.min()) if len(values) else None,
+                    "max": float(values.max()) if len(values) else None,
+                })
+        partials[group] = {"rows": len(positions), "states": states}
+    return partials
+
+
+def _merge_state(a, b):
+    if isinstance(a, int):
+        return a + b
+    if isinstance(a, set):
+        return a | b
+    if isinstance(a, (HyperLogLog, QuantileSketch)):
+        return a.merge(b)
+    present = [v for v in (a["min"], b["min"]) if v is not None]
+    highest = [v for v in (a["max"], b["max"]) if v is not None]
+    return {
+        "sum": a["sum"] + b["sum"],
+        "n": a["n"] + b["n"],
+        "min": min(present) if present else None,
+        "max": max(highest) if highest else None,
+    }
+
+
+def merge_partials(left, right):
+    """Combine partial_metrics outputs computed over disjoint row sets"""
+    merged = dict(left)
+    for group, partial in right.items():
+        if group not in merged:
+            merged[group] = partial
+            continue
+        current = merged[group]
+        merged[group] = {
+            "rows": current["rows"] + partial["rows"],
+            "states": [_merge_state(a, b) for a, b in zip(current["states"], partial["states"])],
+        }
+    return merged
+
+
+def _finalize_state(op, quantile, state):
+    if op == "count":
+        return state
+    if op == "distinct":
+        return len(state)
+    if op == "approx_distinct":
+        return state.estimate()
+    if quantile is not None:
+        return state.quantile(quantile)
+    if op == "sum":
+        return state["sum"]
+    if op == "avg":
+        return state["sum"] / state["n"] if state["n"] else None
+    return state[op]
+
+
+def _sort_key(group):
+    return tuple((value is None, "" if value is None else value) for value in group)
+
+
+def finalize_metrics(partials, names, metrics):
+    """Turn merged partials into result rows sorted by group key"""
+    parsed = [parse_metric(metric) for metric in metrics]
+    results = []
+    for group in sorted(partials, key=_sort_key):
+        partial = partials[group]
+        entry = {
+            name: str(value) if isinstance(value, pd.Timestamp) else value
+            for name, value in zip(names, group)
+        }
+        entry["count"] = partial["rows"]
+        for metric, (op, _, quantile), state in zip(metrics, parsed, partial["states"]):
+            entry[metric_name(metric)] = _finalize_state(op, quantile, state)
+        results.append(entry)
+    return results
@@ -0,0 +1,139 @@
+import numpy as np
+
+# Set bits per byte value, used to count rows straight from packed bitmaps.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+
+class BitmapIndex:
+    """Packed row bitmap per distinct value of one low-cardinality column"""
+
+    def __init__(self, n_rows, bitmaps):
+        self.n_rows = n_rows
+        self.bitmaps = bitmaps
+
+    @classmethod
+    def from_column(cls, column):
+        column = column.astype("category")
+        codes = column.cat.codes.to_numpy()
+        bitmaps = {
+            value: np.packbits(codes == code)
+            for code, value in enumerate(column.cat.categories)
+        }
+        return cls(len(column), bitmaps)
+
+    def with_rows_from(self, start, column):
+        """Index keeping these rows before start, with column's values as the rows from start on.
+
+        Only the bytes from start's on are repacked, so appending (start == n_rows)
+        or re-sorting a recent stretch costs in proportion to the rows that changed.
+        """
+        column = column.astype("category")
+        codes = column.cat.codes.to_numpy()
+        code_of = {value: code for code, value in enumerate(column.cat.categories)}
+        whole_bytes = start // 8
+        carried = start - whole_bytes * 8
+        bitmaps = {}
+        for value in self.values() + [v for v in code_of if v not in self.bitmaps]:
+            old = self.bitmaps.get(value)
+            if old is None:
+                old = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            added = codes == code_of[value] if value in code_of else np.zeros(len(codes), dtype=bool)
+            tail = np.concatenate([np.unpackbits(old[whole_bytes:], count=carried).astype(bool), added])
+            bitmaps[value] = np.concatenate([old[:whole_bytes], np.packbits(tail)])
+        return BitmapIndex(start + len(column), bitmaps)
+
+    def values(self):
+        return list(self.bitmaps.keys())
+
+    def lookup(self, value):
+        """Bitmap for value, or None when the value never occurs"""
+        bitmap = self.bitmaps.get(value)
+        if bitmap is None and not isinstance(value, str):
+            bitmap = self.bitmaps.get(str(value))
+        return bitmap
+
+
+class RowSelection:
+    """Set of selected rows inside a contiguous row slice.
+
+    Only the bytes covering the slice are held, so intersecting predicates
+    costs time proportional to the slice rather than the table.
+    """
+
+    def __init__(self, rows):
+        self.start = rows.start
+        self.stop = rows.stop
+        self.byte_start = rows.start // 8
+        byte_stop = (rows.stop + 7) // 8
+        mask = np.zeros((byte_stop - self.byte_start) * 8, dtype=bool)
+        mask[rows.start - self.byte_start * 8:rows.stop - self.byte_start * 8] = True
+        self.bits = np.packbits(mask)
+
+    def intersect_bitmap(self, bitmap):
+        """AND with a full-table packed bitmap (None means no rows match)"""
+        if bitmap is None:
+            self.bits[:] = 0
+        else:
+            self.bits &= bitmap[self.byte_start:self.byte_start + len(self.bits)]
+
+    def intersect_mask(self, mask):
+        """AND with a boolean mask covering exactly the rows of the slice"""
+        padded = np.zeros(len(self.bits) * 8, dtype=bool)
+        offset = self.start - self.byte_start * 8
+        padded[offset:offset + len(mask)] = mask
+        self.bits &= np.packbits(padded)
+
+    def count(self):
+        return popcount(self.bits)
+
+    def count_with(self, bitmap):
+        """Rows that are both selected and set in bitmap, without materializing either"""
+        return popcount(self.bits & bitmap[self.byte_start:self.byte_start + len(self.bits)])
+
+    def row_ids(self, limit=None, offset=0):
+        positions = np.flatnonzero(np.unpackbits(self.bits))
+        positions = positions[offset:] if limit is None else positions[offset:offset + limit]
+        return positions + self.byte_start * 8
+
+
+def build_bitmap_indexes(df, columns):
+    return {
+        column: BitmapIndex.from_column(df[column])
+        for column in columns
+        if column in df.columns
+    }
+
+
+def replace_rows_from(indexes, start, df):
+    """indexes with the rows from start on replaced by df's (see BitmapIndex.with_rows_from)"""
+    return {column: index.with_rows_from(start, df[column]) for column, index in indexes.items()}
+
+
+def save_bitmap_indexes(indexes, path):
+    """Persist bitmap indexes next to a store so opening it doesn't rescan the columns"""
+    arrays = {}
+    for column, index in indexes.items():
+        values = index.values()
+        arrays[f"values_{column}"] = np.array(values, dtype=object)
+        arrays[f"bits_{column}"] = (
+            np.stack([index.bitmaps[value] for value in values])
+            if values else np.zeros((0, (index.n_rows + 7) // 8), dtype=np.uint8)
+        )
+        arrays[f"rows_{column}"] = np.array(index.n_rows)
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+
+
+def load_bitmap_indexes(path):
+    indexes = {}
+    with np.load(path, allow_pickle=True) as data:
+        columns = [name[len("values_"):] for name in data.files if name.startswith("values_")]
+        for column in columns:
+            bits = data[f"bits_{column}"]
+            bitmaps = dict(zip(data[f"values_{column}"].tolist(), bits))
+            indexes[column] = BitmapIndex(int(data[f"rows_{column}"]), bitmaps)
+    return indexes
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, List
+import numpy as np
+from pydantic import PrivateAttr
+from llama_index.core.embeddings import BaseEmbedding
+from DataRetrievalTools.QueryCache import DEFAULT_CACHE_DIR, LRUCache
+from DataRetrievalTools.Metrics import observe, span
+
+POSTINGS_FILE = "postings.sqlite"
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so texts that embed the same share a key"""
+    return re.sub(r"\s+", " ", str(text)).strip().lower()
+
+
+def text_hash(text):
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Vectors keyed on model name + hash of the normalized text.
+
+    Shared by ingestion and query-time embedding: a memory LRU in front of a
+    SQLite table of float32 blobs, so a text is only ever embedded once per model.
+    """
+
+    def __init__(self, model_name, path=None, max_entries=10_000):
+        self.model_name = model_name
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(DEFAULT_CACHE_DIR, "embeddings.sqlite")
+        self.memory = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """{key: vector} for the keys already cached"""
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector
+        with self._lock:
+            for start in range(0, len(missing), 500):
+                batch = missing[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM vectors WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+                    [self.model_name, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self.memory.set(key, vector)
+                    found[key] = vector
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, vectors):
+        for key, vector in vectors.items():
+            self.memory.set(key, vector)
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO vectors (model, key, vector) VALUES (?, ?, ?)",
+                [(self.model_name, key, np.asarray(v, dtype=np.float32).tobytes()) for key, v in vectors.items()],
+            )
+            self._conn.commit()
+
+    def embed(self, texts, embed_fn):
+        """Vectors for texts, calling embed_fn(list of normalized texts) only for unseen ones"""
+        keys = [text_hash(text) for text in texts]
+        vectors = self.get_many(list(dict.fromkeys(keys)))
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in pending:
+                pending[key] = normalize_text(text)
+        if pending:
+            embedded = embed_fn(list(pending.values()))
+            new_vectors = {key: np.asarray(v, dtype=np.float32) for key, v in zip(pending, embedded)}
+            self.set_many(new_vectors)
+            vectors.update(new_vectors)
+        return [vectors[key] for key in keys]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps a LlamaIndex embedding model with an EmbeddingCache.
+
+    inner is either the model or a zero-argument callable returning it (e.g.
+    Lazy.get); a callable is only invoked on the first cache miss, so a warm
+    restart answers cached queries without loading the model at all.
+    """
+
+    _load_inner: Any = PrivateAttr()
+    _cache: Any = PrivateAttr()
+
+    def __init__(self, inner, cache=None, model_name=None, **kwargs):
+        if isinstance(inner, BaseEmbedding):
+            model_name = inner.model_name
+            kwargs.setdefault("embed_batch_size", inner.embed_batch_size)
+            load_inner = lambda: inner
+        elif model_name is None:
+            raise ValueError("model_name is required when inner is a factory")
+        else:
+            load_inner = inner
+        super().__init__(model_name=model_name, **kwargs)
+        self._load_inner = load_inner
+        self._cache = cache or EmbeddingCache(model_name)
+
+    @classmethod
+    def class_name(cls):
+        return "CachedEmbedding"
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @property
+    def inner(self):
+        return self._load_inner()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        with span("query_embedding"):
+            return self._cache.embed([query], lambda texts: [self.inner.get_query_embedding(texts[0])])[0].tolist()
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        started = time.perf_counter()
+        key = text_hash(query)
+        cached = self._cache.get_many([key])
+        if key in cached:
+            observe("query_embedding", time.perf_counter() - started)
+            return cached[key].tolist()
+        # Loading the model can take seconds, and a local model's "async" embedding still runs
+        # on the calling thread; keep both off the event loop.
+        inner = await asyncio.to_thread(self._load_inner)
+        vector = await asyncio.to_thread(inner.get_query_embedding, normalize_text(query))
+        self._cache.set_many({key: np.asarray(vector, dtype=np.float32)})
+        observe("query_embedding_model", time.perf_counter() - started)
+        return list(vector)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [v.tolist() for v in self._cache.embed(texts, lambda pending: self.inner.get_text_embedding_batch(pending))]
+
+
+class PostingsStore:
+    """Source rows behind each deduplicated node: text hash -> (row, timestamp, metadata)"""
+
+    def __init__(self, persist_dir):
+        self.path = os.path.join(persist_dir, POSTINGS_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(persist_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "text_hash TEXT NOT NULL, row_id INTEGER PRIMARY KEY, timestamp TEXT, "
+            "ServiceName TEXT, SeverityText TEXT, process_runtime TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_hash ON postings (text_hash, timestamp)")
+        self._conn.commit()
+
+    def add(self, rows):
+        """rows: iterable of (text_hash, row_id, timestamp, ServiceName, SeverityText, process_runtime)"""
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def summary(self, hashes):
+        """{hash: (occurrences, first timestamp, last timestamp)}"""
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text_hash, COUNT(*), MIN(timestamp), MAX(timestamp) FROM postings "
+                f"WHERE text_hash IN ({','.join('?' * len(hashes))}) GROUP BY text_hash",
+                hashes,
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def distinct_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(DISTINCT text_hash) FROM postings").fetchone()[0]
+
+    def distinct_values(self, column):
+        """Every value seen for ServiceName, SeverityText or process_runtime"""
+        if column not in ("ServiceName", "SeverityText", "process_runtime"):
+            raise ValueError(f"Postings have no column {column}")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT DISTINCT {column} FROM postings")]
+
+    def latest_timestamp(self):
+        with self._lock:
+            return self._conn.execute("SELECT MAX(timestamp) FROM postings").fetchone()[0]
+
+    def rows(self, text_hash, limit=5):
+        """Most recent source rows for one text"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT row_id, timestamp, ServiceName, SeverityText, process_runtime FROM postings "
+                "WHERE text_hash = ? ORDER BY timestamp DESC LIMIT ?",
+                (text_hash, limit),
+            ).fetchall()
+        return [
+            {"row": row[0], "timestamp": row[1], "ServiceName": row[2], "SeverityText": row[3], "process_runtime": row[4]}
+            for row in rows
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM postings")
+            self._conn.commit()
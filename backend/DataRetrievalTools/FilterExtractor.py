@@ -0,0 +1,197 @@
+import re
+from datetime import timedelta
+import pandas as pd
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilter, VectorStoreQuerySpec
+
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "five": 5, "ten": 10, "few": 5, "couple": 2}
+_UNITS = {
+    "second": "seconds", "sec": "seconds", "minute": "minutes", "min": "minutes",
+    "hour": "hours", "hr": "hours", "day": "days",
+}
+_SEVERITY_WORDS = {
+    "error": "ERROR", "errors": "ERROR", "err": "ERROR",
+    "warn": "WARN", "warning": "WARN", "warnings": "WARN", "warns": "WARN",
+    "info": "INFO", "debug": "DEBUG", "fatal": "FATAL", "critical": "FATAL", "trace": "TRACE",
+}
+
+_CLOCK = r"\d{1,2}(?::\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:am|pm)?|\s*(?:am|pm))"
+_DATE = r"\d{4}-\d{2}-\d{2}"
+_MOMENT = rf"(?:{_DATE}[ t]\d{{2}}:\d{{2}}(?::\d{{2}}(?:\.\d+)?)?|{_CLOCK})"
+
+_RELATIVE = re.compile(
+    r"\b(?:in |during |over |within |for )?(?:the )?(?:last|past|previous)\s+"
+    r"(?:(\d+|a|an|one|two|three|five|ten|few|couple)\s+(?:of\s+)?)?"
+    r"(second|sec|minute|min|hour|hr|day)s?\b"
+)
+_BETWEEN = re.compile(rf"\b(?:between|from)\s+({_MOMENT})\s+(?:and|to|until|-)\s+({_MOMENT})")
+_AFTER = re.compile(rf"\b(?:after|since|from)\s+({_MOMENT})")
+_BEFORE = re.compile(rf"\b(?:before|until|till|up to)\s+({_MOMENT})")
+_AT = re.compile(rf"\b(?:at|around)\s+({_MOMENT})")
+_ON_DATE = re.compile(rf"\b(?:on\s+)?({_DATE})\b")
+
+# Words that signal a time or metadata constraint; any left over after extraction means
+# the rules did not understand the query and the LLM should infer the filters.
+_TIME_WORDS = r"today|yesterday|tonight|morning|afternoon|evening|night|noon|midnight"
+_UNRESOLVED_CUES = re.compile(
+    rf"\b(?:{_TIME_WORDS}|ago|recent|recently|earlier|latest|since|between|until|around|o'clock|"
+    r"minutes?|hours?|seconds?|days?|weeks?)\b"
+    # These are ordinary words too ("I am seeing errors", "errors after checkout"), so they
+    # only count next to a time.
+    rf"|\d\s*(?:am|pm)\b|\b(?:before|after|during)\s+(?:\d|(?:the\s+)?(?:last|past|previous)\b|(?:{_TIME_WORDS})\b)"
+)
+_FILLER = re.compile(r"\b(?:from|in|on|for|the|of|or|and|service|services|svc|level|logs?|show|me|find|any|all)\b")
+
+
+def _parse_moment(text, anchor):
+    """A clock time on the anchor's day, or a full date-time"""
+    text = text.strip()
+    try:
+        if re.match(_DATE, text):
+            return pd.Timestamp(text)
+        moment = pd.Timestamp(f"{anchor.date()} {text}")
+    except ValueError:
+        return None
+    return moment
+
+
+def _precision(text):
+    """How long a time literal lasts: '11am' is an hour, '11:05' a minute, '11:05:30' a second"""
+    colons = text.count(":")
+    if colons == 0:
+        return timedelta(hours=1)
+    if colons == 1:
+        return timedelta(minutes=1)
+    return timedelta(seconds=1)
+
+
+def _timestamp_filter(moment, operator):
+    return MetadataFilter(key="timestamp", value=str(moment), operator=operator)
+
+
+class FilterExtractor:
+    """Rule-based stand-in for the auto-retriever's LLM call.
+
+    Resolves time expressions ("last 10 minutes", "between 11:00 and 11:05",
+    "after 10:45", "at 11am", "on 2025-06-08") and service, severity and runtime
+    names from the index's own value dictionaries into a VectorStoreQuerySpec.
+    Relative times are anchored at the newest log in the index, since the logs
+    are historical. extract() returns None when a time or metadata cue is
+    left that the rules could not place, so the caller can fall back to the LLM.
+    """
+
+    def __init__(self, vocabulary, anchor):
+        self.vocabulary = {key: [v for v in values if v and v != "UNAVAILABLE"] for key, values in vocabulary.items()}
+        self.anchor = pd.Timestamp(anchor) if anchor else None
+
+    def _time_filters(self, text):
+        filters = []
+        spans = []
+
+        def take(match):
+            spans.append(match.span())
+
+        if self.anchor is not None:
+            for match in _RELATIVE.finditer(text):
+                amount = match.group(1) or "1"
+                amount = int(amount) if amount.isdigit() else _NUMBER_WORDS[amount]
+                delta = timedelta(**{_UNITS[match.group(2)]: amount})
+                filters.append(_timestamp_filter(self.anchor - delta, FilterOperator.GTE))
+                take(match)
+            for pattern, handler in (
+                (_BETWEEN, self._between), (_AFTER, self._after), (_BEFORE, self._before), (_AT, self._at),
+            ):
+                for match in pattern.finditer(text):
+                    if any(start <= match.start() < end for start, end in spans):
+                        continue
+                    parsed = handler(match)
+                    if parsed is None:
+                        continue
+                    filters.extend(parsed)
+                    take(match)
+        for match in _ON_DATE.finditer(text):
+            if any(start <= match.start() < end for start, end in spans):
+                continue
+            day = pd.Timestamp(match.group(1))
+            filters.append(_timestamp_filter(day, FilterOperator.GTE))
+            filters.append(_timestamp_filter(day + timedelta(days=1), FilterOperator.LT))
+            take(match)
+        return filters, spans
+
+    def _between(self, match):
+        start, end = _parse_moment(match.group(1), self.anchor), _parse_moment(match.group(2), self.anchor)
+        if start is None or end is None:
+            return None
+        return [
+            _timestamp_filter(start, FilterOperator.GTE),
+            _timestamp_filter(end + _precision(match.group(2)), FilterOperator.LT),
+        ]
+
+    def _after(self, match):
+        moment = _parse_moment(match.group(1), self.anchor)
+        return None if moment is None else [_timestamp_filter(moment, FilterOperator.GTE)]
+
+    def _before(self, match):
+        moment = _parse_moment(match.group(1), self.anchor)
+        return None if moment is None else [_timestamp_filter(moment, FilterOperator.LT)]
+
+    def _at(self, match):
+        moment = _parse_moment(match.group(1), self.anchor)
+        if moment is None:
+            return None
+        return [
+            _timestamp_filter(moment, FilterOperator.GTE),
+            _timestamp_filter(moment + _precision(match.group(1)), FilterOperator.LT),
+        ]
+
+    def _value_filters(self, text):
+        filters = []
+        spans = []
+        for key in ("ServiceName", "process_runtime"):
+            matched = []
+            for value in sorted(self.vocabulary.get(key, []), key=len, reverse=True):
+                name = re.escape(value.lower())
+                # Short names like "ad" are ordinary words too; only take them next to "service".
+                pattern = (rf"(?<!\w){name}(?!\w)" if len(value) >= 4
+                           else rf"(?<!\w){name}\s+(?:service|svc)\b|\bservice\s+{name}(?!\w)")
+                for match in re.finditer(pattern, text):
+                    if not any(start <= match.start() < end for start, end in spans):
+                        matched.append(value)
+                        spans.append(match.span())
+            if matched:
+                matched = list(dict.fromkeys(matched))
+                filters.append(
+                    MetadataFilter(key=key, value=matched[0]) if len(matched) == 1
+                    else MetadataFilter(key=key, value=matched, operator=FilterOperator.IN)
+                )
+
+        levels = {value.upper(): value for value in self.vocabulary.get("SeverityText", [])}
+        severities = []
+        for match in re.finditer(r"\b[a-z]+\b", text):
+            level = _SEVERITY_WORDS.get(match.group(0))
+            # A level the logs never use (e.g. "errors" when there is no ERROR) stays a semantic term.
+            if level in levels:
+                severities.append(levels[level])
+                spans.append(match.span())
+        if severities:
+            severities = list(dict.fromkeys(severities))
+            filters.append(
+                MetadataFilter(key="SeverityText", value=severities[0]) if len(severities) == 1
+                else MetadataFilter(key="SeverityText", value=severities, operator=FilterOperator.IN)
+            )
+        return filters, spans
+
+    def extract(self, prompt):
+        """VectorStoreQuerySpec for prompt, or None if the rules can't resolve it"""
+        text = re.sub(r"\s+", " ", str(prompt)).strip().lower()
+        time_filters, time_spans = self._time_filters(text)
+        value_filters, value_spans = self._value_filters(text)
+
+        remaining = text
+        for start, end in sorted(time_spans + value_spans, reverse=True):
+            remaining = remaining[:start] + " " + remaining[end:]
+        if _UNRESOLVED_CUES.search(remaining):
+            return None
+
+        # An empty query means the prompt was all filters; the caller searches with the prompt itself.
+        query = re.sub(r"\s+", " ", _FILLER.sub(" ", remaining)).strip(" ,.?!")
+        return VectorStoreQuerySpec(query=query, filters=time_filters + value_filters)
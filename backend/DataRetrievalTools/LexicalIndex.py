@@ -0,0 +1,124 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+LEXICAL_FILE = "lexical.sqlite"
+
+_TOKEN = re.compile(r"\w[\w.\-:/@]*")
+_PART = re.compile(r"[.\-:/@]+")
+
+
+def tokenize(text):
+    """Lowercased tokens that keep identifiers whole (pod names, order ids, dotted class
+    names) and also emit their parts, so both "ad-7f9c" and "ad" match"""
+    tokens = []
+    for token in _TOKEN.findall(str(text).lower()):
+        token = token.rstrip(".-:/@")
+        tokens.append(token)
+        parts = [part for part in _PART.split(token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 inverted index over nodes, stored in SQLite next to the vector index.
+
+    terms holds (term, doc, tf) postings and docs holds each node's length.
+    Adding is idempotent: a term's tf for a doc is set, never incremented, so
+    re-ingesting rows after an interrupted run does not skew scores. A lookup
+    only reads the postings of the query's terms.
+    """
+
+    def __init__(self, persist_dir, k1=1.2, b=0.75):
+        self.path = os.path.join(persist_dir, LEXICAL_FILE)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._stats = None
+        self._stats_version = None
+        os.makedirs(persist_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS terms ("
+            "term TEXT NOT NULL, doc TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS terms_doc ON terms (doc)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc TEXT PRIMARY KEY, length INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def add(self, documents):
+        """documents: {doc id: Counter of term -> tf}; terms already on a doc keep the larger tf"""
+        if not documents:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO terms (term, doc, tf) VALUES (?, ?, ?) "
+                "ON CONFLICT (term, doc) DO UPDATE SET tf = MAX(tf, excluded.tf)",
+                [(term, doc, tf) for doc, counts in documents.items() for term, tf in counts.items()],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docs (doc, length) "
+                "SELECT ?, COALESCE(SUM(tf), 0) FROM terms WHERE doc = ?",
+                [(doc, doc) for doc in documents],
+            )
+            self._conn.commit()
+            self._stats = None
+
+    def _corpus_stats(self):
+        # data_version changes when another connection (e.g. the ingester) commits; our own
+        # commits reset _stats directly.
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._stats is None or version != self._stats_version:
+            count, average = self._conn.execute("SELECT COUNT(*), AVG(length) FROM docs").fetchone()
+            self._stats = (count, average or 0.0)
+            self._stats_version = version
+        return self._stats
+
+    def search(self, query, top_k=50):
+        """[(doc id, bm25 score)] best first"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            n_docs, average_length = self._corpus_stats()
+            if not n_docs:
+                return []
+            postings = {
+                term: self._conn.execute("SELECT doc, tf FROM terms WHERE term = ?", (term,)).fetchall()
+                for term in terms
+            }
+            docs = {doc for rows in postings.values() for doc, _ in rows}
+            if not docs:
+                return []
+            lengths = {}
+            doc_list = list(docs)
+            for start in range(0, len(doc_list), 500):
+                batch = doc_list[start:start + 500]
+                lengths.update(self._conn.execute(
+                    f"SELECT doc, length FROM docs WHERE doc IN ({','.join('?' * len(batch))})", batch
+                ).fetchall())
+
+        scores = Counter()
+        for term, rows in postings.items():
+            if not rows:
+                continue
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc, tf in rows:
+                norm = self.k1 * (1 - self.b + self.b * lengths.get(doc, 0) / (average_length or 1))
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores.most_common(top_k)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM terms")
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+            self._stats = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
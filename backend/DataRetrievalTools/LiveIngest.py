@@ -0,0 +1,287 @@
+import glob
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+import pandas as pd
+from DataRetrievalTools.LogStore import (
+    CATEGORICAL_COLUMNS, COLUMN_NAMES, HEAVY_COLUMNS, LogStore, convert_log_frame, csv_fingerprint
+)
+from DataRetrievalTools.Metrics import observe, span
+from DataRetrievalTools.Startup import log
+
+# Live tailing: with LIVE_TAIL_PATH set to a log file (CSV or JSONL) or a directory of them,
+# rows appended there become queryable within a poll or two, without restarting anything.
+# Each batch makes a new log store snapshot / vector index reader that is swapped in whole,
+# so queries already running finish on the snapshot they started with.
+LIVE_TAIL_PATH = os.getenv("LIVE_TAIL_PATH", "")
+LIVE_POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", "1"))
+LIVE_BATCH_MAX_ROWS = int(os.getenv("LIVE_BATCH_MAX_ROWS", "20000"))
+# Appended rows keep their heavy columns in memory until a checkpoint writes the store back
+# out and maps it again, which bounds the memory that sustained ingest can take.
+LIVE_CHECKPOINT_ROWS = int(os.getenv("LIVE_CHECKPOINT_ROWS", "200000"))
+LIVE_CHECKPOINT_SECONDS = float(os.getenv("LIVE_CHECKPOINT_SECONDS", "300"))
+TAIL_PATTERNS = ("*.csv", "*.jsonl")
+READ_BLOCK = 1 << 20
+READ_LIMIT = 64 << 20
+
+Batch = namedtuple("Batch", ["path", "rows", "end", "mtime"])
+
+
+def _nth_newline(block, n):
+    """Index of the nth newline in block, or None if it has fewer"""
+    position = -1
+    for _ in range(n):
+        position = block.find(b"\n", position + 1)
+        if position < 0:
+            return None
+    return position
+
+
+def line_offset(path, lines):
+    """Byte offset just past the first lines lines of path (its size if it has fewer)"""
+    offset = 0
+    with open(path, "rb") as f:
+        while lines:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            count = block.count(b"\n")
+            if count >= lines:
+                return offset + _nth_newline(block, lines) + 1
+            lines -= count
+            offset += len(block)
+    return offset
+
+
+def parse_rows(path, data):
+    """Raw rows, in the CSV's columns and before convert_log_frame, from complete lines of a CSV or JSONL file"""
+    categories = {c: "category" for c in CATEGORICAL_COLUMNS}
+    if not path.endswith(".jsonl"):
+        return pd.read_csv(io.BytesIO(data), names=COLUMN_NAMES, dtype=categories)
+    frame = pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False)
+    for column in HEAVY_COLUMNS:
+        # JSONL producers may write the blobs as objects rather than JSON strings.
+        if column in frame.columns:
+            frame[column] = frame[column].map(lambda v: json.dumps(v) if isinstance(v, (dict, list)) else v)
+    return frame.reindex(columns=COLUMN_NAMES).astype(categories)
+
+
+class TailReader:
+    """Complete rows appended to a CSV or JSONL file, or to the *.csv/*.jsonl files of a directory.
+
+    positions maps each file to the rows already taken from it. The matching
+    byte offset is found once by counting lines, then followed as the file
+    grows; like the ingest's row offsets, this assumes one row per line. A
+    line still missing its newline waits for the next poll.
+    """
+
+    def __init__(self, path, positions):
+        self.path = os.path.abspath(path)
+        self.positions = dict(positions)
+        self._offsets = {}
+
+    def files(self):
+        if os.path.isdir(self.path):
+            return sorted(path for pattern in TAIL_PATTERNS for path in glob.glob(os.path.join(self.path, pattern)))
+        return [self.path] if os.path.exists(self.path) else []
+
+    def offset(self, path):
+        if path not in self._offsets:
+            self._offsets[path] = line_offset(path, self.positions.get(path, 0))
+        return self._offsets[path]
+
+    def read(self, max_rows):
+        """A Batch of at most max_rows new rows per file that has grown"""
+        batches = []
+        for path in self.files():
+            offset = self.offset(path)
+            stat = os.stat(path)
+            if stat.st_size < offset:
+                log(f"[live] {path} is shorter than what was already read; following it from the start")
+                self.positions[path] = 0
+                self._offsets[path] = offset = 0
+            if stat.st_size == offset:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(min(stat.st_size - offset, READ_LIMIT))
+            end = _nth_newline(data, max_rows)
+            if end is None:
+                end = data.rfind(b"\n")
+            if end < 0:
+                continue
+            data = data[:end + 1]
+            try:
+                rows = parse_rows(path, data)
+            except (ValueError, pd.errors.ParserError) as e:
+                # Skipped rather than retried: the same bytes would fail again on every poll.
+                lines = data.count(b"\n")
+                log(f"[live] skipping {lines} unreadable lines of {path}: {e}")
+                self.positions[path] = self.positions.get(path, 0) + lines
+                self._offsets[path] = offset + len(data)
+                continue
+            batches.append(Batch(path, rows, offset + len(data), stat.st_mtime))
+        return batches
+
+    def commit(self, batch):
+        """Mark batch's rows as consumed; until then the next read returns them again"""
+        self.positions[batch.path] = self.positions.get(batch.path, 0) + len(batch.rows)
+        self._offsets[batch.path] = batch.end
+
+
+class StoreFollower:
+    """Appends tailed rows to the query side's LogStore and publishes each new snapshot"""
+
+    name = "log store"
+
+    def __init__(self, lazy_store):
+        self.lazy_store = lazy_store
+        store = lazy_store.get()
+        if not isinstance(store, LogStore):
+            raise ValueError("live tailing needs LOG_STORE_LAYOUT=memory")
+        self.reader = TailReader(LIVE_TAIL_PATH, store.sources)
+        self.unsaved_rows = 0
+        self.saved_at = time.monotonic()
+
+    def step(self):
+        batches = self.reader.read(LIVE_BATCH_MAX_ROWS)
+        store = self.lazy_store.get()
+        for batch in batches:
+            with span("live_store_append"):
+                store = store.appended(convert_log_frame(batch.rows), batch.path)
+            # Published batch by batch, so a failing batch can't strand the ones before it.
+            self.lazy_store.set(store)
+            self.reader.commit(batch)
+            self.unsaved_rows += len(batch.rows)
+            observe("live_store_lag", time.time() - batch.mtime)
+        if self.unsaved_rows and (self.unsaved_rows >= LIVE_CHECKPOINT_ROWS
+                                  or time.monotonic() - self.saved_at >= LIVE_CHECKPOINT_SECONDS):
+            self.checkpoint(store)
+        return sum(len(batch.rows) for batch in batches)
+
+    def checkpoint(self, store):
+        # The snapshot only takes the CSV's current fingerprint when every row of it is in the
+        # store; otherwise the old one stays, and a restart rebuilds rather than trusting it.
+        source = store.fingerprint["source"]
+        fingerprint = None
+        if source in self.reader.files():
+            current = csv_fingerprint(source)
+            if self.reader.offset(source) == current["size"]:
+                fingerprint = current
+        with span("live_store_checkpoint"):
+            self.lazy_store.set(store.checkpoint(fingerprint))
+        self.unsaved_rows = 0
+        self.saved_at = time.monotonic()
+
+
+class IndexFollower:
+    """Embeds tailed rows into the vector index and publishes them to the read-only index queries use.
+
+    Rows are written through an index of its own, so the one queries use is
+    never locked by ingestion. Publishing refreshes that reader in place onto
+    the committed files and warms it; a reader is only opened if none is loaded.
+    """
+
+    name = "vector index"
+
+    def __init__(self):
+        from llama_index.core.settings import Settings
+        from DataRetrievalTools import LlamaSearch
+        from DataRetrievalTools.EmbeddingCache import PostingsStore
+        from DataRetrievalTools.LexicalIndex import LexicalIndex
+        from DataRetrievalTools.VectorStore import VECTOR_STORE_BACKEND
+        from DataRetrievalTools.embeddings import embedder_for, load_state, open_index
+        if VECTOR_STORE_BACKEND != "mmap":
+            raise ValueError("live tailing needs VECTOR_STORE_BACKEND=mmap")
+        self.search = LlamaSearch
+        self.embed_model = Settings.embed_model
+        self.persist_dir = LlamaSearch.INDEX_DIR
+        state = load_state(self.persist_dir) or {"rows_ingested": 0, "last_timestamp": None, "source_size": 0}
+        if state.get("sources") is None:
+            # Written by a batch ingest of one CSV: that is the tailed file, or nothing tailed yet.
+            tail = os.path.abspath(LIVE_TAIL_PATH)
+            state["sources"] = {tail: state["rows_ingested"]} if os.path.isfile(tail) else {}
+        self.state = state
+        self.reader = TailReader(LIVE_TAIL_PATH, state["sources"])
+        self.index = open_index(self.persist_dir, embed_model=self.embed_model)
+        self.postings = PostingsStore(self.persist_dir)
+        self.lexical = LexicalIndex(self.persist_dir)
+        self.cache, self.embed, _ = embedder_for(self.embed_model)
+        self.unpublished_since = None
+
+    def step(self):
+        from DataRetrievalTools.VectorStore import open_vector_index
+        from DataRetrievalTools.embeddings import advance_state, index_chunk, save_state
+        batches = self.reader.read(LIVE_BATCH_MAX_ROWS)
+        for batch in batches:
+            with span("live_index_append"):
+                index_chunk(batch.rows, self.state["rows_ingested"], self.index, self.postings, self.lexical,
+                            self.cache, self.embed)
+            self.state = advance_state(self.state, batch.rows, batch.path)
+            save_state(self.persist_dir, self.state)
+            self.reader.commit(batch)
+            self.unpublished_since = min(filter(None, [self.unpublished_since, batch.mtime]))
+        if self.unpublished_since is not None:
+            with span("live_index_publish"):
+                if self.search.vector_index.ready:
+                    # One reader for the life of the process: refreshing keeps its connections
+                    # and maps instead of leaking a new store on every publish.
+                    store = self.search.vector_index.get().vector_store
+                    store.refresh()
+                    store.warm()
+                else:
+                    index = open_vector_index(self.persist_dir, embed_model=self.embed_model, read_only=True)
+                    index.vector_store.warm()
+                    self.search.vector_index.set(index)
+                    # The auto-retriever holds the index it was built with.
+                    self.search.auto_retriever.reset()
+            observe("live_index_lag", time.time() - self.unpublished_since)
+            self.unpublished_since = None
+        return sum(len(batch.rows) for batch in batches)
+
+
+_stop = threading.Event()
+
+
+def follow(make_followers, stop=_stop):
+    """Poll every follower until stop is set; sleeps only when a round found nothing new"""
+    followers = []
+    for make in make_followers:
+        try:
+            followers.append(make())
+        except Exception as e:
+            log(f"[live] not following {LIVE_TAIL_PATH}: {e}")
+    while followers and not stop.is_set():
+        added = 0
+        for follower in followers:
+            try:
+                added += follower.step()
+            except Exception as e:
+                # Rows stay uncommitted, so the next round retries them.
+                log(f"[live] {follower.name} ingest failed: {e}")
+        if not added:
+            stop.wait(LIVE_POLL_SECONDS)
+
+
+def start_live_ingest(store=False, index=False):
+    """Follow LIVE_TAIL_PATH into the log store and/or vector index on a daemon thread, if it is set"""
+    if not LIVE_TAIL_PATH:
+        return None
+    make_followers = []
+    if store:
+        from DataRetrievalTools.QuerySearch import log_store
+        make_followers.append(lambda: StoreFollower(log_store))
+    if index:
+        make_followers.append(IndexFollower)
+    _stop.clear()
+    thread = threading.Thread(target=follow, args=(make_followers,), name="live-ingest", daemon=True)
+    thread.start()
+    log(f"[live] following {LIVE_TAIL_PATH}")
+    return thread
+
+
+def stop_live_ingest():
+    _stop.set()
@@ -1,31 +1,53 @@
 
-import numpy as np
-from openai import OpenAI
 import pandas as pd  
+import asyncio
 import os
 import json
 from dotenv import load_dotenv
-from llama_index.core import StorageContext, load_index_from_storage
-from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.settings import Settings
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core.vector_stores.types import MetadataFilters, MetadataFilter, FilterCondition
-from llama_index.llms.openai import OpenAI
-from llama_index.core.tools import QueryEngineTool, ToolMetadata
-from llama_index.core.query_engine import SubQuestionQueryEngine
-from llama_index.core.retrievers import VectorIndexAutoRetriever
+from llama_index.core.vector_stores.types import MetadataFilters
+from llama_index.core.retrievers import VectorIndexAutoRetriever, VectorIndexRetriever
+from llama_index.core.schema import QueryBundle
 from llama_index.core.vector_stores.types import MetadataInfo, VectorStoreInfo
+from DataRetrievalTools.LLMClients import shared_async_http_client
+from DataRetrievalTools.EmbeddingCache import CachedEmbedding, PostingsStore
+from DataRetrievalTools.VectorStore import VECTOR_STORE_BACKEND, default_index_dir, open_vector_index
+from DataRetrievalTools.FilterExtractor import FilterExtractor
+from DataRetrievalTools.QueryCache import LRUCache, SingleFlight, normalize_prompt
+from DataRetrievalTools.Startup import Lazy, log
+from DataRetrievalTools.Metrics import span
 
 
 load_dotenv()
 
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
 
-Settings.llm = OpenAI(model="gpt-4o", api_key=os.getenv("API_KEY"))
 
-Settings.embed_model = HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2")
+def _load_llm():
+    from llama_index.llms.openai import OpenAI
+    return OpenAI(model="gpt-4o", api_key=os.getenv("API_KEY"), async_http_client=shared_async_http_client())
 
-storage_context = StorageContext.from_defaults(persist_dir="DataRetrievalTools/LlamaIndex/index_storage")
-index = load_index_from_storage(storage_context)
+
+def _load_embedding_model():
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    return HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+
+
+# Nothing heavy happens at import: the model, LLM client and index load on first use,
+# or earlier when the server prewarms them in the background.
+llm = Lazy("llm", _load_llm)
+embedding_model = Lazy("embedding_model", _load_embedding_model)
+
+# Same cache as ingestion, so repeated queries skip the model entirely (and never load it).
+Settings.embed_model = CachedEmbedding(embedding_model.get, model_name=EMBED_MODEL_NAME)
+
+# VECTOR_STORE_BACKEND picks the memory-mapped IVF store (default) or the JSON SimpleVectorStore.
+INDEX_DIR = default_index_dir()
+vector_index = Lazy(
+    "vector_index", lambda: open_vector_index(INDEX_DIR, embed_model=Settings.embed_model, read_only=True)
+)
+# Each node is one distinct log text; postings map it back to every source row.
+postings = PostingsStore(INDEX_DIR)
 
 vector_store_info = VectorStoreInfo(
     content_info="System logs containing embedded information about severity levels (WARN, INFO), service names (Accounting, Ad), process runtimes (OpenJDK Runtime Environment, .NET), and detailed log messages. Content includes semantic information about high CPU load, ad requests, order details, etc.",
@@ -33,37 +55,101 @@ vector_store_info = VectorStoreInfo(
         MetadataInfo(
             name="timestamp",
             type="str",
-            description="Timestamp in format 'YYYY-MM-DD HH:MM:SS.nnnnnnnnn' (with nanoseconds). Example: '2025-06-08 11:31:41.222813500'. All logs are from June 8th, 2025. Use this for time-based filtering."
+            description="Timestamp in format 'YYYY-MM-DD HH:MM:SS.nnnnnnnnn' (with nanoseconds). Example: '2025-06-08 11:31:41.222813500'. All logs are from June 8th, 2025. Use this for time-based filtering: a range on timestamp (>=, <=, >, <) matches log texts with any occurrence inside the range."
+        ),
+        MetadataInfo(
+            name="ServiceName",
+            type="str",
+            description="Service that emitted the log, e.g. 'ad' or 'accounting'. Filter with == or in."
+        ),
+        MetadataInfo(
+            name="SeverityText",
+            type="str",
+            description="Log level, e.g. 'INFO', 'WARN' or 'ERROR'. Filter with == or in."
+        ),
+        MetadataInfo(
+            name="process_runtime",
+            type="str",
+            description="Process runtime name, e.g. '.NET' or 'OpenJDK Runtime Environment'."
+        ),
+        MetadataInfo(
+            name="first_timestamp",
+            type="str",
+            description="Timestamp of the earliest occurrence of this log text, same format as timestamp."
+        ),
+        MetadataInfo(
+            name="occurrences",
+            type="int",
+            description="How many log rows share this exact text."
         ),
-        
     ],
 )
 
-retriever = VectorIndexAutoRetriever(
-    index,
-    retriever_mode="hybrid",
+SIMILARITY_TOP_K = 25
+# Hybrid fuses BM25 with the dense ranking; only the mmap store has a lexical side.
+RETRIEVER_MODE = "hybrid" if VECTOR_STORE_BACKEND == "mmap" else "default"
+
+# Only used when the rules can't resolve a prompt's filters.
+auto_retriever = Lazy("auto_retriever", lambda: VectorIndexAutoRetriever(
+    vector_index.get(),
+    llm=llm.get(),
+    retriever_mode=RETRIEVER_MODE,
     vector_store_info=vector_store_info,
-    similarity_top_k=25,
+    similarity_top_k=SIMILARITY_TOP_K,
     verbose=True 
-    
-)
-query_engine = RetrieverQueryEngine(retriever=retriever)
+))
 
+# Built in this order by the server's background prewarm; the model last, since the
+# embedding cache answers repeated queries without it.
+PREWARM = (vector_index, auto_retriever, embedding_model)
 
-query_engine_tools = [
-    QueryEngineTool(
-        query_engine=query_engine,
-        metadata=ToolMetadata(
-            name="log_search",
-            description="Useful for searching logs for specific messages, services, or timestamps",
-        ),
-    ),
-]
+# Upper bound on concurrent retrievals (some include an auto-retriever LLM call).
+search_semaphore = asyncio.Semaphore(int(os.getenv("SEARCH_MAX_CONCURRENCY", "4")))
+
+# Query string + filters inferred per prompt, by the rules or the LLM.
+spec_cache = LRUCache(max_entries=1024, ttl_seconds=int(os.getenv("SEARCH_SPEC_CACHE_TTL_SECONDS", "3600")))
+_extractor = None
+
+
+def filter_extractor():
+    """FilterExtractor over the index's current value dictionaries, rebuilt when new logs arrive"""
+    global _extractor
+    anchor = postings.latest_timestamp()
+    if _extractor is None or _extractor.anchor != (anchor and pd.Timestamp(anchor)):
+        _extractor = FilterExtractor(
+            {column: postings.distinct_values(column) for column in ("ServiceName", "SeverityText", "process_runtime")},
+            anchor,
+        )
+    return _extractor
+
+
+async def infer_retrieval_spec(prompt):
+    """(VectorStoreQuerySpec, source): rules first, the auto-retriever's LLM call only when they can't resolve it"""
+    extractor = filter_extractor()
+    key = (normalize_prompt(prompt).lower(), str(extractor.anchor))
+    cached = spec_cache.get(key)
+    if cached is not None:
+        return cached[0], "cache"
+    with span("filter_rules"):
+        spec = extractor.extract(prompt)
+    source = "rules"
+    if spec is None:
+        retriever = await auto_retriever.aget()
+        with span("auto_retriever_llm"):
+            spec = await retriever.agenerate_retrieval_spec(QueryBundle(prompt))
+        source = "llm"
+    spec_cache.set(key, (spec, source))
+    return spec, source
+
+
+def retriever_for(index, spec):
+    return VectorIndexRetriever(
+        index,
+        filters=MetadataFilters(filters=list(spec.filters)) if spec.filters else None,
+        similarity_top_k=min(spec.top_k or SIMILARITY_TOP_K, SIMILARITY_TOP_K),
+        vector_store_query_mode=RETRIEVER_MODE,
+    )
 
-full_query_engine = SubQuestionQueryEngine.from_defaults(
-    query_engine_tools=query_engine_tools,
-    use_async=True,
-)
 
 def extract_columns_info(nodes):
     """Extract column names and sample values from search results"""
@@ -81,21 +167,50 @@ def extract_columns_info(nodes):
         for column, values in columns.items()
     }
 
+# Identical searches that arrive together run once and share the result.
+search_flights = SingleFlight()
+
 async def search_logs_llama(prompt: str) -> str:
-    query_result = query_engine.query(prompt)
-    
-    sample_logs = [node.text for node in query_result.source_nodes]
+    return await search_flights.run(normalize_prompt(prompt).lower(), lambda: _search_logs_llama(prompt))
+
+async def _search_logs_llama(prompt: str) -> str:
+    # Only the retrieved nodes are returned, so skip response synthesis and retrieve directly.
+    async with search_semaphore:
+        index = await vector_index.aget()
+        spec, spec_source = await infer_retrieval_spec(prompt)
+        with span("retrieval"):
+            source_nodes = await retriever_for(index, spec).aretrieve(spec.query or prompt)
     
-    columns_info = extract_columns_info(query_result.source_nodes)
+    sample_logs = [node.text for node in source_nodes]
     
+    columns_info = extract_columns_info(source_nodes)
     
+    spans = postings.summary(node.node_id for node in source_nodes)
+    occurrences = [
+        {
+            "text": node.text,
+            "occurrences": spans[node.node_id][0],
+            "first_timestamp": spans[node.node_id][1],
+            "last_timestamp": spans[node.node_id][2],
+            "recent_rows": postings.rows(node.node_id),
+        }
+        for node in source_nodes
+        if node.node_id in spans
+    ]
     
     result = {
         "sample_logs": sample_logs,
         "columns_info": columns_info,
-        "total_found": len(query_result.source_nodes)
+        "occurrences": occurrences,
+        "total_found": len(source_nodes),
+        "total_rows": sum(entry["occurrences"] for entry in occurrences),
+        "query": spec.query,
+        "filters": [
+            {"key": f.key, "operator": f.operator.value, "value": f.value} for f in spec.filters
+        ],
+        "filters_from": spec_source,
     }
-    print(result)
+    log(result)
     
     return json.dumps(result, indent=2)
 
@@ -0,0 +1,99 @@
+import ast
+import json
+import numpy as np
+import pandas as pd
+
+# OpenTelemetry resource attributes from metadata_json promoted to their own categorical columns.
+RESOURCE_ATTRIBUTES = [
+    'service.version', 'host.name', 'host.arch', 'os.type',
+    'k8s.pod.name', 'k8s.node.name', 'k8s.namespace.name', 'k8s.deployment.name',
+    'process.runtime.name', 'process.runtime.version', 'telemetry.sdk.language',
+]
+
+# Columns derived from order_result_json. Numeric unless listed in ORDER_CATEGORICAL_COLUMNS.
+ORDER_COLUMNS = [
+    'order.orderId', 'order.currencyCode', 'order.country',
+    'order.shippingCost', 'order.itemCount', 'order.totalQuantity', 'order.itemsCost',
+]
+ORDER_CATEGORICAL_COLUMNS = ['order.currencyCode', 'order.country']
+
+
+def parse_blob(text):
+    """Parse the single-quoted pseudo-JSON used by the log export; {} if it can't be read"""
+    if not isinstance(text, str) or not text:
+        return {}
+    try:
+        return json.loads(text.replace("'", '"'))
+    except json.JSONDecodeError:
+        pass
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def parse_order_result(text):
+    """The order payload inside order_result_json, whose @OrderResult value is itself JSON"""
+    order = parse_blob(text).get('@OrderResult')
+    if isinstance(order, str):
+        try:
+            order = json.loads(order)
+        except json.JSONDecodeError:
+            return {}
+    return order if isinstance(order, dict) else {}
+
+
+def _money(value):
+    if not isinstance(value, dict):
+        return np.nan
+    return float(value.get('units') or 0) + float(value.get('nanos') or 0) / 1e9
+
+
+def _order_fields(order):
+    if not order:
+        return {}
+    items = order.get('items') or []
+    quantities = [(item.get('item') or {}).get('quantity') or 0 for item in items]
+    shipping_cost = order.get('shippingCost') or {}
+    return {
+        'order.orderId': order.get('orderId'),
+        'order.currencyCode': shipping_cost.get('currencyCode'),
+        'order.country': (order.get('shippingAddress') or {}).get('country'),
+        'order.shippingCost': _money(shipping_cost),
+        'order.itemCount': len(items),
+        'order.totalQuantity': sum(quantities),
+        'order.itemsCost': sum(_money(item.get('cost')) * quantity for item, quantity in zip(items, quantities)),
+    }
+
+
+def _expand(series, parse, fields, categorical):
+    """Parse each distinct blob once, then broadcast the fields back to every row by code"""
+    codes, uniques = pd.factorize(series)
+    parsed = [parse(blob) for blob in uniques]
+    columns = {}
+    for field in fields:
+        values = [entry.get(field) for entry in parsed]
+        if field in categorical:
+            per_unique = pd.Categorical(values)
+            row_codes = np.where(codes >= 0, per_unique.codes[codes] if len(values) else -1, -1)
+            columns[field] = pd.Categorical.from_codes(row_codes, categories=per_unique.categories)
+        else:
+            per_unique = np.array(values + [None], dtype=object)
+            columns[field] = per_unique[codes]
+    return pd.DataFrame(columns, index=series.index)
+
+
+def resource_attribute_columns(metadata_json):
+    return _expand(metadata_json, parse_blob, RESOURCE_ATTRIBUTES, set(RESOURCE_ATTRIBUTES))
+
+
+def order_columns(order_result_json):
+    columns = _expand(order_result_json, lambda blob: _order_fields(parse_order_result(blob)),
+                      ORDER_COLUMNS, set(ORDER_CATEGORICAL_COLUMNS))
+    for column in ORDER_COLUMNS:
+        if column == 'order.orderId':
+            columns[column] = columns[column].astype("string")
+        elif column not in ORDER_CATEGORICAL_COLUMNS:
+            columns[column] = pd.to_numeric(columns[column])
+    return columns
@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+from DataRetrievalTools.BitmapIndex import (
+    build_bitmap_indexes, load_bitmap_indexes, replace_rows_from, save_bitmap_indexes
+)
+from DataRetrievalTools.Rollups import RollupCube
+from DataRetrievalTools.LogAttributes import (
+    ORDER_CATEGORICAL_COLUMNS, RESOURCE_ATTRIBUTES, order_columns, resource_attribute_columns
+)
+
+COLUMN_NAMES = [
+    'timestamp_full', 'timestamp_simple', 'unknown1', 'unknown2', 'unknown3',
+    'SeverityText', 'unknown4', 'ServiceName', 'message', 'schema_url', 'metadata_json',
+    'unknown5', 'class_name', 'unknown6', 'unknown7', 'order_result_json'
+]
+
+CATEGORICAL_COLUMNS = ['SeverityText', 'ServiceName', 'class_name', 'schema_url']
+
+# Low-cardinality columns that get a per-value row bitmap for _exact filters.
+BITMAP_COLUMNS = CATEGORICAL_COLUMNS + RESOURCE_ATTRIBUTES + ORDER_CATEGORICAL_COLUMNS
+
+# Multi-KB JSON blobs that are only needed when a row is shown, never for filtering.
+HEAVY_COLUMNS = ['metadata_json', 'order_result_json']
+
+# Bump whenever the on-disk layout changes so stale stores are rebuilt.
+STORE_FORMAT_VERSION = 6
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testlog.csv")
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LogStore")
+
+
+def csv_fingerprint(csv_path):
+    """Cheap identity of the source CSV, used to decide whether the store is stale"""
+    stat = os.stat(csv_path)
+    return {
+        "source": os.path.abspath(csv_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "format": STORE_FORMAT_VERSION,
+    }
+
+
+def convert_log_frame(df):
+    """Give raw CSV rows their real types and add the derived attribute columns"""
+    df['timestamp_full'] = pd.to_datetime(df['timestamp_full'], format="%Y-%m-%d %H:%M:%S.%f")
+    df['timestamp_simple'] = pd.to_datetime(df['timestamp_simple'], format="%Y-%m-%d %H:%M:%S")
+    return pd.concat([
+        df,
+        resource_attribute_columns(df['metadata_json']),
+        order_columns(df['order_result_json']),
+    ], axis=1)
+
+
+def read_log_csv(csv_path):
+    """Read the raw log CSV, convert columns to their real types and sort by time"""
+    df = convert_log_frame(pd.read_csv(csv_path, names=COLUMN_NAMES, dtype={c: "category" for c in CATEGORICAL_COLUMNS}))
+    # Row position doubles as row id, so the sort has to happen before anything is persisted.
+    return df.sort_values('timestamp_full', kind='stable', ignore_index=True)
+
+
+def records_from(rows, heavy_table, columns=None):
+    """Materialize rows of a hot frame as dicts, joining the heavy columns back in.
+
+    rows.index holds the rows' positions in heavy_table. By default the
+    original CSV columns are returned, the JSON blobs as the raw strings from
+    the export. With columns given, only those fields are built (derived
+    attribute columns included) and only the heavy columns among them are
+    read from the memory-mapped table.
+    """
+    all_columns = COLUMN_NAMES
+    if columns:
+        available = COLUMN_NAMES + [c for c in rows.columns if c not in COLUMN_NAMES]
+        all_columns = [c for c in columns if c in available]
+    heavy_columns = [c for c in HEAVY_COLUMNS if c in all_columns]
+
+    full = rows[[c for c in all_columns if c not in heavy_columns]]
+    if heavy_columns:
+        heavy = heavy_table.select(heavy_columns).take(rows.index.to_numpy()).to_pandas()
+        heavy.index = rows.index
+        full = pd.concat([full, heavy], axis=1)
+    full = full[all_columns]
+    for column in ('timestamp_full', 'timestamp_simple'):
+        if column in full.columns:
+            full[column] = full[column].astype(str)
+    return full.to_dict('records')
+
+
+def _concat_frames(head, tail):
+    """head then tail, keeping categorical columns categorical (with the union of their categories)"""
+    columns = {}
+    for column in head.columns:
+        if isinstance(head[column].dtype, pd.CategoricalDtype):
+            parts = [head[column], tail[column].astype("category")]
+            if parts[0].cat.categories.dtype != parts[1].cat.categories.dtype:
+                # A side that is all missing has untyped (empty) categories; take the other side's.
+                empty = 0 if len(parts[0].cat.categories) == 0 else 1
+                parts[empty] = parts[empty].astype(parts[1 - empty].dtype)
+            columns[column] = union_categoricals(parts, ignore_order=True)
+        else:
+            columns[column] = pd.concat([head[column], tail[column]], ignore_index=True)
+    return pd.DataFrame(columns)
+
+
+# Snapshots a paging cursor may come from and still be valid on this one (see LogStore.appended).
+MAX_ANCESTORS = 64
+
+
+def _write_atomic(table_df, path):
+    tmp_path = path + ".tmp"
+    # Uncompressed Arrow IPC so the file can be memory-mapped on load.
+    feather.write_feather(table_df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+class LogStore:
+    """Typed, columnar copy of the log CSV.
+
+    The hot frame holds everything filters and aggregations need. The JSON
+    blobs live in a separate memory-mapped Arrow table and are only read for
+    the rows that are actually returned. Rows are sorted by timestamp_full so
+    time ranges resolve to a contiguous slice.
+
+    A store is never modified once built: live ingestion makes a new snapshot
+    with appended() and swaps it in, so queries already running keep theirs.
+    sources counts the rows taken from each file, which is where tailing resumes.
+    """
+
+    def __init__(self, df, heavy_table, fingerprint, rollup=None, bitmaps=None, sources=None, store_dir=None,
+                 ancestors=()):
+        self.df = df
+        self.heavy_table = heavy_table
+        self.fingerprint = fingerprint
+        self.sources = sources if sources is not None else {fingerprint["source"]: len(df)}
+        self.store_dir = store_dir
+        # Earlier snapshots this one only appended rows to, so their row ids still hold.
+        self.ancestors = ancestors
+        self.timestamps = df['timestamp_full'].to_numpy(dtype='datetime64[ns]').view('int64')
+        self.bitmaps = bitmaps if bitmaps is not None else build_bitmap_indexes(df, BITMAP_COLUMNS)
+        self.rollup = rollup if rollup is not None else RollupCube.from_frame(df, self.timestamps)
+        # Identifies this exact snapshot of the data; result caches are tagged with it.
+        self.version = hashlib.sha1(
+            json.dumps(dict(fingerprint, rows=len(df)), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @classmethod
+    def build(cls, csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_STORE_DIR):
+        """Parse the CSV once and persist the hot and heavy tables"""
+        fingerprint = csv_fingerprint(csv_path)
+        df = read_log_csv(csv_path)
+        cls(df.drop(columns=HEAVY_COLUMNS), pa.Table.from_pandas(df[HEAVY_COLUMNS], preserve_index=False),
+            fingerprint).save(store_dir)
+        return cls.open(store_dir)
+
+    def save(self, store_dir, fingerprint=None):
+        """Persist this snapshot (under fingerprint, if given) so a restart only has to read it back"""
+        fingerprint = fingerprint or self.fingerprint
+        os.makedirs(store_dir, exist_ok=True)
+        _write_atomic(self.df, os.path.join(store_dir, "hot.feather"))
+        _write_atomic(self.heavy_table, os.path.join(store_dir, "heavy.feather"))
+        self.rollup.save(os.path.join(store_dir, "rollup.npz"))
+        # Indexes are part of the snapshot too.
+        save_bitmap_indexes(self.bitmaps, os.path.join(store_dir, "bitmaps.npz"))
+
+        manifest = dict(fingerprint, rows=len(self.df), sources=self.sources)
+        tmp_manifest = os.path.join(store_dir, "manifest.json.tmp")
+        with open(tmp_manifest, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, os.path.join(store_dir, "manifest.json"))
+
+    @classmethod
+    def open(cls, store_dir=DEFAULT_STORE_DIR):
+        """Open a previously built store without touching the CSV"""
+        with open(os.path.join(store_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        df = feather.read_table(os.path.join(store_dir, "hot.feather"), memory_map=True).to_pandas()
+        heavy_table = feather.read_table(os.path.join(store_dir, "heavy.feather"), memory_map=True)
+        fingerprint = {key: manifest[key] for key in ("source", "size", "mtime_ns", "format")}
+        rollup = RollupCube.load(os.path.join(store_dir, "rollup.npz"))
+        bitmaps = load_bitmap_indexes(os.path.join(store_dir, "bitmaps.npz"))
+        return cls(df, heavy_table, fingerprint, rollup, bitmaps, manifest.get("sources"), store_dir)
+
+    @classmethod
+    def load(cls, csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_STORE_DIR):
+        """Open the persisted store, rebuilding it only if the CSV changed"""
+        manifest_path = os.path.join(store_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            current = csv_fingerprint(csv_path)
+            if all(manifest.get(key) == value for key, value in current.items()):
+                return cls.open(store_dir)
+        return cls.build(csv_path, store_dir)
+
+    def appended(self, rows, source):
+        """A new snapshot with rows (typed as by convert_log_frame) from source added.
+
+        Rows at or after the last timestamp go to the end, so row ids, bitmaps
+        and rollup cells carry over and cursors from this snapshot stay valid.
+        Late rows re-sort, and re-index, only the stretch of the table from the
+        first row they land before. The heavy columns of new rows stay in
+        memory until checkpoint() writes them out.
+        """
+        rows = rows.sort_values('timestamp_full', kind='stable', ignore_index=True)
+        hot = rows.drop(columns=HEAVY_COLUMNS)
+        heavy = pa.Table.from_pandas(rows[HEAVY_COLUMNS], preserve_index=False).cast(self.heavy_table.schema)
+        sources = dict(self.sources)
+        sources[source] = sources.get(source, 0) + len(rows)
+        timestamps = rows['timestamp_full'].to_numpy(dtype='datetime64[ns]').view('int64')
+        rollup = self.rollup.merged(RollupCube.from_frame(hot, timestamps))
+
+        first_late = int(np.searchsorted(self.timestamps, timestamps[0], side='right')) if len(rows) else len(self.df)
+        df = _concat_frames(self.df, hot)
+        heavy_table = pa.concat_tables([self.heavy_table, heavy])
+        ancestors = (self.ancestors + (self.version,))[-MAX_ANCESTORS:]
+        if first_late < len(self.df):
+            order = first_late + np.argsort(df['timestamp_full'].to_numpy()[first_late:], kind='stable')
+            df = df.take(np.concatenate([np.arange(first_late), order])).reset_index(drop=True)
+            heavy_table = pa.concat_tables([heavy_table.slice(0, first_late), heavy_table.take(order)])
+            # Row ids from first_late on have moved.
+            ancestors = ()
+        bitmaps = replace_rows_from(self.bitmaps, first_late, df.iloc[first_late:])
+        return LogStore(df, heavy_table, self.fingerprint, rollup, bitmaps, sources, self.store_dir, ancestors)
+
+    def checkpoint(self, fingerprint=None):
+        """Write this snapshot to its store dir and reopen it memory-mapped, moving appended rows out of RAM"""
+        self.save(self.store_dir, fingerprint)
+        store = LogStore.open(self.store_dir)
+        # Same rows under a new fingerprint: cursors from this snapshot still apply.
+        store.ancestors = (self.ancestors + (self.version,))[-MAX_ANCESTORS:]
+        return store
+
+    def time_slice(self, start=None, end=None):
+        """Binary-search an inclusive [start, end] window into a row slice"""
+        lo = 0
+        hi = len(self.timestamps)
+        if start:
+            lo = int(np.searchsorted(self.timestamps, pd.Timestamp(start).value, side='left'))
+        if end:
+            hi = int(np.searchsorted(self.timestamps, pd.Timestamp(end).value, side='right'))
+        return slice(lo, max(lo, hi))
+
+    def time_bounds(self):
+        """(first, last) timestamp_full as ns, or None for an empty store"""
+        if not len(self.timestamps):
+            return None
+        return int(self.timestamps[0]), int(self.timestamps[-1])
+
+    def to_records(self, rows, columns=None):
+        """Materialize rows of the hot frame as dicts (see records_from)"""
+        return records_from(rows, self.heavy_table, columns)
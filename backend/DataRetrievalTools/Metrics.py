@@ -0,0 +1,111 @@
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# The app and the stdio tool servers are separate processes, so metrics use
+# prometheus_client's multiprocess mode: every process writes its samples to
+# files in one directory and the app's /metrics merges them. The servers are
+# launched with a minimal environment, hence a fixed default path that every
+# process derives from this file. This has to be set before prometheus_client
+# is imported anywhere in the process.
+METRICS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "metrics"
+)
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = METRICS_DIR
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Append one JSON line per request/tool call with its spans, e.g. TRACE_DUMP_PATH=traces.jsonl.
+TRACE_DUMP_PATH = os.getenv("TRACE_DUMP_PATH")
+
+STAGE_SECONDS = Histogram(
+    "log_assistant_stage_seconds",
+    "Time spent in each stage of answering a question",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+LLM_TOKENS = Counter(
+    "log_assistant_llm_tokens",
+    "LLM tokens used, by calling stage and prompt/completion",
+    ["stage", "kind"],
+)
+RESULT_BYTES = Histogram(
+    "log_assistant_tool_result_bytes",
+    "Size of the serialized tool results handed to the agent",
+    ["tool"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+)
+TOOL_CALLS = Counter(
+    "log_assistant_tool_calls",
+    "Tool calls made by the agent",
+    ["tool", "status"],
+)
+
+_trace = contextvars.ContextVar("trace", default=None)
+_dump_lock = threading.Lock()
+
+
+def observe(stage, seconds):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    spans = _trace.get()
+    if spans is not None:
+        spans.append({"stage": stage, "ms": round(seconds * 1000, 3)})
+
+
+@contextmanager
+def span(stage):
+    """Time a block as one stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def count_tokens(stage, usage):
+    """Record an OpenAI usage object's prompt and completion tokens"""
+    if usage is None:
+        return
+    LLM_TOKENS.labels(stage, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.labels(stage, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """Time a request as stage name and, with TRACE_DUMP_PATH set, dump it with every
+    span recorded inside it. Nested traces (in-process tools) join the outer one."""
+    if _trace.get() is not None:
+        with span(name):
+            yield
+        return
+    spans = []
+    token = _trace.set(spans)
+    started = time.time()
+    try:
+        with span(name):
+            yield
+    finally:
+        _trace.reset(token)
+        if TRACE_DUMP_PATH:
+            record = {"trace": name, "id": uuid.uuid4().hex, "pid": os.getpid(), "started": started, **attributes, "spans": spans}
+            with _dump_lock, open(TRACE_DUMP_PATH, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def reset_metrics():
+    """Drop samples left by earlier runs; call before any other process starts writing"""
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+        os.remove(path)
+
+
+def render_metrics():
+    """(body, content type) for a Prometheus scrape, merged across all processes"""
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=METRICS_DIR)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,436 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from DataRetrievalTools.Aggregations import (
+    _group_positions, _sort_key, finalize_metrics, group_by_columns, group_keys, merge_partials, metric_columns, partial_metrics
+)
+from DataRetrievalTools.LogStore import (
+    BITMAP_COLUMNS, CATEGORICAL_COLUMNS, COLUMN_NAMES, DEFAULT_CSV_PATH, HEAVY_COLUMNS, LogStore,
+    _write_atomic, convert_log_frame, csv_fingerprint, records_from
+)
+from DataRetrievalTools.Metrics import span
+from DataRetrievalTools.Startup import Lazy
+
+DEFAULT_PARTITION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LogStorePartitions")
+
+# "memory" loads the whole log into one DataFrame. "partitioned" keeps it on disk as
+# time partitions and only scans the partitions a query can match, on a process pool.
+# "auto" partitions CSVs larger than LOG_STORE_PARTITION_THRESHOLD_MB.
+LOG_STORE_LAYOUT = os.getenv("LOG_STORE_LAYOUT", "auto")
+PARTITION_THRESHOLD_BYTES = int(float(os.getenv("LOG_STORE_PARTITION_THRESHOLD_MB", "1024")) * 1024 * 1024)
+PARTITION_SECONDS = int(os.getenv("LOG_STORE_PARTITION_SECONDS", "3600"))
+PARTITION_MAX_ROWS = int(os.getenv("LOG_STORE_PARTITION_MAX_ROWS", "500000"))
+QUERY_WORKERS = int(os.getenv("LOG_STORE_QUERY_WORKERS", str(os.cpu_count() or 2)))
+# Fewer candidate rows than this are scanned in-process; the pool round trip would cost more.
+PARALLEL_MIN_ROWS = int(os.getenv("LOG_STORE_PARALLEL_MIN_ROWS", "200000"))
+# Partitions keep per-value row counts for the bitmap columns with at most this many values.
+STATS_MAX_VALUES = 1000
+CSV_CHUNK_ROWS = 200_000
+
+
+def partition_fingerprint(csv_path):
+    # Partition settings are part of the identity: changing them rebuilds the store.
+    return dict(csv_fingerprint(csv_path), partition_seconds=PARTITION_SECONDS, partition_max_rows=PARTITION_MAX_ROWS)
+
+
+def _timestamps(df):
+    return df['timestamp_full'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _range_ns(filters):
+    timestamp_range = filters.get("timestamp_full_range") or {}
+    start = pd.Timestamp(timestamp_range["start"]).value if timestamp_range.get("start") else None
+    end = pd.Timestamp(timestamp_range["end"]).value if timestamp_range.get("end") else None
+    return start, end
+
+
+def _exact_filters(filters):
+    return [(key[:-len("_exact")], value) for key, value in filters.items() if key.endswith("_exact")]
+
+
+def _stat_count(counts, value):
+    """Rows with value according to a partition's value counts (same str fallback as BitmapIndex.lookup)"""
+    if isinstance(value, str):
+        return counts.get(value, 0)
+    return counts.get(str(value), 0)
+
+
+def partition_stats(df, name, row_offset):
+    timestamps = _timestamps(df)
+    values = {}
+    for column in BITMAP_COLUMNS:
+        if column not in df.columns:
+            continue
+        counts = df[column].value_counts()
+        counts = counts[counts > 0]
+        if len(counts) <= STATS_MAX_VALUES:
+            values[column] = {str(value): int(count) for value, count in counts.items()}
+    return {
+        "name": name,
+        "rows": len(df),
+        "row_offset": row_offset,
+        "min_ts": int(timestamps[0]),
+        "max_ts": int(timestamps[-1]),
+        "values": values,
+    }
+
+
+def write_partition(df, partition_dir):
+    os.makedirs(partition_dir, exist_ok=True)
+    _write_atomic(df.drop(columns=HEAVY_COLUMNS), os.path.join(partition_dir, "hot.feather"))
+    _write_atomic(df[HEAVY_COLUMNS], os.path.join(partition_dir, "heavy.feather"))
+
+
+def read_partition(partition_dir, columns=None):
+    """Hot columns of one partition, memory-mapped; only columns when given"""
+    return feather.read_table(os.path.join(partition_dir, "hot.feather"), columns=columns, memory_map=True).to_pandas()
+
+
+def take_rows(partition_dir, positions):
+    """Hot rows at positions of one partition, indexed by those positions (as records_from expects)"""
+    table = feather.read_table(os.path.join(partition_dir, "hot.feather"), memory_map=True).take(positions)
+    # A page is a few rows; decoding their values beats rebuilding every column's full categories.
+    table = pa.table([
+        column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+        for column in table.columns
+    ], names=table.column_names)
+    return table.to_pandas().set_axis(pd.Index(positions))
+
+
+def partition_mask(df, partition, filters):
+    """Rows of one partition's frame that pass filters, by the same rules as QuerySearch.select_rows"""
+    mask = np.ones(len(df), dtype=bool)
+    start, end = _range_ns(filters)
+    if (start is not None and start > partition["min_ts"]) or (end is not None and end < partition["max_ts"]):
+        # Partitions are sorted by time, so the window is a slice.
+        timestamps = _timestamps(df)
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        hi = len(df) if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        mask[:lo] = False
+        mask[hi:] = False
+    for column, value in _exact_filters(filters):
+        if column not in df.columns:
+            continue
+        values = df[column]
+        matched = (values == value).to_numpy(dtype=bool, na_value=False)
+        if not isinstance(value, str) and isinstance(values.dtype, pd.CategoricalDtype):
+            matched |= (values == str(value)).to_numpy(dtype=bool, na_value=False)
+        mask &= matched
+    return mask
+
+
+def _needed_columns(filters, aggregation, available):
+    needed = ['timestamp_full'] + [column for column, _ in _exact_filters(filters)]
+    if aggregation:
+        if aggregation.get("group_by"):
+            needed += group_by_columns(aggregation["group_by"])
+        needed += metric_columns(aggregation.get("metrics") or [])
+    return [column for column in dict.fromkeys(needed) if column in available]
+
+
+def scan_partition(task):
+    """One partition's share of a query: its matching row count, or mergeable per-group partials.
+
+    Runs in the query pool's worker processes, so it only takes and returns
+    picklable values: (partition dir, partition stats, filters, aggregation,
+    hot column names).
+    """
+    partition_dir, partition, filters, aggregation, available = task
+    df = read_partition(partition_dir, _needed_columns(filters, aggregation, available))
+    mask = partition_mask(df, partition, filters)
+    if not aggregation or (aggregation.get("count") and not aggregation.get("group_by") and not aggregation.get("metrics")):
+        return {"count": int(mask.sum())}
+
+    rows = df[mask]
+    group_by = aggregation.get("group_by")
+    keys = group_keys(rows, group_by, aggregation.get("time_bucket")) if group_by else []
+    if aggregation.get("metrics"):
+        return {"partials": partial_metrics(rows, keys, aggregation["metrics"])}
+    partials = partial_metrics(rows, keys, [])
+    if aggregation.get("count"):
+        return {"partials": partials}
+    # Grouped samples: the first three rows of each group, as global row ids.
+    samples = {
+        group: (rows.index[positions[:3]] + partition["row_offset"]).tolist()
+        for group, positions in _group_positions(keys, len(rows)).items()
+    }
+    return {"partials": partials, "samples": samples}
+
+
+def scan_batch(tasks):
+    # One pool task per batch of partitions, so small partitions don't pay a round trip each.
+    return [scan_partition(task) for task in tasks]
+
+
+def _start_pool():
+    # Not fork: the app has threads (event loop, prewarm) that a forked child would inherit mid-flight.
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=QUERY_WORKERS, mp_context=multiprocessing.get_context(method))
+
+
+query_pool = Lazy("query_pool", _start_pool)
+
+
+class PartitionedLogStore:
+    """The log store as time partitions on disk, for logs larger than memory.
+
+    Each partition holds the rows of one PARTITION_SECONDS window (split further
+    at PARTITION_MAX_ROWS), sorted by time, as memory-mapped hot and heavy Arrow
+    files like LogStore's. The manifest keeps every partition's row offset,
+    min/max timestamp and per-value row counts, so a query first drops the
+    partitions that can't match, answers what it can from the counts, and scans
+    only the rest, in parallel when there is enough to scan. Row ids are global
+    and follow time order, as in LogStore, so paging and cursors work the same.
+    """
+
+    def __init__(self, store_dir, manifest):
+        self.store_dir = store_dir
+        self.partitions = manifest["partitions"]
+        self.columns = manifest["columns"]
+        self.fingerprint = {key: value for key, value in manifest.items() if key not in ("partitions", "columns", "rows")}
+        self.rows = manifest["rows"]
+        # Partitions are only ever rebuilt whole, so no earlier snapshot's cursors carry over.
+        self.ancestors = ()
+        self._offsets = np.array([partition["row_offset"] for partition in self.partitions], dtype=np.int64)
+        self.version = hashlib.sha1(
+            json.dumps(dict(self.fingerprint, rows=self.rows), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @classmethod
+    def build(cls, csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_PARTITION_DIR):
+        """Stream the CSV into time partitions without holding the whole log in memory.
+
+        Chunks are split into per-window staging fragments as they are read;
+        each window is then sorted and cut into partitions. Peak memory is one
+        CSV chunk or one window, whichever is larger.
+        """
+        fingerprint = partition_fingerprint(csv_path)
+        window_ns = PARTITION_SECONDS * 1_000_000_000
+        build_dir = store_dir + ".building"
+        staging_dir = os.path.join(build_dir, "staging")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(staging_dir)
+
+        fragments = {}
+        chunks = pd.read_csv(csv_path, names=COLUMN_NAMES, dtype={c: "category" for c in CATEGORICAL_COLUMNS},
+                             chunksize=CSV_CHUNK_ROWS)
+        for chunk_number, chunk in enumerate(chunks):
+            frame = convert_log_frame(chunk)
+            windows = _timestamps(frame) // window_ns
+            for window, piece in frame.groupby(windows, sort=False):
+                path = os.path.join(staging_dir, f"{window}-{chunk_number:06d}.feather")
+                feather.write_feather(piece.reset_index(drop=True), path, compression="uncompressed")
+                fragments.setdefault(int(window), []).append(path)
+
+        partitions = []
+        columns = None
+        for window in sorted(fragments):
+            df = pd.concat([feather.read_feather(path) for path in fragments[window]], ignore_index=True)
+            # Fragments from different chunks have different categories; concat leaves objects.
+            for column in BITMAP_COLUMNS:
+                if column in df.columns:
+                    df[column] = df[column].astype("category")
+            df = df.sort_values('timestamp_full', kind='stable', ignore_index=True)
+            columns = columns or [c for c in df.columns if c not in HEAVY_COLUMNS]
+            for start in range(0, len(df), PARTITION_MAX_ROWS):
+                part = df.iloc[start:start + PARTITION_MAX_ROWS].reset_index(drop=True)
+                name = f"part-{len(partitions):06d}"
+                write_partition(part, os.path.join(build_dir, name))
+                row_offset = partitions[-1]["row_offset"] + partitions[-1]["rows"] if partitions else 0
+                partitions.append(partition_stats(part, name, row_offset))
+            for path in fragments[window]:
+                os.remove(path)
+        shutil.rmtree(staging_dir)
+
+        manifest = dict(fingerprint, rows=sum(p["rows"] for p in partitions), columns=columns or [], partitions=partitions)
+        with open(os.path.join(build_dir, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        previous_dir = store_dir + ".previous"
+        shutil.rmtree(previous_dir, ignore_errors=True)
+        if os.path.exists(store_dir):
+            os.rename(store_dir, previous_dir)
+        os.rename(build_dir, store_dir)
+        shutil.rmtree(previous_dir, ignore_errors=True)
+        return cls.open(store_dir)
+
+    @classmethod
+    def open(cls, store_dir=DEFAULT_PARTITION_DIR):
+        with open(os.path.join(store_dir, "manifest.json")) as f:
+            return cls(store_dir, json.load(f))
+
+    @classmethod
+    def load(cls, csv_path=DEFAULT_CSV_PATH, store_dir=DEFAULT_PARTITION_DIR):
+        """Open the persisted partitions, rebuilding them only if the CSV or the settings changed"""
+        manifest_path = os.path.join(store_dir, "manifest.json")
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if all(manifest.get(key) == value for key, value in partition_fingerprint(csv_path).items()):
+                return cls(store_dir, manifest)
+        return cls.build(csv_path, store_dir)
+
+    def partition_dir(self, partition):
+        return os.path.join(self.store_dir, partition["name"])
+
+    def time_bounds(self):
+        if not self.partitions:
+            return None
+        return self.partitions[0]["min_ts"], self.partitions[-1]["max_ts"]
+
+    def prune(self, filters):
+        """Partitions whose time span and value counts don't rule out a match"""
+        start, end = _range_ns(filters)
+        exact = _exact_filters(filters)
+        survivors = []
+        for partition in self.partitions:
+            if (start is not None and partition["max_ts"] < start) or (end is not None and partition["min_ts"] > end):
+                continue
+            if any(column in partition["values"] and not _stat_count(partition["values"][column], value)
+                   for column, value in exact):
+                continue
+            survivors.append(partition)
+        return survivors
+
+    def counted_from_stats(self, partition, filters):
+        """The partition's match count when its stats alone give it, else None"""
+        start, end = _range_ns(filters)
+        if (start is not None and start > partition["min_ts"]) or (end is not None and end < partition["max_ts"]):
+            return None
+        exact = [(column, value) for column, value in _exact_filters(filters) if column in self.columns]
+        if not exact:
+            return partition["rows"]
+        if len(exact) == 1 and exact[0][0] in partition["values"]:
+            return _stat_count(partition["values"][exact[0][0]], exact[0][1])
+        return None
+
+    def scan(self, partitions, filters, aggregation=None):
+        """scan_partition over partitions, in partition order, on the pool when worth it"""
+        tasks = [(self.partition_dir(p), p, filters, aggregation, self.columns) for p in partitions]
+        candidate_rows = sum(p["rows"] for p in partitions)
+        if len(tasks) > 1 and QUERY_WORKERS > 1 and candidate_rows >= PARALLEL_MIN_ROWS:
+            size = -(-len(tasks) // (QUERY_WORKERS * 4))
+            batches = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+            return [result for batch in query_pool.get().map(scan_batch, batches) for result in batch]
+        return scan_batch(tasks)
+
+    def count(self, partitions, filters):
+        """Matching rows per partition, from stats where possible and scans for the rest"""
+        counts = [self.counted_from_stats(p, filters) for p in partitions]
+        unknown = [p for p, count in zip(partitions, counts) if count is None]
+        scanned = iter(result["count"] for result in self.scan(unknown, filters))
+        return [count if count is not None else next(scanned) for count in counts]
+
+    def matching_rows(self, partition, filters, skip, take):
+        """Rows skip..skip+take among the partition's matches, indexed by position in the partition"""
+        df = read_partition(self.partition_dir(partition), _needed_columns(filters, None, self.columns))
+        positions = np.flatnonzero(partition_mask(df, partition, filters))[skip:skip + take]
+        return take_rows(self.partition_dir(partition), positions)
+
+    def to_records(self, row_ids, columns=None):
+        """Records for global row ids, read partition by partition, in the order given"""
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        owners = np.searchsorted(self._offsets, row_ids, side='right') - 1
+        records = [None] * len(row_ids)
+        for owner in np.unique(owners):
+            partition = self.partitions[owner]
+            slots = np.flatnonzero(owners == owner)
+            rows = take_rows(self.partition_dir(partition), row_ids[slots] - partition["row_offset"])
+            heavy_table = feather.read_table(os.path.join(self.partition_dir(partition), "heavy.feather"), memory_map=True)
+            for slot, record in zip(slots, records_from(rows, heavy_table, columns)):
+                records[slot] = record
+        return records
+
+
+def apply_filters_partitioned(store, filters, aggregation=None, limit=100, offset=0, columns=None):
+    """QuerySearch.apply_filters for a PartitionedLogStore, with the same results"""
+    with span("prune_partitions"):
+        partitions = store.prune(filters)
+
+    if aggregation:
+        with span("apply_aggregation"):
+            return _aggregate(store, partitions, filters, aggregation, columns)
+
+    with span("materialize_rows"):
+        counts = store.count(partitions, filters)
+        total = sum(counts)
+        logs = []
+        skip = offset
+        for partition, count in zip(partitions, counts):
+            if len(logs) >= limit:
+                break
+            if skip >= count:
+                skip -= count
+                continue
+            rows = store.matching_rows(partition, filters, skip, limit - len(logs))
+            heavy_table = feather.read_table(os.path.join(store.partition_dir(partition), "heavy.feather"), memory_map=True)
+            logs.extend(records_from(rows, heavy_table, columns))
+            skip = 0
+        return {
+            "type": "filtered_logs",
+            "count": total,
+            "offset": offset,
+            "logs": logs,
+            "has_more": offset + limit < total
+        }
+
+
+def _aggregate(store, partitions, filters, aggregation, columns=None):
+    group_by = aggregation.get("group_by")
+    time_bucket = aggregation.get("time_bucket")
+    metrics = aggregation.get("metrics")
+    if not group_by and not metrics:
+        if aggregation.get("count"):
+            return {"type": "aggregation", "count": sum(store.count(partitions, filters))}
+        return {"error": "group_by is required for aggregation"}
+    for column in group_by_columns(group_by) if group_by else []:
+        if column not in store.columns:
+            return {"error": f"Column {column} not found"}
+
+    if metrics and not group_by and not partitions and store.partitions:
+        # Ungrouped metrics still report one row when nothing matches; any partition
+        # scanned under the same filters gives its empty states.
+        partitions = store.partitions[:1]
+    try:
+        results = store.scan(partitions, filters, aggregation)
+    except ValueError as e:
+        return {"error": str(e)}
+    partials = {}
+    samples = {}
+    for result in results:
+        partials = merge_partials(partials, result["partials"])
+        for group, row_ids in result.get("samples", {}).items():
+            # Partitions come in time order, so the earliest rows are kept, as head(3) would.
+            samples[group] = (samples.get(group, []) + row_ids)[:3]
+
+    names = ["time_bucket" if time_bucket and column == "timestamp_full" else column
+             for column in group_by_columns(group_by)] if group_by else []
+    shown_group_by = names if isinstance(group_by, list) else (names[0] if names else None)
+    if metrics:
+        try:
+            return {"type": "metrics", "group_by": shown_group_by, "time_bucket": time_bucket,
+                    "results": finalize_metrics(partials, names, metrics)}
+        except ValueError as e:
+            return {"error": str(e)}
+    results = finalize_metrics(partials, names, [])
+    if aggregation.get("count"):
+        return {"type": "aggregation", "group_by": shown_group_by, "time_bucket": time_bucket, "results": results}
+    for entry, group in zip(results, sorted(partials, key=_sort_key)):
+        entry["sample_logs"] = store.to_records(samples.get(group, []), columns)
+    return {"type": "grouped_logs", "group_by": shown_group_by, "results": results}
+
+
+def open_log_store(csv_path=DEFAULT_CSV_PATH):
+    """The store for csv_path in the LOG_STORE_LAYOUT layout"""
+    layout = LOG_STORE_LAYOUT
+    if layout == "auto":
+        layout = "partitioned" if os.path.getsize(csv_path) > PARTITION_THRESHOLD_BYTES else "memory"
+    if layout == "partitioned":
+        return PartitionedLogStore.load(csv_path)
+    return LogStore.load(csv_path)
@@ -0,0 +1,295 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+# Page size for filtered_logs results when a plan gives no limit, and the hard cap.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional time-to-live per entry"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl_seconds is not None and time.time() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, stored_at=None):
+        with self._lock:
+            self._entries[key] = (value, stored_at if stored_at is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Coalesces concurrent async calls: while a call for a key is running, later
+    callers with the same key await its result instead of starting their own"""
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, fn):
+        """Result of fn() (a coroutine function), shared with any in-flight call for key"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # One caller giving up must not cancel the call for everyone else.
+        return await asyncio.shield(future)
+
+    def _forget(self, key, future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and trailing punctuation so near-identical prompts share a key"""
+    return re.sub(r"\s+", " ", str(prompt)).strip().rstrip("?.!").strip()
+
+
+class PlanCache:
+    """QueryPlans keyed on normalized prompt + context + version.
+
+    version names whatever produced the plans (the planner's model and system
+    prompt), so editing either stops old plans from being served. A memory LRU sits in front of a SQLite table so plans survive server
+    restarts. Both layers honour the same TTL, and the table is trimmed
+    to max_disk_entries by last use.
+    """
+
+    def __init__(self, path=None, max_entries=1024, max_disk_entries=50_000, ttl_seconds=7 * 24 * 3600,
+                 version=None):
+        self.version = version
+        self.path = path or os.getenv("PLAN_CACHE_PATH") or os.path.join(DEFAULT_CACHE_DIR, "plan_cache.sqlite")
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, prompt, context=None):
+        payload = json.dumps(
+            {"prompt": normalize_prompt(prompt), "context": context or None, "version": self.version},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, prompt, context=None):
+        key = self.key(prompt, context)
+        plan = self.memory.get(key)
+        if plan is None:
+            plan = self._get_disk(key)
+        with self._lock:
+            if plan is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return plan
+
+    def _get_disk(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT plan, created_at FROM plans WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE plans SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        plan = json.loads(row[0])
+        self.memory.set(key, plan, stored_at=row[1])
+        return plan
+
+    def set(self, prompt, context, plan):
+        key = self.key(prompt, context)
+        now = time.time()
+        self.memory.set(key, plan, stored_at=now)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (key, plan, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(plan), now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM plans WHERE key IN ("
+                "SELECT key FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            self._conn.execute("DELETE FROM plans")
+            self._conn.commit()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self.memory),
+        }
+
+
+def _normalize_time(value):
+    return pd.Timestamp(value).isoformat() if value else None
+
+
+def _plan_int(value, default):
+    """An LLM-written count: 10, "10" or "10 rows"; default for anything else ("all", None)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    number = re.search(r"\d+", str(value)) if value is not None else None
+    return int(number.group(0)) if number else default
+
+
+def canonical_plan(query_plan):
+    """Rewrite a QueryPlan into one normal form so equivalent plans compare equal.
+
+    Empty filters are dropped, range bounds become ISO timestamps, and
+    aggregation and paging defaults are filled in. A time_bucket is only kept
+    when the plan actually groups by timestamp_full.
+    """
+    filters = {}
+    for key, value in (query_plan.get("filters") or {}).items():
+        if key == "timestamp_full_range":
+            value = value or {}
+            time_range = {
+                bound: _normalize_time(value.get(bound))
+                for bound in ("start", "end")
+                if value.get(bound)
+            }
+            if time_range:
+                filters[key] = time_range
+        elif value is not None:
+            filters[key] = value
+
+    aggregation = query_plan.get("aggregation") or None
+    if aggregation:
+        group_by = aggregation.get("group_by") or None
+        grouped_columns = group_by if isinstance(group_by, list) else [group_by]
+        metrics = [
+            {"op": str(metric.get("op", "")).lower(), "column": metric.get("column")}
+            for metric in aggregation.get("metrics") or []
+            if isinstance(metric, dict)
+        ]
+        aggregation = {
+            "group_by": group_by,
+            "count": bool(aggregation.get("count", False)),
+            "time_bucket": aggregation.get("time_bucket") if "timestamp_full" in grouped_columns else None,
+            "metrics": metrics or None,
+        }
+
+    columns = query_plan.get("columns") or None
+    if isinstance(columns, str):
+        columns = [columns]
+
+    return {
+        "filters": filters,
+        "aggregation": aggregation,
+        "limit": max(1, min(_plan_int(query_plan.get("limit"), DEFAULT_PAGE_SIZE) or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)),
+        "offset": max(0, _plan_int(query_plan.get("offset"), 0)),
+        "columns": columns,
+    }
+
+
+def plan_key(query_plan):
+    """Stable string key for an already canonical plan"""
+    return json.dumps(query_plan, sort_keys=True, default=str)
+
+
+def encode_cursor(query_plan, version):
+    """Opaque token for the next page: the canonical plan with its offset, plus the store version"""
+    payload = json.dumps({"plan": query_plan, "version": version}, sort_keys=True, default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything that isn't one of our cursors"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return payload["plan"], payload["version"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+class ResultCache:
+    """Query results keyed on canonical plan, tagged with the log store version.
+
+    An entry only hits while the store it was computed against is still the
+    current one. Results from older versions never match and age out of the LRU.
+    """
+
+    def __init__(self, max_entries=512):
+        self.memory = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        entry = self.memory.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def set(self, key, version, result):
+        self.memory.set(key, (version, result))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.memory),
+        }
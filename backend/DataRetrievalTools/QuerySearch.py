@@ -1,54 +1,197 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import hashlib
 import json
 import os
 import pandas as pd
 from dotenv import load_dotenv
+from DataRetrievalTools.PartitionedStore import PartitionedLogStore, apply_filters_partitioned, open_log_store
+from DataRetrievalTools.BitmapIndex import RowSelection
+from DataRetrievalTools.Rollups import MINUTE_NS
+from DataRetrievalTools.QueryCache import (
+    DEFAULT_PAGE_SIZE, PlanCache, ResultCache, SingleFlight, canonical_plan, decode_cursor, encode_cursor,
+    normalize_prompt, plan_key
+)
+from DataRetrievalTools.LLMClients import shared_async_http_client
+from DataRetrievalTools.Aggregations import FREQ_MAP, finalize_metrics, group_by_columns, group_keys, metric_columns, partial_metrics
+from DataRetrievalTools.Startup import Lazy, log
+from DataRetrievalTools.Metrics import count_tokens, span
 
 load_dotenv()
 
 
-client = OpenAI(api_key=os.getenv("API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("API_KEY"), http_client=shared_async_http_client())
+
+# Upper bound on concurrent plan-generation calls from this process.
+plan_semaphore = asyncio.Semaphore(int(os.getenv("PLAN_MAX_CONCURRENCY", "8")))
 
 def safe_json_dumps(obj):
     return json.dumps(obj, allow_nan=False)
 
-df = pd.read_csv('/Users/anthonyli/VDBSimSearchDemo/backend/DataRetrievalTools/testlog.csv', names=[
-    'timestamp_full', 'timestamp_simple', 'unknown1', 'unknown2', 'unknown3', 
-    'SeverityText', 'unknown4', 'ServiceName', 'message', 'schema_url', 'metadata_json', 
-    'unknown5', 'class_name', 'unknown6', 'unknown7', 'order_result_json'
-])
+# Opened on first use (or by the server's background prewarm) instead of at import.
+log_store = Lazy("log_store", open_log_store)
 
-def apply_filters(df, filters, aggregation=None):
-    """Apply filters to the dataframe and return results"""
-    filtered_df = df.copy()
-    
-    timestamp_range = filters.get("timestamp_full_range")
-    if timestamp_range:
-        start_time = timestamp_range.get("start")
-        end_time = timestamp_range.get("end")
-        
-        if start_time:
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['timestamp_full']) >= pd.to_datetime(start_time)]
-        
-        if end_time:
-            filtered_df = filtered_df[pd.to_datetime(filtered_df['timestamp_full']) <= pd.to_datetime(end_time)]
+result_cache = ResultCache()
+# Set PLAN_CACHE_DISABLED=1 to always ask the LLM for a fresh plan.
+PLAN_CACHE_DISABLED = os.getenv("PLAN_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+def select_rows(store, filters):
+    """Resolve the time range and _exact predicates to a RowSelection without copying rows"""
+    timestamp_range = filters.get("timestamp_full_range") or {}
+    rows = store.time_slice(timestamp_range.get("start"), timestamp_range.get("end"))
+    selection = RowSelection(rows)
     
     for key, value in filters.items():
         if key.endswith("_exact"):
             column_name = key.replace("_exact", "")
-            if column_name in filtered_df.columns:
-                filtered_df = filtered_df[filtered_df[column_name] == value]
+            if column_name in store.bitmaps:
+                selection.intersect_bitmap(store.bitmaps[column_name].lookup(value))
+            elif column_name in store.df.columns:
+                column = store.df[column_name].iloc[rows]
+                selection.intersect_mask((column == value).to_numpy(dtype=bool, na_value=False))
+    
+    return selection
+
+def apply_filters(store, filters, aggregation=None, limit=DEFAULT_PAGE_SIZE, offset=0, columns=None):
+    """Apply filters to the log store and return results.
+
+    Raw results are paged: only rows offset..offset+limit are materialized,
+    restricted to columns when given.
+    """
+    if isinstance(store, PartitionedLogStore):
+        return apply_filters_partitioned(store, filters, aggregation, limit, offset, columns)
+    
+    with span("select_rows"):
+        selection = select_rows(store, filters)
     
     if aggregation:
-        return apply_aggregation(filtered_df, aggregation)
+        with span("apply_aggregation"):
+            return aggregate_selection(store, selection, filters, aggregation, columns)
+    
+    with span("materialize_rows"):
+        total = selection.count()
+        return {
+            "type": "filtered_logs",
+            "count": total,
+            "offset": offset,
+            "logs": store.to_records(store.df.take(selection.row_ids(limit=limit, offset=offset)), columns),
+            "has_more": offset + limit < total
+        }
+
+def aggregate_selection(store, selection, filters, aggregation, columns=None):
+    """Aggregate the selected rows, from bitmaps or the rollup cube when they can answer"""
+    group_by = aggregation.get("group_by")
+    if aggregation.get("metrics"):
+        needed = [c for c in group_by_columns(group_by) + metric_columns(aggregation["metrics"]) if c]
+        needed = [c for c in dict.fromkeys(needed) if c in store.df.columns]
+        return apply_metrics(store.df[needed].take(selection.row_ids()), aggregation)
+    if aggregation.get("count") and not group_by:
+        return {
+            "type": "aggregation",
+            "count": selection.count()
+        }
+    if aggregation.get("count") and isinstance(group_by, str) and group_by in store.bitmaps:
+        index = store.bitmaps[group_by]
+        results = []
+        for value in index.values():
+            value_count = selection.count_with(index.bitmaps[value])
+            if value_count:
+                results.append({group_by: value, "count": value_count})
+        return {
+            "type": "aggregation",
+            "group_by": group_by,
+            "time_bucket": aggregation.get("time_bucket"),
+            "results": results
+        }
+    rollup = rollup_time_buckets(store, filters, aggregation)
+    if rollup is not None:
+        return rollup
+    return apply_aggregation(store, store.df.take(selection.row_ids()), aggregation, columns)
+
+def _stringify_times(frame):
+    for column in frame.columns:
+        if pd.api.types.is_datetime64_any_dtype(frame[column]):
+            frame[column] = frame[column].map(str)
+    return frame
+
+def rollup_time_buckets(store, filters, aggregation):
+    """Answer a time-bucketed count from the rollup cube, or None if the cube can't express it"""
+    group_columns = group_by_columns(aggregation.get("group_by"))
+    time_bucket = aggregation.get("time_bucket")
+    if not (aggregation.get("count") and time_bucket and group_columns[0] == "timestamp_full"):
+        return None
+    split_by = group_columns[1:]
+    if not store.rollup.can_answer(filters, split_by):
+        return None
+    
+    timestamp_range = filters.get("timestamp_full_range") or {}
+    start_ns = pd.Timestamp(timestamp_range["start"]).value if timestamp_range.get("start") else None
+    end_ns = pd.Timestamp(timestamp_range["end"]).value if timestamp_range.get("end") else None
+    first_minute = None if start_ns is None else -(-start_ns // MINUTE_NS) * MINUTE_NS
+    last_minute = None if end_ns is None else (end_ns + 1) // MINUTE_NS * MINUTE_NS - MINUTE_NS
+    if first_minute is not None and last_minute is not None and first_minute > last_minute:
+        return None
+    
+    step = pd.Timedelta(FREQ_MAP.get(time_bucket, "1h")).value
+    counts = store.rollup.bucket_counts(filters, split_by, step, first_minute, last_minute)
+    
+    # Partial minutes at the window edges are counted from the rows themselves.
+    edges = []
+    if start_ns is not None and start_ns < first_minute:
+        edges.append((start_ns, first_minute - 1))
+    if end_ns is not None and last_minute + MINUTE_NS <= end_ns:
+        edges.append((last_minute + MINUTE_NS, end_ns))
+    for edge_start, edge_end in edges:
+        edge_filters = dict(filters, timestamp_full_range={
+            "start": pd.Timestamp(edge_start), "end": pd.Timestamp(edge_end)
+        })
+        rows = store.df.take(select_rows(store, edge_filters).row_ids())
+        buckets = store.timestamps[rows.index] // step * step
+        edge_counts = rows[split_by].assign(bucket=buckets).groupby(['bucket'] + split_by, observed=True).size()
+        for key, value in edge_counts.items():
+            key = key if isinstance(key, tuple) else (key,)
+            counts[key] = counts.get(key, 0) + int(value)
+    
+    results = []
+    for key in sorted(counts):
+        entry = {"time_bucket": str(pd.Timestamp(key[0]))}
+        entry.update(zip(split_by, key[1:]))
+        entry["count"] = counts[key]
+        results.append(entry)
     
     return {
-        "type": "filtered_logs",
-        "count": len(filtered_df),
-        "logs": filtered_df.to_dict('records')[:100]  
+        "type": "aggregation",
+        "group_by": ["time_bucket"] + split_by if split_by else "time_bucket",
+        "time_bucket": time_bucket,
+        "results": results
     }
 
-def apply_aggregation(df, aggregation):
+def apply_metrics(df, aggregation):
+    """Compute sum/avg/min/max/percentile/distinct metrics, optionally per group"""
+    group_by = aggregation.get("group_by")
+    time_bucket = aggregation.get("time_bucket")
+    group_columns = group_by_columns(group_by) if group_by else []
+    
+    for column in group_columns:
+        if column not in df.columns:
+            return {"error": f"Column {column} not found"}
+    
+    keys = group_keys(df, group_by, time_bucket) if group_by else []
+    names = [key.name for key in keys]
+    try:
+        partials = partial_metrics(df, keys, aggregation["metrics"])
+        results = finalize_metrics(partials, names, aggregation["metrics"])
+    except ValueError as e:
+        return {"error": str(e)}
+    
+    return {
+        "type": "metrics",
+        "group_by": names if isinstance(group_by, list) else (names[0] if names else None),
+        "time_bucket": time_bucket,
+        "results": results
+    }
+
+def apply_aggregation(store, df, aggregation, columns=None):
     """Apply aggregation operations to the dataframe"""
     group_by = aggregation.get("group_by")
     count = aggregation.get("count", False)
@@ -57,38 +200,33 @@ def apply_aggregation(df, aggregation):
     if not group_by:
         return {"error": "group_by is required for aggregation"}
     
-    if group_by not in df.columns:
-        return {"error": f"Column {group_by} not found"}
+    for column in group_by_columns(group_by):
+        if column not in df.columns:
+            return {"error": f"Column {column} not found"}
     
-    if time_bucket and group_by == "timestamp_full":
-        freq_map = {
-            "1m": "1T", "5m": "5T", "15m": "15T", "30m": "30T",
-            "1h": "1H", "2h": "2H", "6h": "6H", "12h": "12H",
-            "1d": "1D"
-        }
-        freq = freq_map.get(time_bucket, "1H")
-        
-        df['timestamp_dt'] = pd.to_datetime(df['timestamp_full'])
-        df['time_bucket'] = df['timestamp_dt'].dt.floor(freq)
-        group_by = "time_bucket"
+    keys = group_keys(df, group_by, time_bucket)
+    names = [key.name for key in keys]
+    group_by = names if isinstance(group_by, list) else names[0]
     
     if count:
-        result = df.groupby(group_by).size().reset_index(name='count')
+        result = df.groupby(keys, observed=True).size().reset_index(name='count')
         return {
             "type": "aggregation",
             "group_by": group_by,
             "time_bucket": time_bucket,
-            "results": result.to_dict('records')
+            "results": _stringify_times(result).to_dict('records')
         }
     else:
-        grouped = df.groupby(group_by)
+        grouped = df.groupby(keys, observed=True)
         result = []
         for name, group in grouped:
-            result.append({
-                group_by: name,
-                "count": len(group),
-                "sample_logs": group.head(3).to_dict('records')
-            })
+            entry = {
+                key: str(value) if isinstance(value, pd.Timestamp) else value
+                for key, value in zip(names, name)
+            }
+            entry["count"] = len(group)
+            entry["sample_logs"] = store.to_records(group.head(3), columns)
+            result.append(entry)
         
         return {
             "type": "grouped_logs",
@@ -96,14 +234,8 @@ def apply_aggregation(df, aggregation):
             "results": result
         }
 
-async def getquery(prompt, context=None):
-    user_prompt = json.dumps(prompt)
-    if context:
-        context_info = f"Discovered patterns: {context}"
-    else:
-        context_info = "No prior context available"
-        
-    system_prompt = f"""
+PLAN_MODEL = "gpt-4o"
+PLAN_SYSTEM_PROMPT = """
 You are a data query generator. Generate a QueryPlan JSON object for filtering and analyzing data.
 
 {context_info}
@@ -125,6 +257,16 @@ Your QueryPlan should have this format:
             }}
         }}
 
+        For counting per time bucket (time_bucket is one of 1m, 5m, 15m, 30m, 1h, 2h, 6h, 12h, 1d),
+        optionally split by ServiceName or SeverityText:
+        {{
+            "aggregation": {{
+                "group_by": ["timestamp_full", "ServiceName"],
+                "time_bucket": "1h",
+                "count": true
+            }}
+        }}
+
         For timestamp filtering:
         {{
             "filters": {{
@@ -139,22 +281,66 @@ Your QueryPlan should have this format:
             }}
         }}
 
+        For numeric and distinct metrics, optionally grouped (ops: sum, avg, min, max, count,
+        median, p50/p90/p95/p99 (approximate), distinct, approx_distinct):
+        {{
+            "aggregation": {{
+                "group_by": "order.currencyCode",
+                "metrics": [
+                    {{ "op": "p95", "column": "order.shippingCost" }},
+                    {{ "op": "approx_distinct", "column": "k8s.pod.name" }}
+                ]
+            }}
+        }}
+
+        Besides the log columns, these flattened attribute columns can be used in _exact filters
+        and group_by: service.version, host.name, host.arch, os.type, k8s.pod.name, k8s.node.name,
+        k8s.namespace.name, k8s.deployment.name, process.runtime.name, process.runtime.version,
+        telemetry.sdk.language, order.orderId, order.currencyCode, order.country.
+        Numeric order columns: order.shippingCost, order.itemCount, order.totalQuantity, order.itemsCost.
+
+        Raw log results are paged. Optionally add a top-level "limit" (default 100, max 1000)
+        and a "columns" list to return only the fields you need:
+        {{
+            "filters": {{
+                "SeverityText_exact": "WARN"
+            }},
+            "limit": 20,
+            "columns": ["timestamp_full", "ServiceName", "message"]
+        }}
+
         Output ONLY the JSON object. No explanations.
         """
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0
-    )
+# Plans cached under an older model or system prompt are never served.
+plan_cache = PlanCache(version=hashlib.sha256(f"{PLAN_MODEL}\n{PLAN_SYSTEM_PROMPT}".encode("utf-8")).hexdigest()[:16])
 
+async def generate_query_plan(prompt, context=None):
+    """Ask the LLM for a QueryPlan; returns {} if the response isn't valid JSON"""
+    user_prompt = json.dumps(prompt)
+    if context:
+        context_info = f"Discovered patterns: {context}"
+    else:
+        context_info = "No prior context available"
+        
+    system_prompt = PLAN_SYSTEM_PROMPT.format(context_info=context_info)
+
+    async with plan_semaphore:
+        with span("plan_generation"):
+            response = await client.chat.completions.create(
+                model=PLAN_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0
+            )
+
+    count_tokens("plan_generation", response.usage)
     response_text = response.choices[0].message.content
     try:
         response_text = response_text.strip()
-        print("LLM Response:", response_text)
+        log("LLM Response:", response_text)
         
         if response_text.startswith("```json"):
             response_text = response_text[len("```json"):].strip()
@@ -163,17 +349,64 @@ Your QueryPlan should have this format:
 
         query_plan = json.loads(response_text)
     except json.JSONDecodeError as e:
-        print("Invalid JSON response:", e)
+        log("Invalid JSON response:", e)
         query_plan = {}
 
+    return query_plan
+
+def run_query_plan(store, query_plan):
+    """Execute a QueryPlan, reusing the result if the same plan already ran on this store version"""
+    plan = canonical_plan(query_plan)
+    key = plan_key(plan)
+    results = result_cache.get(key, store.version)
+    if results is None:
+        with span("apply_filters"):
+            results = apply_filters(
+                store, plan["filters"], plan["aggregation"],
+                limit=plan["limit"], offset=plan["offset"], columns=plan["columns"]
+            )
+        if results.pop("has_more", False):
+            results["next_cursor"] = encode_cursor(dict(plan, offset=plan["offset"] + plan["limit"]), store.version)
+        result_cache.set(key, store.version, results)
+    return results
+
+# Identical calls that arrive together (many people asking the same thing) run once.
+query_flights = SingleFlight()
+
+async def getquery(prompt, context=None, use_cache=True, cursor=None):
+    key = (normalize_prompt(prompt).lower(), json.dumps(context, sort_keys=True, default=str), use_cache, cursor)
+    return await query_flights.run(key, lambda: _getquery(prompt, context, use_cache, cursor))
+
+async def _getquery(prompt, context=None, use_cache=True, cursor=None):
+    store = await log_store.aget()
+    query_plan = None
+    if cursor:
+        # A cursor carries its own plan, so the next page never needs the LLM.
+        try:
+            query_plan, version = decode_cursor(cursor)
+        except ValueError as e:
+            return {"error": str(e)}
+        if version != store.version and version not in store.ancestors:
+            return {"error": "Cursor is from an older version of the logs; run the query again"}
+    elif use_cache and not PLAN_CACHE_DISABLED:
+        query_plan = plan_cache.get(prompt, context)
+        if query_plan is not None:
+            log(f"Plan cache hit: {plan_cache.stats()}")
+    
+    if query_plan is None:
+        query_plan = await generate_query_plan(prompt, context)
+        if query_plan and not PLAN_CACHE_DISABLED:
+            plan_cache.set(prompt, context, query_plan)
+
     filters = query_plan.get("filters", {})
     aggregation = query_plan.get("aggregation")
     
-    print(f"Applying filters: {filters}")
+    log(f"Applying filters: {filters}")
     if aggregation:
-        print(f"Applying aggregation: {aggregation}")
+        log(f"Applying aggregation: {aggregation}")
     
-    results = apply_filters(df, filters, aggregation)
+    # Filtering is CPU-bound; keep it off the event loop so other tool calls can progress.
+    results = await asyncio.to_thread(run_query_plan, store, query_plan)
     
     return results
 
@@ -0,0 +1,124 @@
+import numpy as np
+
+MINUTE_NS = 60 * 1_000_000_000
+
+# Dimensions kept in the cube besides the minute bucket.
+ROLLUP_DIMENSIONS = ['ServiceName', 'SeverityText']
+
+
+class RollupCube:
+    """Row counts per 1-minute bucket x ServiceName x SeverityText.
+
+    Every bucket size in Aggregations.FREQ_MAP is a whole number of minutes
+    anchored at the epoch, so coarser buckets are exact sums of 1-minute cells.
+    The last slot of each dimension holds rows where that column is missing.
+    """
+
+    def __init__(self, minutes, dimension_values, counts):
+        self.minutes = minutes
+        self.dimension_values = dimension_values
+        self.counts = counts
+
+    @classmethod
+    def from_frame(cls, df, timestamps):
+        minute_keys = timestamps // MINUTE_NS * MINUTE_NS
+        minutes, minute_idx = np.unique(minute_keys, return_inverse=True)
+
+        shape = [len(minutes)]
+        flat = minute_idx.astype(np.int64)
+        dimension_values = {}
+        for column in ROLLUP_DIMENSIONS:
+            categorical = df[column].astype("category")
+            values = list(categorical.cat.categories)
+            codes = categorical.cat.codes.to_numpy().astype(np.int64)
+            codes[codes < 0] = len(values)
+            dimension_values[column] = values
+            shape.append(len(values) + 1)
+            flat = flat * shape[-1] + codes
+
+        counts = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return cls(minutes, dimension_values, counts)
+
+    def merged(self, other):
+        """Cube counting the rows of both cubes, e.g. the store's and a batch of new rows"""
+        minutes = np.union1d(self.minutes, other.minutes)
+        dimension_values = {}
+        for column in ROLLUP_DIMENSIONS:
+            values = list(self.dimension_values[column])
+            dimension_values[column] = values + [v for v in other.dimension_values[column] if v not in values]
+        counts = np.zeros([len(minutes)] + [len(dimension_values[c]) + 1 for c in ROLLUP_DIMENSIONS], dtype=np.int64)
+        for cube in (self, other):
+            axes = [np.searchsorted(minutes, cube.minutes)]
+            for column in ROLLUP_DIMENSIONS:
+                values = dimension_values[column]
+                # Each cube's last slot (missing values) maps to the merged last slot.
+                axes.append(np.array([values.index(v) for v in cube.dimension_values[column]] + [len(values)]))
+            counts[np.ix_(*axes)] += cube.counts
+        return RollupCube(minutes, dimension_values, counts)
+
+    def save(self, path):
+        arrays = {"minutes": self.minutes, "counts": self.counts}
+        for column, values in self.dimension_values.items():
+            arrays[f"values_{column}"] = np.array(values, dtype=object)
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=True) as data:
+            dimension_values = {
+                column: list(data[f"values_{column}"]) for column in ROLLUP_DIMENSIONS
+            }
+            return cls(data["minutes"], dimension_values, data["counts"])
+
+    def can_answer(self, filters, split_by):
+        """Whether the cube can express these filters and extra group-by columns"""
+        for key in filters:
+            if key == "timestamp_full_range":
+                continue
+            if not (key.endswith("_exact") and key[:-len("_exact")] in ROLLUP_DIMENSIONS):
+                return False
+        return all(column in ROLLUP_DIMENSIONS for column in split_by)
+
+    def bucket_counts(self, filters, split_by, step, first_minute=None, last_minute=None):
+        """Counts per (bucket start ns, *split_by values) over whole minutes in [first_minute, last_minute]
+
+        Zero cells are left out, as are rows missing a split_by value.
+        """
+        lo = 0 if first_minute is None else int(np.searchsorted(self.minutes, first_minute, side='left'))
+        hi = len(self.minutes) if last_minute is None else int(np.searchsorted(self.minutes, last_minute, side='right'))
+        if hi <= lo:
+            return {}
+        cells = self.counts[lo:hi]
+
+        labels = {}
+        for axis, column in enumerate(ROLLUP_DIMENSIONS, start=1):
+            values = self.dimension_values[column]
+            value = filters.get(f"{column}_exact")
+            if value is not None:
+                selected = [values.index(value)] if value in values else []
+            elif column in split_by:
+                selected = list(range(len(values)))
+            else:
+                continue
+            cells = np.take(cells, selected, axis=axis)
+            labels[column] = [values[i] for i in selected]
+
+        dimension_axes = {column: axis for axis, column in enumerate(ROLLUP_DIMENSIONS, start=1)}
+        sum_axes = tuple(dimension_axes[c] for c in ROLLUP_DIMENSIONS if c not in split_by)
+        cells = cells.sum(axis=sum_axes) if sum_axes else cells
+        remaining = [c for c in ROLLUP_DIMENSIONS if c in split_by]
+        cells = cells.transpose([0] + [remaining.index(c) + 1 for c in split_by])
+
+        bucket_keys = self.minutes[lo:hi] // step * step
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket_keys)) + 1))
+        cells = np.add.reduceat(cells, starts, axis=0)
+        buckets = bucket_keys[starts]
+
+        counts = {}
+        for position in zip(*np.nonzero(cells)):
+            key = (int(buckets[position[0]]),) + tuple(
+                labels[column][i] for column, i in zip(split_by, position[1:])
+            )
+            counts[key] = int(cells[position])
+        return counts
@@ -0,0 +1,116 @@
+import math
+import numpy as np
+import pandas as pd
+
+# 2**0 .. 2**63, used to get exact bit lengths of uint64 values with searchsorted.
+_POWERS_OF_TWO = np.array([1 << i for i in range(64)], dtype=np.uint64)
+
+
+def hash_values(values):
+    """Stable 64-bit hashes of any column values (strings, categoricals, numbers)"""
+    values = pd.Series(values).dropna()
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy(dtype=np.uint64)
+
+
+class HyperLogLog:
+    """Approximate distinct counter; relative error is about 1.04 / sqrt(2**precision)"""
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.registers = registers if registers is not None else np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if len(hashes) == 0:
+            return self
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << width) - 1)
+        bit_length = np.searchsorted(_POWERS_OF_TWO, remainder, side='right')
+        rank = (width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def add(self, values):
+        return self.add_hashes(hash_values(values))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch-style log buckets).
+
+    Values are counted in buckets of geometrically growing width, so any
+    quantile is returned within relative_accuracy of its true value and two
+    sketches merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _bucket_counts(self, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        return zip(*np.unique(keys, return_counts=True))
+
+    def add(self, values):
+        values = pd.to_numeric(pd.Series(values), errors='coerce').dropna().to_numpy(dtype=float)
+        if len(values) == 0:
+            return self
+        for store, magnitudes in ((self.positive, values[values > 0]), (self.negative, -values[values < 0])):
+            for key, n in self._bucket_counts(magnitudes):
+                store[int(key)] = store.get(int(key), 0) + int(n)
+        self.zero_count += int(np.count_nonzero(values == 0))
+        self.count += len(values)
+        return self
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge quantile sketches with different accuracy")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, n in other_store.items():
+                store[key] = store.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        return self
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
@@ -0,0 +1,100 @@
+import asyncio
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# The tool servers speak MCP over stdout, so everything diagnostic goes to stderr.
+
+
+def log(*args):
+    print(*args, file=sys.stderr, flush=True)
+
+
+_phases = {}
+_phases_lock = threading.Lock()
+
+
+def record(phase, seconds):
+    with _phases_lock:
+        _phases[phase] = seconds
+    log(f"[startup] {phase}: {seconds * 1000:.0f} ms")
+
+
+@contextmanager
+def timed(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - started)
+
+
+def startup_report():
+    """{phase: seconds} for every phase recorded so far, in the order they finished"""
+    with _phases_lock:
+        return dict(_phases)
+
+
+class Lazy:
+    """A value built on first use, at most once, and timed as a startup phase.
+
+    Concurrent callers wait for the one build in progress, so a background
+    prewarm() and the first real request never build the same thing twice.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def get(self):
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                with timed(self.name):
+                    self._value = self._factory()
+                self._ready = True
+        return self._value
+
+    async def aget(self):
+        """get() without blocking the event loop while the value is being built"""
+        if self._ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    def set(self, value):
+        """Use value instead of building one (benchmarks inject stores and models this way)"""
+        with self._lock:
+            self._value = value
+            self._ready = True
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+
+def prewarm(*lazies):
+    """Build lazies in order on a daemon thread, then log the phase report"""
+    def run():
+        started = time.perf_counter()
+        for lazy in lazies:
+            try:
+                lazy.get()
+            except Exception as e:
+                # The first request will hit the same error and report it properly.
+                log(f"[startup] prewarming {lazy.name} failed: {e}")
+        record("prewarm", time.perf_counter() - started)
+        log("[startup] report: " + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in startup_report().items()))
+
+    thread = threading.Thread(target=run, name="prewarm", daemon=True)
+    thread.start()
+    return thread
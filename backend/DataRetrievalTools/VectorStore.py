@@ -0,0 +1,740 @@
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+import numpy as np
+import pandas as pd
+from pydantic import PrivateAttr
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    build_metadata_filter_fn,
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
+from DataRetrievalTools.LexicalIndex import LexicalIndex
+from DataRetrievalTools.BitmapIndex import BitmapIndex
+from DataRetrievalTools.Metrics import span
+
+# VECTOR_INDEX_ROOT moves every backend's index elsewhere (the benchmarks build theirs in a temp dir).
+INDEX_ROOT = os.getenv("VECTOR_INDEX_ROOT") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "LlamaIndex")
+
+# "mmap" is the binary store below; "simple" is LlamaIndex's JSON SimpleVectorStore.
+BACKENDS = ("mmap", "simple")
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "mmap")
+
+VECTORS_FILE = "vectors.bin"
+ASSIGNMENTS_FILE = "assignments.bin"
+CENTROIDS_FILE = "centroids.npy"
+NODES_FILE = "nodes.sqlite"
+TIMELINE_NS_FILE = "timeline_ns.bin"
+TIMELINE_POSITIONS_FILE = "timeline_positions.bin"
+# Held (flock) for as long as a writable store is open; only its holder may cut uncommitted tails.
+WRITER_LOCK_FILE = "writer.lock"
+
+# Metadata resolved before similarity: timestamp bounds on the occurrence timeline,
+# equality / membership on these keys through per-value bitmaps.
+TIME_FILTER_KEY = "timestamp"
+FACET_KEYS = ("ServiceName", "SeverityText", "process_runtime")
+
+# Below this many vectors a brute-force scan is already sub-millisecond, so no IVF is trained.
+IVF_MIN_ROWS = 4096
+UNASSIGNED = -1
+SCAN_BLOCK = 65_536
+INT8_SCALE = 127.0
+
+# Hybrid queries: weight of each ranking in reciprocal-rank fusion, and the RRF damping constant.
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+_lexical_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical")
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _kmeans(sample, k, iterations=10, seed=0):
+    """Spherical k-means on unit vectors; returns unit centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        filled = np.linalg.norm(sums, axis=1) > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+def _time_bound(value):
+    try:
+        return pd.Timestamp(value).value
+    except (ValueError, TypeError):
+        return None
+
+
+def split_filters(filters):
+    """Split MetadataFilters into what the store can pre-filter and the rest.
+
+    Returns (time window, facets, remaining): the window is [start_ns, end_ns]
+    with None for an open side, facets maps key -> (allowed values or None,
+    excluded values), and remaining is a MetadataFilters for the post-filter or
+    None. Only top-level filters of an AND are pulled out.
+    """
+    if filters is None or not filters.filters:
+        return None, {}, None
+    if (filters.condition or FilterCondition.AND) != FilterCondition.AND:
+        return None, {}, filters
+
+    window = [None, None]
+    facets = {}
+    remaining = []
+    for item in filters.filters:
+        if not isinstance(item, MetadataFilter):
+            remaining.append(item)
+            continue
+        if item.key == TIME_FILTER_KEY and item.operator in (
+            FilterOperator.GT, FilterOperator.GTE, FilterOperator.LT, FilterOperator.LTE, FilterOperator.EQ
+        ):
+            bound = _time_bound(item.value)
+            if bound is None:
+                remaining.append(item)
+                continue
+            if item.operator in (FilterOperator.GT, FilterOperator.GTE, FilterOperator.EQ):
+                start = bound + 1 if item.operator == FilterOperator.GT else bound
+                window[0] = start if window[0] is None else max(window[0], start)
+            if item.operator in (FilterOperator.LT, FilterOperator.LTE, FilterOperator.EQ):
+                end = bound - 1 if item.operator == FilterOperator.LT else bound
+                window[1] = end if window[1] is None else min(window[1], end)
+        elif item.key in FACET_KEYS and item.operator in (
+            FilterOperator.EQ, FilterOperator.IN, FilterOperator.NE, FilterOperator.NIN
+        ):
+            values = set(item.value) if isinstance(item.value, list) else {item.value}
+            allowed, excluded = facets.get(item.key, (None, set()))
+            if item.operator in (FilterOperator.EQ, FilterOperator.IN):
+                allowed = values if allowed is None else allowed & values
+            else:
+                excluded = excluded | values
+            facets[item.key] = (allowed, excluded)
+        else:
+            remaining.append(item)
+
+    window = None if window == [None, None] else window
+    remaining = MetadataFilters(filters=remaining, condition=FilterCondition.AND) if remaining else None
+    return window, facets, remaining
+
+
+def _bits_set(bitmap, positions):
+    """Whether each position is set in a packed bitmap; None means an empty bitmap"""
+    if bitmap is None:
+        return np.zeros(len(positions), dtype=bool)
+    return ((bitmap[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Vectors in one contiguous memory-mapped file with an IVF index; nodes in SQLite.
+
+    Layout of persist_dir:
+      vectors.bin      unit vectors, row i is the node at position i (float32 or int8)
+      assignments.bin  int32 IVF list per position, -1 until an IVF is trained
+      centroids.npy    IVF centroids
+      nodes.sqlite     position -> node id, ref doc id, serialized node, deleted flag
+      lexical.sqlite   BM25 postings (LexicalIndex), written by ingestion
+      timeline_*.bin   (occurrence time ns, position) pairs, one per source row
+      writer.lock      flock held by the one writable store
+
+    Only the centroids and the per-list position arrays live in memory; vectors
+    are paged in by the OS as lists are probed, so load time and RSS stay flat as
+    the corpus grows. Vector files are appended before the SQLite commit. A
+    writable store holds writer.lock and cuts any tail beyond the committed row
+    count when it opens; a read_only store never touches the files, ignores rows
+    past the count it last read, and picks up new ones on refresh(). Retraining
+    replaces assignments.bin rather than rewriting it, so rows a reader has
+    mapped never change under it.
+
+    HYBRID queries (the auto-retriever's "hybrid" mode) fuse the dense ranking
+    with BM25 over lexical.sqlite; query.alpha, when given, is the vector weight.
+
+    Filters on timestamp bounds and on FACET_KEYS are resolved before any
+    similarity is computed: the time window is a binary search over the sorted
+    occurrence timeline (a node matches if any of its rows falls inside), and
+    facet values are per-value bitmaps over positions. Only the surviving
+    positions are scored, so a narrow window costs in proportion to its size.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+
+    persist_dir: str
+    quantization: str = "float32"
+    nprobe: int = 8
+    read_only: bool = False
+
+    _conn: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _dim: Optional[int] = PrivateAttr(default=None)
+    _count: int = PrivateAttr(default=0)
+    _vectors: Any = PrivateAttr(default=None)
+    _assignments: Any = PrivateAttr(default=None)
+    _centroids: Any = PrivateAttr(default=None)
+    _trained_on: int = PrivateAttr(default=0)
+    _lists: Any = PrivateAttr(default=None)
+    _deleted: Any = PrivateAttr(default=None)
+    _lexical: Any = PrivateAttr(default=None)
+    _timeline: Any = PrivateAttr(default=None)
+    _facets: Any = PrivateAttr(default=None)
+    _writer_lock: Any = PrivateAttr(default=None)
+
+    def __init__(self, persist_dir, quantization=None, nprobe=None, read_only=False, **kwargs):
+        super().__init__(
+            persist_dir=persist_dir,
+            quantization=quantization or os.getenv("VECTOR_STORE_QUANTIZATION", "float32"),
+            nprobe=nprobe or int(os.getenv("VECTOR_STORE_NPROBE", "8")),
+            read_only=read_only,
+            **kwargs,
+        )
+        if self.quantization not in ("float32", "int8"):
+            raise ValueError(f"Unknown vector quantization: {self.quantization}")
+        os.makedirs(persist_dir, exist_ok=True)
+        if not read_only:
+            self._writer_lock = open(os.path.join(persist_dir, WRITER_LOCK_FILE), "a")
+            try:
+                fcntl.flock(self._writer_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._writer_lock.close()
+                raise ValueError(f"{persist_dir} is already open for writing; open it read_only") from None
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(persist_dir, NODES_FILE), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "position INTEGER PRIMARY KEY, node_id TEXT UNIQUE NOT NULL, ref_doc_id TEXT, "
+            "deleted INTEGER NOT NULL DEFAULT 0, node TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nodes_ref_doc ON nodes (ref_doc_id)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._lexical = LexicalIndex(persist_dir)
+        self._open()
+
+    @property
+    def lexical(self):
+        return self._lexical
+
+    @classmethod
+    def class_name(cls):
+        return "MmapVectorStore"
+
+    @property
+    def client(self):
+        return None
+
+    # ---- storage ----
+
+    def _path(self, name):
+        return os.path.join(self.persist_dir, name)
+
+    @property
+    def _dtype(self):
+        return np.int8 if self.quantization == "int8" else np.float32
+
+    def _info(self, key):
+        row = self._conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_info(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _open(self):
+        stored = self._info("quantization")
+        if stored is not None and stored != self.quantization:
+            # The file format is fixed when the store is created.
+            self.quantization = stored
+        self._dim = self._info("dim")
+        self._trained_on = self._info("trained_on") or 0
+        self._count = self._conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM nodes").fetchone()[0]
+        if self._dim is not None and not self.read_only:
+            # Only the writer may cut: a reader opening between the writer's append and its
+            # commit would otherwise destroy the rows being committed.
+            row_bytes = self._dim * np.dtype(self._dtype).itemsize
+            for name, size in ((VECTORS_FILE, row_bytes), (ASSIGNMENTS_FILE, 4)):
+                path = self._path(name)
+                if os.path.exists(path) and os.path.getsize(path) > self._count * size:
+                    with open(path, "r+b") as f:
+                        f.truncate(self._count * size)
+        centroids = self._path(CENTROIDS_FILE)
+        self._centroids = np.load(centroids) if os.path.exists(centroids) and self._trained_on else None
+        self._deleted = {row[0] for row in self._conn.execute("SELECT position FROM nodes WHERE deleted = 1")}
+        self._remap()
+
+    def _remap(self):
+        self._lists = None
+        self._facets = None
+        if not self._count:
+            self._vectors = None
+            self._assignments = None
+            return
+        self._vectors = np.memmap(self._path(VECTORS_FILE), dtype=self._dtype, mode="r", shape=(self._count, self._dim))
+        self._assignments = np.memmap(self._path(ASSIGNMENTS_FILE), dtype=np.int32, mode="r", shape=(self._count,))
+
+    def _encode(self, vectors):
+        vectors = _normalize(vectors)
+        if self.quantization == "int8":
+            return np.round(vectors * INT8_SCALE).astype(np.int8)
+        return vectors
+
+    def _decode(self, rows):
+        rows = np.asarray(rows, dtype=np.float32)
+        return rows / INT8_SCALE if self.quantization == "int8" else rows
+
+    def _assign(self, vectors):
+        if self._centroids is None:
+            return np.full(len(vectors), UNASSIGNED, dtype=np.int32)
+        return np.argmax(_normalize(vectors) @ self._centroids.T, axis=1).astype(np.int32)
+
+    @staticmethod
+    def _write_rows(path, positions, rows):
+        """Write rows[i] at row positions[i]; one write when they are a contiguous run"""
+        row_bytes = rows[0].nbytes
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            if np.all(np.diff(positions) == 1):
+                f.seek(positions[0] * row_bytes)
+                f.write(np.ascontiguousarray(rows).tobytes())
+                return
+            for position, row in zip(positions, rows):
+                f.seek(position * row_bytes)
+                f.write(row.tobytes())
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"{self.persist_dir} was opened read_only")
+
+    def _replace_file(self, name, write):
+        """Atomically replace name with what write(file) writes"""
+        tmp_path = self._path(name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, self._path(name))
+
+    # ---- BasePydanticVectorStore ----
+
+    def add(self, nodes, **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        self._check_writable()
+        with self._lock:
+            vectors = np.array([node.get_embedding() for node in nodes], dtype=np.float32)
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+                self._set_info("dim", self._dim)
+                self._set_info("quantization", self.quantization)
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            encoded = self._encode(vectors)
+            assignments = self._assign(vectors)
+            existing = dict(self._conn.execute(
+                f"SELECT node_id, position FROM nodes WHERE node_id IN ({','.join('?' * len(nodes))})",
+                [node.node_id for node in nodes],
+            ).fetchall())
+            positions = []
+            rows = []
+            for node in nodes:
+                position = existing.get(node.node_id)
+                if position is None:
+                    position = self._count
+                    self._count += 1
+                    existing[node.node_id] = position
+                positions.append(position)
+                self._deleted.discard(position)
+                metadata = node_to_metadata_dict(node, remove_text=False, flat_metadata=self.flat_metadata)
+                rows.append((position, node.node_id, node.ref_doc_id, json.dumps(metadata)))
+            self._write_rows(self._path(VECTORS_FILE), positions, encoded)
+            self._write_rows(self._path(ASSIGNMENTS_FILE), positions, assignments)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO nodes (position, node_id, ref_doc_id, deleted, node) VALUES (?, ?, ?, 0, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._remap()
+            if self._count >= IVF_MIN_ROWS and self._count >= 2 * self._trained_on:
+                self.train()
+        return [node.node_id for node in nodes]
+
+    def train(self, sample_size=50_000):
+        """(Re)build the IVF: k-means on a sample, then assign every stored vector to a list"""
+        self._check_writable()
+        with self._lock:
+            live = np.setdiff1d(np.arange(self._count), np.fromiter(self._deleted, dtype=np.int64))
+            if len(live) == 0:
+                return
+            n_lists = int(np.clip(np.sqrt(len(live)), 1, 4096))
+            rng = np.random.default_rng(0)
+            sample = np.sort(rng.choice(live, min(sample_size, len(live)), replace=False))
+            centroids = _kmeans(_normalize(self._decode(self._vectors[sample])), min(n_lists, len(sample)))
+
+            assignments = np.empty(self._count, dtype=np.int32)
+            for start in range(0, self._count, SCAN_BLOCK):
+                block = self._decode(self._vectors[start:start + SCAN_BLOCK])
+                assignments[start:start + SCAN_BLOCK] = np.argmax(_normalize(block) @ centroids.T, axis=1)
+            self._vectors = self._assignments = None
+            # Written aside and swapped in, so another store open on this directory (the
+            # reader live ingestion publishes) keeps the assignments it mapped.
+            self._replace_file(ASSIGNMENTS_FILE, assignments.tofile)
+            self._replace_file(CENTROIDS_FILE, lambda f: np.save(f, centroids))
+            self._centroids = centroids
+            self._trained_on = self._count
+            self._set_info("trained_on", self._count)
+            self._conn.commit()
+            self._remap()
+
+    def _ivf_lists(self):
+        """Positions grouped by IVF list, built lazily from assignments.bin"""
+        if self._lists is None:
+            assignments = np.asarray(self._assignments)
+            order = np.argsort(assignments, kind="stable")
+            bounds = np.searchsorted(assignments[order], np.arange(UNASSIGNED, len(self._centroids) + 1))
+            self._lists = (order, bounds)
+        return self._lists
+
+    def _candidates(self, query, centroids, lists):
+        """Positions worth scoring: the nprobe nearest IVF lists plus unassigned rows, or everything"""
+        if lists is None:
+            return None
+        order, bounds = lists
+        probes = np.argsort(-(centroids @ query))[:self.nprobe]
+        # bounds[0]..bounds[1] are the unassigned rows; list j spans bounds[j + 1]..bounds[j + 2].
+        spans = [order[bounds[0]:bounds[1]]] + [order[bounds[j + 1]:bounds[j + 2]] for j in probes]
+        return np.sort(np.concatenate(spans))
+
+    def _score(self, query, positions, vectors):
+        if positions is None:
+            return np.concatenate([
+                self._decode(vectors[start:start + SCAN_BLOCK]) @ query
+                for start in range(0, len(vectors), SCAN_BLOCK)
+            ])
+        if len(positions) == 0:
+            return np.empty(0, dtype=np.float32)
+        return np.concatenate([
+            self._decode(vectors[positions[start:start + SCAN_BLOCK]]) @ query
+            for start in range(0, len(positions), SCAN_BLOCK)
+        ])
+
+    # ---- pre-filtering ----
+
+    def add_occurrences(self, node_ids, timestamps):
+        """Record when each node's source rows happened (parallel lists of node id, timestamp)"""
+        self._check_writable()
+        with self._lock:
+            positions = self._positions_of(list(dict.fromkeys(node_ids)))
+            known = [(positions[node_id], ts) for node_id, ts in zip(node_ids, timestamps) if node_id in positions]
+            if not known:
+                return
+            times = pd.to_datetime(pd.Series([ts for _, ts in known])).to_numpy(dtype="datetime64[ns]").view(np.int64)
+            with open(self._path(TIMELINE_NS_FILE), "ab") as f:
+                f.write(times.tobytes())
+            with open(self._path(TIMELINE_POSITIONS_FILE), "ab") as f:
+                f.write(np.array([p for p, _ in known], dtype=np.int32).tobytes())
+            self._timeline = None
+
+    def _sorted_timeline(self):
+        """(sorted occurrence times, their positions), sorted once and cached"""
+        if self._timeline is None:
+            paths = [self._path(TIMELINE_NS_FILE), self._path(TIMELINE_POSITIONS_FILE)]
+            if not all(os.path.exists(path) and os.path.getsize(path) for path in paths):
+                self._timeline = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32))
+                return self._timeline
+            times = np.fromfile(paths[0], dtype=np.int64)
+            positions = np.fromfile(paths[1], dtype=np.int32)
+            # A crash between the two appends leaves one file longer; drop the unmatched tail,
+            # and any rows committed after this store last read the count.
+            n = min(len(times), len(positions))
+            times, positions = times[:n], positions[:n]
+            known = positions < self._count
+            times, positions = times[known], positions[known]
+            order = np.argsort(times, kind="stable")
+            self._timeline = (times[order], positions[order])
+        return self._timeline
+
+    def _facet_indexes(self):
+        """BitmapIndex per FACET_KEYS over positions, built from nodes.sqlite on first use"""
+        if self._facets is None:
+            columns = ", ".join(f"json_extract(node, '$.\"{key}\"')" for key in FACET_KEYS)
+            rows = self._conn.execute(f"SELECT position, {columns} FROM nodes WHERE deleted = 0").fetchall()
+            frame = pd.DataFrame(rows, columns=["position", *FACET_KEYS]).set_index("position")
+            frame = frame.reindex(np.arange(self._count))
+            self._facets = {key: BitmapIndex.from_column(frame[key]) for key in FACET_KEYS}
+        return self._facets
+
+    def _union_bitmap(self, index, values):
+        bitmaps = [bitmap for bitmap in (index.lookup(value) for value in values) if bitmap is not None]
+        if not bitmaps:
+            return None
+        return np.bitwise_or.reduce(bitmaps) if len(bitmaps) > 1 else bitmaps[0]
+
+    def _prefilter(self, window, facets):
+        """Sorted live positions passing the time window and facet filters"""
+        positions = None
+        if window is not None:
+            times, timeline_positions = self._sorted_timeline()
+            lo = 0 if window[0] is None else np.searchsorted(times, window[0], side="left")
+            hi = len(times) if window[1] is None else np.searchsorted(times, window[1], side="right")
+            positions = np.unique(timeline_positions[lo:hi]).astype(np.int64)
+        for key, (allowed, excluded) in facets.items():
+            index = self._facet_indexes()[key]
+            if allowed is not None:
+                bitmap = self._union_bitmap(index, allowed)
+                if positions is None:
+                    positions = np.flatnonzero(np.unpackbits(bitmap)[:self._count]) if bitmap is not None \
+                        else np.empty(0, dtype=np.int64)
+                else:
+                    positions = positions[_bits_set(bitmap, positions)]
+            if excluded:
+                if positions is None:
+                    positions = np.arange(self._count)
+                bitmap = self._union_bitmap(index, excluded)
+                if bitmap is not None:
+                    positions = positions[~_bits_set(bitmap, positions)]
+        if self._deleted:
+            positions = np.setdiff1d(positions, np.fromiter(self._deleted, dtype=np.int64))
+        return positions
+
+    def _load_nodes(self, positions):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT position, node FROM nodes WHERE deleted = 0 AND position IN ({','.join('?' * len(positions))})",
+                [int(p) for p in positions],
+            ).fetchall()
+        return {position: metadata_dict_to_node(json.loads(node)) for position, node in rows}
+
+    def _positions_of(self, node_ids):
+        if not node_ids:
+            return {}
+        with self._lock:
+            return dict(self._conn.execute(
+                f"SELECT node_id, position FROM nodes WHERE deleted = 0 AND node_id IN ({','.join('?' * len(node_ids))})",
+                list(node_ids),
+            ).fetchall())
+
+    def _fuse(self, query_vector, vectors, positions, scores, lexical_hits, vector_weight, lexical_weight,
+              allowed=None):
+        """Reciprocal-rank fusion of the dense ranking with BM25 hits.
+
+        Lexical hits outside the probed IVF lists are scored exactly and added,
+        so an exact-token match is never lost to the approximate dense side.
+        Hits outside the pre-filtered positions (allowed) are dropped.
+        """
+        lexical_positions = self._positions_of([doc for doc, _ in lexical_hits])
+        # The lexical index may already hold rows committed after this store's snapshot.
+        lexical_ranked = [lexical_positions[doc] for doc, _ in lexical_hits
+                          if lexical_positions.get(doc, len(vectors)) < len(vectors)]
+        if allowed is not None:
+            lexical_ranked = [p for p, keep in zip(lexical_ranked, np.isin(lexical_ranked, allowed)) if keep]
+        extra = np.setdiff1d(np.array(lexical_ranked, dtype=np.int64), positions)
+        if len(extra):
+            positions = np.concatenate([positions, extra])
+            scores = np.concatenate([scores, self._score(query_vector, extra, vectors)])
+
+        dense_rank = np.empty(len(positions), dtype=np.int64)
+        dense_rank[np.argsort(-scores, kind="stable")] = np.arange(len(positions))
+        fused = vector_weight / (HYBRID_RRF_K + 1 + dense_rank)
+        index_of = {position: i for i, position in enumerate(positions.tolist())} if lexical_ranked else {}
+        for rank, position in enumerate(lexical_ranked):
+            fused[index_of[position]] += lexical_weight / (HYBRID_RRF_K + 1 + rank)
+        return positions, fused
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        with span("vector_search"):
+            return self._query(query)
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # The base class runs query() on the event loop; the scan and SQLite reads belong off it.
+        return await asyncio.to_thread(self.query, query, **kwargs)
+
+    def _query(self, query):
+        if query.query_embedding is None:
+            raise ValueError("MmapVectorStore only supports embedding queries")
+        k = query.similarity_top_k
+        hybrid = query.mode == VectorStoreQueryMode.HYBRID and bool(query.query_str)
+        if hybrid:
+            # BM25 runs on its own connection while the dense side scores vectors.
+            lexical_future = _lexical_pool.submit(
+                self._lexical.search, query.query_str, max(query.sparse_top_k or 0, 4 * k, 50)
+            )
+        with self._lock:
+            if not self._count:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            # Snapshot under the lock and score outside it: add() and train() swap in new maps
+            # and centroids rather than resizing these, so concurrent searches don't serialize.
+            vectors, centroids = self._vectors, self._centroids
+            lists = self._ivf_lists() if centroids is not None and self._count >= IVF_MIN_ROWS else None
+            query_vector = _normalize(query.query_embedding)
+            window, facets, post_filters = split_filters(query.filters)
+            if window is not None and not len(self._sorted_timeline()[0]):
+                # No timeline (index built before occurrences were recorded): filter node metadata instead.
+                post_filters = query.filters
+                window, facets = None, {}
+            allowed = self._prefilter(window, facets) if window is not None or facets else None
+
+        positions = self._candidates(query_vector, centroids, lists)
+        if allowed is not None:
+            probed = np.intersect1d(allowed, positions) if positions is not None else allowed
+            positions = probed if len(probed) >= k else allowed
+        scores = self._score(query_vector, positions, vectors)
+        if positions is None:
+            positions = np.arange(len(vectors))
+        if hybrid:
+            if query.alpha is not None:
+                vector_weight, lexical_weight = query.alpha, 1 - query.alpha
+            else:
+                vector_weight, lexical_weight = HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT
+            positions, scores = self._fuse(
+                query_vector, vectors, positions, scores, lexical_future.result(), vector_weight, lexical_weight,
+                allowed
+            )
+        ranked = positions[np.argsort(-scores, kind="stable")]
+        score_of = dict(zip(positions.tolist(), scores.tolist()))
+
+        wanted_ids = set(query.node_ids or [])
+        wanted_docs = set(query.doc_ids or [])
+        batch = max(4 * k, 64)
+        nodes, similarities = [], []
+        for start in range(0, len(ranked), batch):
+            loaded = self._load_nodes(ranked[start:start + batch])
+            matches = build_metadata_filter_fn(lambda p: loaded[p].metadata, post_filters)
+            for position in ranked[start:start + batch].tolist():
+                node = loaded.get(position)
+                if node is None or not matches(position):
+                    continue
+                if wanted_ids and node.node_id not in wanted_ids:
+                    continue
+                if wanted_docs and node.ref_doc_id not in wanted_docs:
+                    continue
+                nodes.append(node)
+                similarities.append(score_of[position])
+                if len(nodes) == k:
+                    break
+            if len(nodes) == k:
+                break
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=[n.node_id for n in nodes])
+
+    def get_nodes(self, node_ids=None, filters: Optional[MetadataFilters] = None):
+        with self._lock:
+            if node_ids is None:
+                rows = self._conn.execute("SELECT node FROM nodes WHERE deleted = 0").fetchall()
+            else:
+                rows = self._conn.execute(
+                    f"SELECT node FROM nodes WHERE deleted = 0 AND node_id IN ({','.join('?' * len(node_ids))})",
+                    list(node_ids),
+                ).fetchall()
+        nodes = [metadata_dict_to_node(json.loads(row[0])) for row in rows]
+        matches = build_metadata_filter_fn(lambda i: nodes[i].metadata, filters)
+        return [node for i, node in enumerate(nodes) if matches(i)]
+
+    def _mark_deleted(self, where, params):
+        self._check_writable()
+        with self._lock:
+            positions = [row[0] for row in self._conn.execute(f"SELECT position FROM nodes WHERE {where}", params)]
+            self._conn.execute(f"UPDATE nodes SET deleted = 1 WHERE {where}", params)
+            self._conn.commit()
+            self._deleted.update(positions)
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._mark_deleted("ref_doc_id = ?", (ref_doc_id,))
+
+    def delete_nodes(self, node_ids=None, filters=None, **delete_kwargs: Any) -> None:
+        if filters is not None:
+            node_ids = [node.node_id for node in self.get_nodes(node_ids, filters)]
+        if node_ids is None:
+            self.clear()
+        elif node_ids:
+            self._mark_deleted(f"node_id IN ({','.join('?' * len(node_ids))})", list(node_ids))
+
+    def clear(self) -> None:
+        self._check_writable()
+        with self._lock:
+            self._conn.execute("DELETE FROM nodes")
+            self._conn.execute("DELETE FROM info")
+            self._conn.commit()
+            for name in (VECTORS_FILE, ASSIGNMENTS_FILE, CENTROIDS_FILE, TIMELINE_NS_FILE, TIMELINE_POSITIONS_FILE):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._lexical.clear()
+            self._timeline = None
+            self._open()
+
+    def refresh(self):
+        """Pick up rows, deletions and retraining committed by the writer since this store opened"""
+        with self._lock:
+            self._timeline = None
+            self._open()
+
+    def close(self):
+        with self._lock:
+            self._vectors = self._assignments = None
+            self._conn.close()
+            self._lexical.close()
+            if self._writer_lock is not None:
+                self._writer_lock.close()
+                self._writer_lock = None
+
+    def warm(self):
+        """Build the lookup structures queries would otherwise build on first use"""
+        with self._lock:
+            if not self._count:
+                return
+            self._sorted_timeline()
+            self._facet_indexes()
+            if self._centroids is not None and self._count >= IVF_MIN_ROWS:
+                self._ivf_lists()
+
+    def size(self):
+        """Live (non-deleted) vectors; deliberately not __len__, since LlamaIndex tests stores for truthiness"""
+        return self._count - len(self._deleted)
+
+
+def default_index_dir(backend=None):
+    backend = backend or VECTOR_STORE_BACKEND
+    return os.path.join(INDEX_ROOT, "index_storage" if backend == "simple" else "vector_store")
+
+
+def open_vector_index(persist_dir=None, backend=None, embed_model=None, rebuild=False, read_only=False):
+    """VectorStoreIndex over the configured backend; rebuild starts from an empty store.
+
+    Query paths open read_only so they never contend with, or cut rows from, the writer.
+    """
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND {backend}, expected one of {BACKENDS}")
+    persist_dir = persist_dir or default_index_dir(backend)
+    if backend == "mmap":
+        vector_store = MmapVectorStore(persist_dir, read_only=read_only)
+        if rebuild:
+            vector_store.clear()
+        return VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
+    if not rebuild and os.path.exists(os.path.join(persist_dir, "docstore.json")):
+        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        return load_index_from_storage(storage_context, embed_model=embed_model)
+    return VectorStoreIndex(nodes=[], embed_model=embed_model)
+
+
+def persist_vector_index(index, persist_dir):
+    """The mmap store commits on every add; only the JSON backend needs an explicit persist"""
+    if not isinstance(index.vector_store, MmapVectorStore):
+        index.storage_context.persist(persist_dir=persist_dir)
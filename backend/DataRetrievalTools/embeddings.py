@@ -1,79 +1,243 @@
-from sentence_transformers import SentenceTransformer
-from llama_index.core import Document
-from llama_index.core import VectorStoreIndex
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from llama_index.core.schema import MetadataMode, TextNode
 
-import faiss
 from tqdm import tqdm
 import pandas as pd
+import argparse
+from collections import Counter
 import json
 import numpy as np
-
-
-
-print("loading FAISS index and log texts...")
-#index = faiss.read_index('log_index.faiss')
-print("Loaded")
-
-
-
-column_names = [
-    'timestamp_full', 'timestamp_simple', 'unknown1', 'unknown2', 'unknown3', 
-    'SeverityText', 'unknown4', 'ServiceName', 'message', 'schema_url', 'metadata_json', 
-    'unknown5', 'class_name', 'unknown6', 'unknown7', 'order_result_json'
-]
-
-df = pd.read_csv('testlog.csv', names=column_names)
-
-
-documents = []
-for row in df.itertuples(index=False):
-    metadata_str = row.metadata_json.replace("'", '"')
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from DataRetrievalTools.LogStore import COLUMN_NAMES
+from DataRetrievalTools.LogAttributes import order_columns, resource_attribute_columns
+from DataRetrievalTools.LexicalIndex import LexicalIndex, tokenize
+from DataRetrievalTools.EmbeddingCache import EmbeddingCache, PostingsStore, text_hash
+from DataRetrievalTools.VectorStore import MmapVectorStore, default_index_dir, open_vector_index, persist_vector_index
+
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testlog.csv")
+STATE_FILE = "ingest_state.json"
+# Per-node occurrence details, kept out of the embedded text so identical messages share a vector.
+NODE_SPAN_KEYS = ["timestamp", "first_timestamp", "occurrences"]
+# Exact-match identifiers indexed for BM25 in addition to the node text.
+LEXICAL_FIELDS = ['host.name', 'k8s.pod.name', 'k8s.node.name', 'k8s.deployment.name', 'service.version', 'order.orderId']
+
+
+def load_state(persist_dir):
+    """High-water mark of what has already been embedded into the index"""
+    path = os.path.join(persist_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(persist_dir, state):
+    path = os.path.join(persist_dir, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def build_nodes(chunk, row_offset, postings):
+    """One TextNode per distinct embedding text in the chunk, keyed by its hash.
+
+    Every source row is recorded in postings; a text already in the index is
+    upserted under the same id with its occurrence count and time span refreshed.
+    Also returns the BM25 terms per node (the node text plus the LEXICAL_FIELDS
+    values of every row behind it) and each row's node id, in row order.
+    """
+    attributes = resource_attribute_columns(chunk['metadata_json'])
+    attributes['order.orderId'] = order_columns(chunk['order_result_json'])['order.orderId']
+    runtimes = attributes['process.runtime.name'].astype(object).where(attributes['process.runtime.name'].notna(), "")
+    lexical_values = attributes[LEXICAL_FIELDS].astype(object).to_numpy()
+    nodes = {}
+    documents = {}
+    rows = []
+    for row_id, row, process_runtime, values in zip(range(row_offset, row_offset + len(chunk)),
+                                                    chunk.itertuples(index=False), runtimes, lexical_values):
+        node = TextNode(
+            text=f"{row.SeverityText} {row.ServiceName} {process_runtime} {row.message}",
+            metadata={
+                "ServiceName": str(row.ServiceName) or "UNAVAILABLE",
+                "SeverityText": str(row.SeverityText) or "UNAVAILABLE",
+                "process_runtime": str(process_runtime) or "UNAVAILABLE",
+            },
+            excluded_embed_metadata_keys=NODE_SPAN_KEYS,
+        )
+        key = text_hash(node.get_content(metadata_mode=MetadataMode.EMBED))
+        rows.append((key, row_id, str(row.timestamp_full), node.metadata["ServiceName"],
+                     node.metadata["SeverityText"], node.metadata["process_runtime"]))
+        if key not in nodes:
+            node.id_ = key
+            nodes[key] = node
+            documents[key] = Counter(tokenize(node.text))
+        for value in values:
+            if isinstance(value, str) and value:
+                for term in tokenize(value):
+                    documents[key].setdefault(term, 1)
+    postings.add(rows)
+
+    for key, (occurrences, first_timestamp, last_timestamp) in postings.summary(nodes).items():
+        nodes[key].metadata.update({
+            # timestamp is the latest occurrence so existing time filters keep working.
+            "timestamp": last_timestamp,
+            "first_timestamp": first_timestamp,
+            "occurrences": occurrences,
+        })
+    return list(nodes.values()), documents, [row[0] for row in rows]
+
+
+class BatchEmbedder:
+    """Embeds texts in fixed-size batches, spread over worker processes when workers > 1.
+
+    The model is loaded on first use, so a run whose texts are all cached never loads it.
+    """
+
+    def __init__(self, batch_size=64, workers=1):
+        self.batch_size = batch_size
+        self.workers = workers
+        self.model = None
+        self.pool = None
+
+    def embed(self, texts):
+        if self.model is None:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(EMBED_MODEL_NAME, device="cpu")
+            if self.workers > 1:
+                self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+        if self.pool is not None:
+            vectors = self.model.encode_multi_process(
+                texts, self.pool, batch_size=self.batch_size, normalize_embeddings=True
+            )
+        else:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+def open_index(persist_dir, rebuild=False, embed_model=None):
+    # Query-time embedding model; only used here if a node arrives without a vector.
+    if embed_model is None:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        embed_model = HuggingFaceEmbedding(model_name=EMBED_MODEL_NAME)
+    return open_vector_index(persist_dir, embed_model=embed_model, rebuild=rebuild)
+
+
+def index_chunk(chunk, row_offset, index, postings, lexical, cache, embed):
+    """Embed a chunk of raw CSV rows, numbered from row_offset, into the index and its side stores"""
+    nodes, documents, row_keys = build_nodes(chunk, row_offset, postings)
+    vectors = cache.embed([node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes], embed)
+    for node, vector in zip(nodes, vectors):
+        node.embedding = vector.tolist()
+    index.insert_nodes(nodes)
+    lexical.add(documents)
+    if isinstance(index.vector_store, MmapVectorStore):
+        index.vector_store.add_occurrences(row_keys, chunk['timestamp_full'].tolist())
+
+
+def advance_state(state, chunk, source):
+    """state after chunk's rows from source; rows_ingested numbers rows across all sources"""
+    sources = dict(state.get("sources") or {})
+    sources[source] = source_rows(state, source) + len(chunk)
+    return dict(
+        state,
+        rows_ingested=state["rows_ingested"] + len(chunk),
+        last_timestamp=max(filter(None, [state["last_timestamp"], str(chunk['timestamp_full'].max())])),
+        sources=sources,
+    )
+
+
+def source_rows(state, source):
+    """Rows of source already embedded; states from before live tailing only count the one CSV"""
+    if state.get("sources") is None:
+        return state["rows_ingested"]
+    return state["sources"].get(source, 0)
+
+
+def embedder_for(embed_model=None, batch_size=64, workers=1):
+    """(EmbeddingCache, embed function, BatchEmbedder to close or None) for embed_model or the default model"""
+    if embed_model is None:
+        embedder = BatchEmbedder(batch_size=batch_size, workers=workers)
+        return EmbeddingCache(EMBED_MODEL_NAME), embedder.embed, embedder
+    embed = lambda texts: np.asarray(embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+    return EmbeddingCache(embed_model.model_name), embed, None
+
+
+def ingest(csv_path=DEFAULT_CSV_PATH, persist_dir=None, chunk_size=10_000,
+           batch_size=64, workers=1, rebuild=False, embed_model=None):
+    """Embed only the CSV rows added since the last run and append them to the index.
+
+    The CSV is treated as append-only: the row offset is the high-water mark,
+    and the index plus state are persisted after every chunk so an interrupted
+    run resumes where it stopped. The index goes to the VECTOR_STORE_BACKEND
+    store unless persist_dir says otherwise. embed_model replaces the
+    sentence-transformers model with any LlamaIndex embedding (the benchmarks
+    use a deterministic local one).
+    """
+    persist_dir = persist_dir or default_index_dir()
+    os.makedirs(persist_dir, exist_ok=True)
+    state = load_state(persist_dir)
+    source_size = os.path.getsize(csv_path)
+    if state is None or rebuild or source_size < state["source_size"]:
+        # No high-water mark (an index from the old full rebuild), or the file was
+        # truncated/replaced: the offset can't be trusted, so start over.
+        rebuild = True
+        state = {"rows_ingested": 0, "last_timestamp": None, "source_size": 0, "sources": {}}
+
+    index = open_index(persist_dir, rebuild, embed_model)
+    postings = PostingsStore(persist_dir)
+    lexical = LexicalIndex(persist_dir)
+    if rebuild:
+        postings.clear()
+        lexical.clear()
+    cache, embed, embedder = embedder_for(embed_model, batch_size, workers)
+    source = os.path.abspath(csv_path)
+    added = 0
     try:
-        metadata = json.loads(metadata_str)
-    except json.JSONDecodeError:
-        metadata = {}
-    process_runtime = metadata.get('process.runtime.name', '')
-    text = f"{row.SeverityText} {row.ServiceName} {process_runtime} {row.message}"
-    print(f"Processing row: ServiceName: {row.ServiceName}, SeverityText: {row.SeverityText}, Process Runtime: {process_runtime}")
-    #print("Text:", text)
-    #print(f"Processing row: {row.timestamp_full}, ServiceName: {row.ServiceName}, SeverityText: {row.SeverityText}, Process Runtime: {process_runtime}")
-            
-    doc = Document(text=text, metadata={"timestamp": str(row.timestamp_full), "ServiceName": str(row.ServiceName) or "UNAVAILABLE", "SeverityText": str(row.SeverityText) or "UNAVAILABLE", "process_runtime": str(process_runtime) or "UNAVAILABLE"})
-    documents.append(doc)
-        
-
-model = HuggingFaceEmbedding(model_name="all-MiniLM-L6-v2")
-index = VectorStoreIndex.from_documents(documents, embed_model=model)
-index.storage_context.persist(persist_dir="./LlamaIndex/index_storage")
-
-
-
-
-'''
-def get_embeddings_batch(texts, batch_size):
-    all_embeddings = []
-    for i in tqdm(range(0, len(texts), batch_size)):
-        
-        batch = texts[i:i+batch_size]
-        batch_embeddings = model.encode(batch, normalize_embeddings=True)
-        all_embeddings.extend(batch_embeddings)
-
-    return np.array(all_embeddings).astype('float32')
-
-embeddings = get_embeddings_batch(log_texts, 50)
-
-#gets dimension of each vector
-d = embeddings.shape[1]
-
-#creates index where flat represents exact search and L2 is the euclidean distance between the vectors
-index = faiss.IndexFlatL2(d)
-
-index.add(embeddings)
-print("built the FAISS index")
-
-#saves index to disc in log_index file
-faiss.write_index(index, 'log_index')
-df.to_csv('log_texts.csv', index=False)
-
-'''
\ No newline at end of file
+        chunks = pd.read_csv(
+            csv_path,
+            names=COLUMN_NAMES,
+            skiprows=source_rows(state, source),
+            chunksize=chunk_size,
+        )
+        for chunk in tqdm(chunks, desc="Ingesting chunks", unit="chunk"):
+            if chunk.empty:
+                continue
+            index_chunk(chunk, state["rows_ingested"], index, postings, lexical, cache, embed)
+            persist_vector_index(index, persist_dir)
+
+            added += len(chunk)
+            state = dict(advance_state(state, chunk, source), source_size=source_size)
+            save_state(persist_dir, state)
+    finally:
+        if embedder is not None:
+            embedder.close()
+
+    if added == 0:
+        save_state(persist_dir, dict(state, source_size=source_size))
+    print(f"Ingested {added} new rows ({state['rows_ingested']} total, {postings.distinct_count()} distinct texts, "
+          f"up to {state['last_timestamp']})")
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally embed log rows into the LlamaIndex store")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--persist-dir", default=None, help="defaults to the VECTOR_STORE_BACKEND index dir")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="CSV rows read per chunk")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per embedding batch")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="embedding worker processes on CPU")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the high-water mark and start over")
+    args = parser.parse_args()
+    ingest(args.csv, args.persist_dir, args.chunk_size, args.batch_size, args.workers, args.rebuild)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 
 import asyncio
+import os
+import sys
+from mcp_agent.core.agent_app import AgentApp
+from mcp_agent.core.direct_factory import create_agents_in_dependency_order, get_model_factory
 from mcp_agent.core.fastagent import FastAgent
+from mcp_agent.core.prompt import Prompt
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from FastAgent.inprocesstools import IN_PROCESS_TOOLS, TOOL_SERVERS, attach_in_process_tools
+from FastAgent.instrumentation import instrument_agent
+
+AGENT_NAME = "Dashboard logs/metrics assistant agent"
 
 # Create the FastAgent application
 fast = FastAgent("Log Assistant")
 
 @fast.agent(
-    name="Dashboard logs/metrics assistant agent",
+    name=AGENT_NAME,
     instruction="""You are a log analysis assistant with access to two specialized tools. Never include large amounts of data in responses, 
     try to include the important information and summarize the rest.
   
@@ -26,14 +36,61 @@ fast = FastAgent("Log Assistant")
   - Step 2: Count using exact filters based on what you learned
   """,
     model="gpt-4o",
-    servers=["QueryLogsServer","SearchLogsServer"],  
+    # In-process mode launches no servers; the same tools are attached in prepare_agent.
+    servers=[] if IN_PROCESS_TOOLS else TOOL_SERVERS,
     use_history=True,
     human_input=True
 )
+def prepare_agent(agent_app):
+    """Attach the log tools to the running agent when LOG_TOOLS_TRANSPORT=inprocess,
+    and time its LLM and tool calls"""
+    if IN_PROCESS_TOOLS:
+        attach_in_process_tools(agent_app[AGENT_NAME])
+    instrument_agent(agent_app[AGENT_NAME])
+    return agent_app
+
+async def new_agent_app():
+    """A fresh set of agents, with their own history, inside an already running fast.run().
+
+    The MCP server connections belong to the context that fast.run() set up and
+    every agent app made here shares them, so these agents are released with
+    release_agents, never shut down: an agent's shutdown closes the context's
+    connection manager, cutting off every other session's tools.
+    """
+    agents = await create_agents_in_dependency_order(
+        fast.app,
+        fast.agents,
+        lambda model=None, request_params=None: get_model_factory(
+            fast.context, model=model, request_params=request_params
+        ),
+    )
+    return prepare_agent(AgentApp(agents)), agents
+
+async def record_turn(agent_app, question, answer):
+    """Add a question and an answer computed elsewhere to the agent's history, without calling the model"""
+    # Agents expose no public accessor for their LLM. generate() would store the pair and then
+    # append the assistant message again as its reply, so the pair is recorded directly: a list
+    # ending with the assistant goes into the provider history without requesting a completion.
+    llm = agent_app[AGENT_NAME]._llm
+    messages = [Prompt.user(question), Prompt.assistant(answer)]
+    await llm._apply_prompt_provider_specific(messages)
+    llm._message_history.extend(messages)
+
+def has_history(agent_app):
+    return bool(agent_app[AGENT_NAME].message_history)
+
+def release_agents(agents):
+    """Drop a session's conversation history; its agents' connections stay with the shared context"""
+    for agent in agents.values():
+        llm = getattr(agent, "_llm", None)
+        if llm is not None:
+            llm.history.clear()
+            llm._message_history.clear()
+
 async def log_assistant():
     """Main agent function for handling log and metric queries"""
     async with fast.run() as agent:
-        await agent()
+        await prepare_agent(agent)()
 
 async def main():
     """Entry point that runs the agent"""
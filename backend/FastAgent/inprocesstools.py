@@ -0,0 +1,84 @@
+import os
+import sys
+from mcp.types import CallToolResult, ListToolsResult, TextContent
+from mcp.server.fastmcp.exceptions import ToolError
+from mcp_agent.mcp.common import SEP, create_namespaced_name
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from DataRetrievalTools.Startup import Lazy, prewarm
+
+# "stdio" runs each tool server as its own process, isolated from the app.
+# "inprocess" calls the same FastMCP tools directly: no JSON over pipes, and one
+# log store and one embedding model shared by both tools.
+TOOLS_TRANSPORT = os.getenv("LOG_TOOLS_TRANSPORT", "stdio")
+IN_PROCESS_TOOLS = TOOLS_TRANSPORT == "inprocess"
+
+TOOL_SERVERS = ["QueryLogsServer", "SearchLogsServer"]
+
+
+class InProcessTools:
+    """FastMCP servers' tools, listed and called under the same namespaced
+    names ("QueryLogsServer-search_logs_tool") the MCP aggregator would use"""
+
+    def __init__(self, servers):
+        self.servers = servers
+        self._tools = None
+
+    async def list_tools(self):
+        if self._tools is None:
+            self._tools = [
+                tool.model_copy(update={"name": create_namespaced_name(server_name, tool.name)})
+                for server_name, server in self.servers.items()
+                for tool in await server.list_tools()
+            ]
+        return self._tools
+
+    def owns(self, name):
+        return name.split(SEP, 1)[0] in self.servers
+
+    async def call_tool(self, name, arguments=None):
+        server_name, tool_name = name.split(SEP, 1)
+        try:
+            result = await self.servers[server_name].call_tool(tool_name, arguments or {})
+        except ToolError as e:
+            return CallToolResult(isError=True, content=[TextContent(type="text", text=str(e))])
+        # Tools with an output schema return (content, structured content).
+        if isinstance(result, tuple):
+            content, structured = result
+            return CallToolResult(content=list(content), structuredContent=structured)
+        return CallToolResult(content=list(result))
+
+
+def _load_tools():
+    from FastAgent.querylogsserver import mcp as query_server
+    from FastAgent.searchlogsserver import mcp as search_server
+    from DataRetrievalTools.LlamaSearch import PREWARM
+    from DataRetrievalTools.QuerySearch import log_store
+    from DataRetrievalTools.LiveIngest import start_live_ingest
+    # The servers' own __main__ prewarm and live tailing don't run when they are imported.
+    prewarm(log_store, *PREWARM)
+    start_live_ingest(store=True, index=True)
+    return InProcessTools({"QueryLogsServer": query_server, "SearchLogsServer": search_server})
+
+
+# One set per process, shared by every agent session.
+in_process_tools = Lazy("in_process_tools", _load_tools)
+
+
+def attach_in_process_tools(agent):
+    """Serve the log tools from agent's own list_tools/call_tool, next to any MCP servers it has"""
+    tools = in_process_tools.get()
+    list_tools = agent.list_tools
+    call_tool = agent.call_tool
+
+    async def list_with_local_tools():
+        result = await list_tools()
+        return ListToolsResult(tools=[*result.tools, *await tools.list_tools()])
+
+    async def call_with_local_tools(name, arguments=None):
+        if tools.owns(name):
+            return await tools.call_tool(name, arguments)
+        return await call_tool(name, arguments)
+
+    agent.list_tools = list_with_local_tools
+    agent.call_tool = call_with_local_tools
+    return agent
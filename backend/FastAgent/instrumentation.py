@@ -0,0 +1,44 @@
+import time
+from DataRetrievalTools.Metrics import RESULT_BYTES, TOOL_CALLS, count_tokens, observe, span
+
+
+def instrument_agent(agent):
+    """Record the agent's LLM calls and tool calls as stages.
+
+    Each completion in fast-agent's OpenAI provider starts with
+    _log_chat_progress and ends when _process_stream returns the final
+    completion with its usage, so those two time one LLM call. call_tool
+    on the agent covers dispatch plus the MCP round trip (or the in-process
+    call), so comparing it with the tool's own stage shows the IPC cost.
+    """
+    # Agents expose no public accessor for their LLM.
+    llm = agent._llm
+    log_chat_progress = llm._log_chat_progress
+    process_stream = llm._process_stream
+    call_tool = agent.call_tool
+    started = {}
+
+    def on_completion_start(*args, **kwargs):
+        started["llm"] = time.perf_counter()
+        return log_chat_progress(*args, **kwargs)
+
+    async def on_completion_stream(stream, model):
+        response = await process_stream(stream, model)
+        if "llm" in started:
+            observe("agent_llm", time.perf_counter() - started.pop("llm"))
+        count_tokens("agent_llm", getattr(response, "usage", None))
+        return response
+
+    async def timed_call_tool(name, arguments=None):
+        with span("tool_call"):
+            result = await call_tool(name, arguments)
+        TOOL_CALLS.labels(name, "error" if result.isError else "ok").inc()
+        RESULT_BYTES.labels(name).observe(
+            sum(len(getattr(item, "text", "") or "") for item in result.content)
+        )
+        return result
+
+    llm._log_chat_progress = on_completion_start
+    llm._process_stream = on_completion_stream
+    agent.call_tool = timed_call_tool
+    return agent
@@ -5,14 +5,23 @@ from mcp.server.fastmcp import FastMCP
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from DataRetrievalTools.QuerySearch import getquery
+from DataRetrievalTools.Metrics import trace
+from DataRetrievalTools.Startup import log, prewarm, timed
+from DataRetrievalTools.LiveIngest import start_live_ingest
+with timed("imports"):
+    from DataRetrievalTools.QuerySearch import getquery, log_store
 
 mcp = FastMCP("QueryLogsServer")
 
-@mcp.tool(description= "Query logs using structured filters. Best for querying logs via structured filtering for aggregation, timestamp, and exact queries. You are supposed pass detailed context about logs to this tool such as certain flags, keywords, and structure which you can get from the searchlogserver.")
-async def search_logs_tool(prompt: str, context: dict = None) -> str:
-    print(context)
-    return await getquery(prompt, context)
+@mcp.tool(description= "Query logs using structured filters. Best for querying logs via structured filtering for aggregation, timestamp, and exact queries. You are supposed pass detailed context about logs to this tool such as certain flags, keywords, and structure which you can get from the searchlogserver. Raw log results are paged: if the result has a next_cursor, call again with cursor set to it to get the next page.")
+async def search_logs_tool(prompt: str, context: dict = None, cursor: str = None) -> dict:
+    log(context)
+    with trace("tool_query_logs", prompt=prompt):
+        return await getquery(prompt, context, cursor=cursor)
 
 if __name__ == "__main__":
+    # Answer the MCP handshake right away; indexes and models load in the background.
+    prewarm(log_store)
+    # With LIVE_TAIL_PATH set, newly appended logs are picked up without a restart.
+    start_live_ingest(store=True)
     mcp.run(transport="stdio")
\ No newline at end of file
@@ -5,13 +5,22 @@ from mcp.server.fastmcp import FastMCP
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from DataRetrievalTools.LlamaSearch import search_logs_llama
+from DataRetrievalTools.Metrics import trace
+from DataRetrievalTools.Startup import prewarm, timed
+from DataRetrievalTools.LiveIngest import start_live_ingest
+with timed("imports"):
+    from DataRetrievalTools.LlamaSearch import PREWARM, search_logs_llama
 
 mcp = FastMCP("SearchLogsServer")
 
 @mcp.tool()
-async def search_logs(prompt: str) -> dict:
-    return await search_logs_llama(prompt)
+async def search_logs(prompt: str) -> str:
+    with trace("tool_search_logs", prompt=prompt):
+        return await search_logs_llama(prompt)
 
 if __name__ == "__main__":
+    # Answer the MCP handshake right away; indexes and models load in the background.
+    prewarm(*PREWARM)
+    # With LIVE_TAIL_PATH set, newly appended logs are embedded and searchable without a restart.
+    start_live_ingest(index=True)
     mcp.run(transport="stdio")
\ No newline at end of file
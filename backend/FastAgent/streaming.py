@@ -0,0 +1,99 @@
+import time
+from contextlib import contextmanager
+
+
+class TurnStream:
+    """Events from one agent's LLM while a turn runs: token deltas and tool start/finish.
+
+    fast-agent has no streaming callback API. Its OpenAI provider always streams
+    and reports every content delta to _update_streaming_progress, and every
+    tool call goes through pre_tool_call/post_tool_call, so those three are
+    wrapped on the LLM instance. Events go to the queue set by capture(), and
+    are dropped when no one is listening. A turn run under shared() also sends
+    them to the queues of other sessions that joined it with follow().
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.followers = []
+        # Events of the shared turn so far, replayed to sessions that join it late.
+        self.replay = None
+        self._tool_started = {}
+
+    def emit(self, event, data):
+        if self.queue is not None:
+            self.queue.put_nowait((event, data))
+        if self.replay is not None:
+            self.replay.append((event, data))
+            for queue in self.followers:
+                queue.put_nowait((event, data))
+
+    def attach(self, agent):
+        # Agents expose no public accessor for their LLM.
+        llm = agent._llm
+        update_streaming_progress = llm._update_streaming_progress
+        pre_tool_call = llm.pre_tool_call
+        post_tool_call = llm.post_tool_call
+
+        def on_chunk(content, model, estimated_tokens):
+            self.emit("token", {"text": content})
+            return update_streaming_progress(content, model, estimated_tokens)
+
+        async def on_tool_start(tool_call_id, request):
+            self._tool_started[tool_call_id] = time.perf_counter()
+            self.emit("tool_start", {
+                "id": tool_call_id,
+                "name": request.params.name,
+                "arguments": request.params.arguments,
+            })
+            return await pre_tool_call(tool_call_id=tool_call_id, request=request)
+
+        async def on_tool_end(tool_call_id, request, result):
+            started = self._tool_started.pop(tool_call_id, None)
+            self.emit("tool_end", {
+                "id": tool_call_id,
+                "name": request.params.name,
+                "is_error": bool(result.isError),
+                "seconds": round(time.perf_counter() - started, 3) if started else None,
+            })
+            return await post_tool_call(tool_call_id=tool_call_id, request=request, result=result)
+
+        llm._update_streaming_progress = on_chunk
+        llm.pre_tool_call = on_tool_start
+        llm.post_tool_call = on_tool_end
+        return agent
+
+    @contextmanager
+    def capture(self, queue):
+        """Send this stream's events to queue for the duration of one turn"""
+        self.queue = queue
+        try:
+            yield queue
+        finally:
+            self.queue = None
+            self._tool_started.clear()
+
+    @contextmanager
+    def shared(self):
+        """Keep this turn's events for other sessions awaiting the same turn"""
+        self.replay = []
+        try:
+            yield self
+        finally:
+            self.replay = None
+            self.followers = []
+
+    @contextmanager
+    def follow(self, queue):
+        """Send the shared turn's events so far, then each new one, to queue (if any)"""
+        if queue is None or self.replay is None:
+            yield
+            return
+        for item in self.replay:
+            queue.put_nowait(item)
+        self.followers.append(queue)
+        try:
+            yield
+        finally:
+            if queue in self.followers:
+                self.followers.remove(queue)
@@ -1,37 +1,76 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from FastAgent.agent import fast
+from FastAgent.agent import AGENT_NAME, fast, has_history, new_agent_app, record_turn, release_agents
+from DataRetrievalTools.QueryCache import LRUCache, SingleFlight, normalize_prompt
+from DataRetrievalTools.Metrics import render_metrics, reset_metrics, trace
+from FastAgent.streaming import TurnStream
+from collections import OrderedDict
 import asyncio
 import logging
 import json
+import os
+import time
 import uuid
 from typing import Dict, Any, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound on live conversations; each holds its own agents and history.
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "8"))
+# Conversations untouched for this long are closed to free their slot.
+SESSION_IDLE_SECONDS = int(os.getenv("CHAT_SESSION_IDLE_SECONDS", "900"))
+# How long a new conversation waits for a slot when every session is busy.
+SESSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", "30"))
+
+# How long the answer to a conversation's opening question is reused for other sessions.
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("CHAT_RESPONSE_CACHE_TTL_SECONDS", "30"))
+
+SESSION_HEADER = "X-Session-Id"
+SESSION_COOKIE = "session_id"
+
+class PoolSaturated(Exception):
+    pass
+
+# Opening questions are stateless: the answer depends only on the question, so identical
+# ones asked at the same time share one agent turn, and answers are reused for a short while.
+response_cache = LRUCache(max_entries=256, ttl_seconds=RESPONSE_CACHE_TTL_SECONDS)
+turn_flights = SingleFlight()
+# Stream of the session running each coalesced turn, so the sessions sharing it get its tokens too.
+turn_streams: Dict[str, TurnStream] = {}
+
 class ChatManager:
-    def __init__(self):
+    """One conversation: its own agents and history, used by one request at a time"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
         self.agent = None
-        self.agent_context = None
+        self.agents = None
         self.pending_human_inputs: Dict[str, Dict] = {}
+        self.lock = asyncio.Lock()
+        # Token and tool events of the running turn, for the streaming endpoint.
+        self.stream = TurnStream()
+        # Requests holding or waiting for this session; only idle sessions are evicted.
+        self.active = 0
+        self.last_used = time.monotonic()
     
     async def start(self):
-        """Start persistent agent context"""
-        if not self.agent_context:
-            logger.info("Starting persistent agent context...")
-            self.agent_context = fast.run()
-            self.agent = await self.agent_context.__aenter__()
+        """Create this session's agents"""
+        if not self.agent:
+            logger.info(f"Starting agents for session {self.session_id}...")
+            self.agent, self.agents = await new_agent_app()
+            self.stream.attach(self.agent[AGENT_NAME])
             logger.info("Agent context started successfully")
     
     async def stop(self):
-        """Stop agent context"""
-        if self.agent_context:
-            logger.info("Stopping agent context...")
-            await self.agent_context.__aexit__(None, None, None)
-            self.agent_context = None
+        """Release this session's agents; the MCP connections they share stay open"""
+        if self.agents:
+            logger.info(f"Stopping agents for session {self.session_id}...")
+            release_agents(self.agents)
+            self.agents = None
             self.agent = None
             logger.info("Agent context stopped")
     
@@ -75,13 +114,56 @@ class ChatManager:
         # Fallback to a generic prompt
         return "Please provide additional information:"
     
+    def is_stateless(self) -> bool:
+        """Whether the next message opens the conversation, so its answer doesn't depend on history"""
+        return not self.pending_human_inputs and not has_history(self.agent)
+    
+    async def run_turn(self, message: str) -> str:
+        """Agent's answer to message, shared with identical opening questions from other sessions"""
+        if not self.is_stateless():
+            return await self.agent(message)
+        
+        key = normalize_prompt(message).lower()
+        cached = response_cache.get(key)
+        if cached is not None:
+            logger.info("Answering opening question from the response cache")
+            await record_turn(self.agent, message, cached)
+            return cached
+        
+        ran_here = False
+        async def run():
+            nonlocal ran_here
+            ran_here = True
+            return await self.agent(message)
+        
+        # Registered before the flight starts, so whoever joins it also finds its stream.
+        leader = turn_streams.setdefault(key, self.stream)
+        try:
+            if leader is self.stream:
+                with self.stream.shared():
+                    result = await turn_flights.run(key, run)
+            else:
+                with leader.follow(self.stream.queue):
+                    result = await turn_flights.run(key, run)
+        finally:
+            if leader is self.stream:
+                del turn_streams[key]
+        if ran_here:
+            if not self.is_human_input_request(result):
+                response_cache.set(key, result)
+        else:
+            logger.info("Shared an identical in-flight agent turn")
+            await record_turn(self.agent, message, result)
+        return result
+    
     async def chat(self, message: str) -> Dict[str, Any]:
         """Send message to persistent agent and get immediate response"""
         if not self.agent:
             await self.start()
         
         logger.info(f"Sending message to agent: {message}")
-        result = await self.agent(message)
+        with trace("agent_turn", session=self.session_id, message=message):
+            result = await self.run_turn(message)
         logger.info("Received response from agent")
         
         # Check if this is a human input request
@@ -155,16 +237,169 @@ class ChatManager:
             "result": str(result)
         }
 
-chat_manager = ChatManager()
+class SessionPool:
+    """Bounded set of conversations keyed by session id.
+
+    A single fast.run() context owns the MCP server connections; each session
+    gets its own agents on top of it. Requests for one session run one at a
+    time. A new session takes a free slot, else the least recently used idle
+    session's slot, else waits up to SESSION_QUEUE_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, idle_seconds=SESSION_IDLE_SECONDS,
+                 queue_timeout=SESSION_QUEUE_TIMEOUT_SECONDS):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.queue_timeout = queue_timeout
+        self.sessions: "OrderedDict[str, ChatManager]" = OrderedDict()
+        self.root_context = None
+        self.waiting = 0
+        self._changed = asyncio.Condition()
+        self._reaper = None
+
+    async def start(self):
+        if not self.root_context:
+            logger.info("Starting persistent agent context...")
+            self.root_context = fast.run()
+            await self.root_context.__aenter__()
+            self._reaper = asyncio.create_task(self._evict_idle_forever())
+
+    async def stop(self):
+        if self._reaper:
+            self._reaper.cancel()
+            self._reaper = None
+        for session in list(self.sessions.values()):
+            await session.stop()
+        self.sessions.clear()
+        if self.root_context:
+            await self.root_context.__aexit__(None, None, None)
+            self.root_context = None
+
+    def _idle_victim(self):
+        for session in self.sessions.values():
+            if session.active == 0:
+                return session
+        return None
+
+    async def _admit(self, session_id):
+        """Reserve session_id's session, making room for it if needed"""
+        deadline = time.monotonic() + self.queue_timeout
+        evicted = None
+        async with self._changed:
+            self.waiting += 1
+            try:
+                while True:
+                    session = self.sessions.get(session_id)
+                    if session is None and len(self.sessions) >= self.max_sessions:
+                        evicted = self._idle_victim()
+                        if evicted is not None:
+                            del self.sessions[evicted.session_id]
+                    if session is None and len(self.sessions) < self.max_sessions:
+                        session = ChatManager(session_id)
+                        self.sessions[session_id] = session
+                    if session is not None:
+                        self.sessions.move_to_end(session_id)
+                        session.active += 1
+                        return session, evicted
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolSaturated(f"All {self.max_sessions} chat sessions are busy")
+                    try:
+                        await asyncio.wait_for(self._changed.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+
+    async def _release(self, session):
+        async with self._changed:
+            session.active -= 1
+            session.last_used = time.monotonic()
+            self._changed.notify_all()
+
+    @asynccontextmanager
+    async def session(self, session_id):
+        """Exclusive use of session_id's conversation, starting it if new"""
+        session, evicted = await self._admit(session_id)
+        try:
+            if evicted is not None:
+                logger.info(f"Evicting idle session {evicted.session_id} to admit {session_id}")
+                await evicted.stop()
+            async with session.lock:
+                await session.start()
+                yield session
+        finally:
+            await self._release(session)
+
+    async def close(self, session_id):
+        """End session_id's conversation once no request is using it"""
+        async with self._changed:
+            session = self.sessions.get(session_id)
+            if session is None or session.active:
+                return session is None
+            del self.sessions[session_id]
+            self._changed.notify_all()
+        await session.stop()
+        return True
+
+    async def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        async with self._changed:
+            expired = [s for s in self.sessions.values() if s.active == 0 and s.last_used < cutoff]
+            for session in expired:
+                del self.sessions[session.session_id]
+            if expired:
+                self._changed.notify_all()
+        for session in expired:
+            logger.info(f"Closing idle session {session.session_id}")
+            await session.stop()
+
+    async def _evict_idle_forever(self):
+        while True:
+            await asyncio.sleep(max(1, min(60, self.idle_seconds / 2)))
+            try:
+                await self.evict_idle()
+            except Exception as e:
+                logger.error(f"Idle session eviction failed: {str(e)}")
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "busy_sessions": sum(1 for s in self.sessions.values() if s.active),
+            "max_sessions": self.max_sessions,
+            "waiting_requests": self.waiting,
+            "coalesced_turns": turn_flights.stats(),
+            "cached_answers": len(response_cache),
+        }
+
+session_pool = SessionPool()
+
+def session_id_for(request: Request, response: Optional[Response] = None) -> str:
+    """Session id from the X-Session-Id header or cookie; new clients get one in a cookie"""
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    if response is not None:
+        remember_session(response, session_id)
+    return session_id
+
+def remember_session(response: Response, session_id: str):
+    response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+    response.headers[SESSION_HEADER] = session_id
+
+def saturated_error(e: PoolSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
-        await chat_manager.start()
-        logger.info("FastAPI app started with persistent agent")
+        # Before the tool servers start, so their samples aren't wiped.
+        reset_metrics()
+        await session_pool.start()
+        logger.info("FastAPI app started with agent session pool")
         yield
     finally:
-        await chat_manager.stop()
+        await session_pool.stop()
         logger.info("FastAPI app shutdown complete")
 
 app = FastAPI(lifespan=lifespan)
@@ -175,6 +410,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[SESSION_HEADER],
 )
 
 class PromptRequest(BaseModel):
@@ -191,11 +427,12 @@ class PromptResponse(BaseModel):
     request_id: Optional[str] = None
     prompt: Optional[str] = None
     description: Optional[str] = None
+    session_id: Optional[str] = None
 
 @app.post("/get_prompt", response_model=PromptResponse)
-async def search_logs(prompt_request: PromptRequest):
+async def search_logs(prompt_request: PromptRequest, request: Request, response: Response):
     """
-    Process user query with persistent conversation context.
+    Process user query within the caller's conversation.
     Returns immediate response or human input request.
     """
     try:
@@ -204,9 +441,11 @@ async def search_logs(prompt_request: PromptRequest):
         if not user_query.strip():
             raise HTTPException(status_code=400, detail="Prompt cannot be empty")
         
-        logger.info(f"Processing query: {user_query}")
+        session_id = session_id_for(request, response)
+        logger.info(f"Processing query for session {session_id}: {user_query}")
         
-        result = await chat_manager.chat(user_query)
+        async with session_pool.session(session_id) as chat_manager:
+            result = await chat_manager.chat(user_query)
         
         if result["type"] == "human_input_required":
             logger.info("Returning human input request to frontend")
@@ -215,29 +454,94 @@ async def search_logs(prompt_request: PromptRequest):
                 request_id=result["request_id"],
                 prompt=result["prompt"],
                 description=result["description"],
-                status="requires_input"
+                status="requires_input",
+                session_id=session_id
             )
         else:
             logger.info("Query processed successfully")
             return PromptResponse(
                 result=result["result"],
-                type="normal_response"
+                type="normal_response",
+                session_id=session_id
             )
         
+    except HTTPException:
+        raise
+    except PoolSaturated as e:
+        raise saturated_error(e)
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_chat(session_id: str, user_query: str):
+    """Server-sent events for one turn: token and tool_start/tool_end as they happen,
+    then normal_response or human_input_required with the same fields as /get_prompt"""
+    yield sse_event("session", {"session_id": session_id})
+    try:
+        async with session_pool.session(session_id) as chat_manager:
+            queue: asyncio.Queue = asyncio.Queue()
+            with chat_manager.stream.capture(queue):
+                turn = asyncio.create_task(chat_manager.chat(user_query))
+                turn.add_done_callback(lambda _: queue.put_nowait(None))
+                try:
+                    while (item := await queue.get()) is not None:
+                        yield sse_event(*item)
+                finally:
+                    if not turn.done():
+                        # The client went away mid-turn; finish it so the session history stays whole.
+                        await asyncio.shield(turn)
+            result = turn.result()
+    except PoolSaturated as e:
+        yield sse_event("error", {"status": 503, "detail": str(e)})
+        return
+    except Exception as e:
+        logger.error(f"Error streaming query: {str(e)}")
+        yield sse_event("error", {"status": 500, "detail": f"Error processing query: {str(e)}"})
+        return
+
+    if result["type"] == "human_input_required":
+        yield sse_event("human_input_required", {
+            "request_id": result["request_id"],
+            "prompt": result["prompt"],
+            "description": result["description"],
+            "status": "requires_input",
+        })
+    else:
+        yield sse_event("normal_response", {"result": result["result"], "status": "success"})
+
+@app.post("/get_prompt/stream")
+async def stream_search_logs(prompt_request: PromptRequest, request: Request):
+    """Streaming variant of /get_prompt: the first token arrives long before the turn ends"""
+    user_query = prompt_request.prompt
+    if not user_query.strip():
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    
+    session_id = session_id_for(request)
+    logger.info(f"Streaming query for session {session_id}: {user_query}")
+    response = StreamingResponse(
+        stream_chat(session_id, user_query),
+        media_type="text/event-stream",
+        # No proxy buffering, or the events arrive all at once at the end.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    remember_session(response, session_id)
+    return response
+
 @app.post("/submit_human_input")
-async def submit_human_input(input_request: HumanInputRequest):
+async def submit_human_input(input_request: HumanInputRequest, request: Request, response: Response):
     """Submit human input and continue the conversation"""
     try:
         logger.info(f"Submitting human input for request {input_request.request_id}")
         
-        result = await chat_manager.submit_human_input(
-            input_request.request_id, 
-            input_request.user_input
-        )
+        session_id = session_id_for(request, response)
+        async with session_pool.session(session_id) as chat_manager:
+            result = await chat_manager.submit_human_input(
+                input_request.request_id, 
+                input_request.user_input
+            )
         
         if result["type"] == "human_input_required":
             return PromptResponse(
@@ -245,38 +549,46 @@ async def submit_human_input(input_request: HumanInputRequest):
                 request_id=result["request_id"],
                 prompt=result["prompt"],
                 description=result["description"],
-                status="requires_input"
+                status="requires_input",
+                session_id=session_id
             )
         else:
             return PromptResponse(
                 result=result["result"],
-                type="normal_response"
+                type="normal_response",
+                session_id=session_id
             )
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except PoolSaturated as e:
+        raise saturated_error(e)
     except Exception as e:
         logger.error(f"Error submitting human input: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error submitting human input: {str(e)}")
 
 @app.get("/pending_requests")
-async def get_pending_requests():
-    """Get list of pending human input requests"""
+async def get_pending_requests(request: Request, response: Response):
+    """Get list of pending human input requests for the caller's session"""
+    session = session_pool.sessions.get(session_id_for(request, response))
+    pending = list(session.pending_human_inputs.keys()) if session else []
     return {
-        "pending_requests": list(chat_manager.pending_human_inputs.keys()),
-        "count": len(chat_manager.pending_human_inputs)
+        "pending_requests": pending,
+        "count": len(pending)
     }
 
 @app.post("/reset_conversation")
-async def reset_conversation():
-    """Reset the conversation history while keeping the agent running"""
+async def reset_conversation(request: Request, response: Response):
+    """Reset the caller's conversation; other sessions are untouched"""
     try:
-        logger.info("Resetting conversation...")
-        chat_manager.pending_human_inputs.clear()
-        await chat_manager.stop()
-        await chat_manager.start()
+        session_id = session_id_for(request, response)
+        logger.info(f"Resetting conversation for session {session_id}...")
+        if not await session_pool.close(session_id):
+            raise HTTPException(status_code=409, detail="A request for this session is still running")
         logger.info("Conversation reset successfully")
         return {"status": "success", "message": "Conversation history reset"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error resetting conversation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error resetting conversation: {str(e)}")
@@ -285,22 +597,29 @@ async def reset_conversation():
 async def health_check():
     """Check if the app and agent are healthy"""
     try:
-        if chat_manager.agent:
-            return {"status": "healthy", "agent_status": "running"}
+        if session_pool.root_context:
+            return {"status": "healthy", "agent_status": "running", **session_pool.stats()}
         else:
             return {"status": "healthy", "agent_status": "not_initialized"}
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape of stage latencies, token and tool counters from the app and the tool servers"""
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(content=body, media_type=content_type)
+
 @app.get("/agent_status")
 async def agent_status():
     """Get detailed agent status"""
     return {
-        "agent_initialized": chat_manager.agent is not None,
-        "context_active": chat_manager.agent_context is not None,
-        "status": "ready" if chat_manager.agent else "not_ready",
-        "pending_inputs": len(chat_manager.pending_human_inputs)
+        "agent_initialized": session_pool.root_context is not None,
+        "context_active": session_pool.root_context is not None,
+        "status": "ready" if session_pool.root_context else "not_ready",
+        "pending_inputs": sum(len(s.pending_human_inputs) for s in session_pool.sessions.values()),
+        **session_pool.stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,293 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import uuid
+import numpy as np
+import pandas as pd
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from DataRetrievalTools.LogStore import COLUMN_NAMES
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+START = pd.Timestamp("2025-06-08 10:37:35")
+CLUSTER_UID = "a27c32fe-f4b1-47eb-90ff-922a0647c78b"
+NODES = ["ske-intgmn-qvthg-z8g9n", "ske-intgmn-qvthg-k2m4d", "ske-intgmn-qvthg-p7x1c"]
+PRODUCT_IDS = ["OLJCESPC7Z", "66VCHSJNUP", "1YMWWN1N4O", "L9ECAV7KIM", "2ZYFJ3GM2N",
+               "0PUK6V6EV0", "LS4PSXUNUM", "9SIQT8TOJO", "6E92ZMYYFZ", "HQTGWGPNH4"]
+CURRENCIES = ["USD", "EUR", "CAD", "JPY", "GBP"]
+ADDRESSES = [
+    ("150 Elgin St", "Ottawa", "ON", "Canada", "K2P1L4"),
+    ("1600 Amphitheatre Parkway", "Mountain View", "CA", "United States", "94043"),
+    ("Unter den Linden 77", "Berlin", "BE", "Germany", "10117"),
+    ("1-1 Marunouchi", "Tokyo", "13", "Japan", "1000005"),
+]
+
+# Runtimes as the OTel demo reports them: (process.runtime.name, version, description, sdk language, sdk version, schema).
+JAVA = ("OpenJDK Runtime Environment", "21.0.6+7-LTS", "Eclipse Adoptium OpenJDK 64-Bit Server VM 21.0.6+7-LTS", "java", "1.47.0", "https://opentelemetry.io/schemas/1.24.0")
+DOTNET = (".NET", "8.0.13", ".NET 8.0.13", "dotnet", "1.11.1", "https://opentelemetry.io/schemas/1.6.1")
+GO = ("go", "go1.23.4", "go version go1.23.4 linux/amd64", "go", "1.34.0", "https://opentelemetry.io/schemas/1.26.0")
+NODEJS = ("nodejs", "22.13.1", "Node.js", "nodejs", "1.30.1", "https://opentelemetry.io/schemas/1.7.0")
+PYTHON = ("CPython", "3.12.8", "3.12.8 (main) [GCC 12.2.0]", "python", "1.29.0", "https://opentelemetry.io/schemas/1.11.0")
+
+# Per service: share of all rows, runtime, replica count, and (severity, class name, message, weight).
+# ad and accounting carry the messages of testlog.csv; the rest follow the demo's other services.
+# {} in a message is filled per row from a small pool, so distinct texts stay bounded except
+# checkout's order ids, which give the index a realistic high-cardinality tail.
+SERVICES = {
+    "frontend": (0.30, NODEJS, 3, [
+        ("INFO", "frontend.router", "GET /api/products/{} 200", 60),
+        ("INFO", "frontend.router", "GET /api/recommendations 200", 25),
+        ("WARN", "frontend.router", "GET /api/cart 504 upstream timeout", 3),
+        ("ERROR", "frontend.router", "Failed to fetch product {}: 14 UNAVAILABLE", 1),
+    ]),
+    "ad": (0.22, JAVA, 1, [
+        ("INFO", "oteldemo.problempattern.CPULoad", "High CPU-Load problempattern enabled", 38),
+        ("INFO", "oteldemo.AdService", "Targeted ad request received for [{}]", 32),
+        ("INFO", "oteldemo.AdService", "Non-targeted ad request received, preparing random response.", 7),
+        ("WARN", "oteldemo.AdService", "GetAds Failed with status Status{code=UNAVAILABLE, description=null, cause=null}", 3),
+    ]),
+    "cart": (0.14, DOTNET, 2, [
+        ("INFO", "cart.cartstore.ValkeyCartStore", "GetCartAsync called with userId={}", 55),
+        ("INFO", "cart.cartstore.ValkeyCartStore", "AddItemAsync called with userId={}", 35),
+        ("ERROR", "cart.cartstore.ValkeyCartStore", "Can't access cart storage. System.ApplicationException: Wasn't able to connect to redis", 2),
+    ]),
+    "accounting": (0.10, DOTNET, 1, [
+        ("INFO", "Accounting.Consumer", "Order details: {@OrderResult}.", 1),
+    ]),
+    "checkout": (0.08, GO, 2, [
+        ("INFO", "main", "order placed: {}", 50),
+        ("INFO", "main", "payment went through (transaction_id: {})", 40),
+        ("WARN", "main", "failed to send order confirmation: rpc error: code = Unavailable", 4),
+        ("ERROR", "main", "failed to charge card: could not charge the card: rpc error: code = Unknown desc = Payment request failed. Invalid token.", 2),
+    ]),
+    "payment": (0.06, NODEJS, 1, [
+        ("INFO", "charge", "Transaction complete.", 80),
+        ("WARN", "charge", "Card is expired", 4),
+        ("ERROR", "charge", "Payment request failed. Invalid token. app.loyalty.level=gold", 2),
+    ]),
+    "recommendation": (0.05, PYTHON, 1, [
+        ("INFO", "recommendation_server", "Receive ListRecommendations for product ids:[{}]", 90),
+        ("WARN", "recommendation_server", "Cache miss, fetching product catalog", 6),
+    ]),
+    "shipping": (0.03, GO, 1, [
+        ("INFO", "shipping", "Received quote request for {} items", 70),
+        ("INFO", "shipping", "Shipping order for tracking id {}", 25),
+    ]),
+    "email": (0.015, PYTHON, 1, [
+        ("INFO", "email_server", "Order confirmation email sent to \"{}\".", 95),
+        ("ERROR", "email_server", "Failed to send order confirmation email: SMTP timeout", 1),
+    ]),
+    "fraud-detection": (0.005, JAVA, 1, [
+        ("INFO", "frauddetection.MainKt", "Consumed record with orderId: {}", 99),
+    ]),
+}
+SEVERITY_NUMBERS = {"DEBUG": 5, "INFO": 9, "WARN": 13, "ERROR": 17}
+SLOTS = {
+    "Targeted ad request received for [{}]": ["accessories", "assembly", "binoculars", "books", "telescopes", "travel"],
+    "GET /api/products/{} 200": PRODUCT_IDS,
+    "Failed to fetch product {}: 14 UNAVAILABLE": PRODUCT_IDS,
+    "Receive ListRecommendations for product ids:[{}]": PRODUCT_IDS,
+    "Received quote request for {} items": [str(n) for n in range(1, 11)],
+}
+# An outage in the middle of the run: this service's WARN/ERROR messages are this many times likelier.
+INCIDENT_SERVICE = "cart"
+INCIDENT_WINDOW = (0.45, 0.50)
+INCIDENT_FACTOR = 40
+
+
+def hex_ids(rng, count, nbytes):
+    """count random lowercase hex ids of nbytes bytes each"""
+    blob = rng.bytes(count * nbytes).hex()
+    width = 2 * nbytes
+    return [blob[i:i + width] for i in range(0, len(blob), width)]
+
+
+def random_uuid(rng):
+    return str(uuid.UUID(bytes=rng.bytes(16)))
+
+
+def resource_blob(service, runtime, pod, rng):
+    runtime_name, runtime_version, description, language, sdk_version, _ = runtime
+    attributes = {
+        "host.arch": "amd64",
+        "host.name": pod,
+        "k8s.cluster.uid": CLUSTER_UID,
+        "k8s.deployment.name": service,
+        "k8s.namespace.name": "demo",
+        "k8s.node.name": NODES[int(rng.integers(len(NODES)))],
+        "k8s.pod.ip": f"172.21.221.{int(rng.integers(2, 250))}",
+        "k8s.pod.name": pod,
+        "k8s.pod.uid": random_uuid(rng),
+        "os.type": "linux",
+        "process.pid": "1",
+        "process.runtime.description": description,
+        "process.runtime.name": runtime_name,
+        "process.runtime.version": runtime_version,
+        "service.name": service,
+        "service.namespace": "opentelemetry-demo",
+        "service.version": "2.0.1",
+        "telemetry.sdk.language": language,
+        "telemetry.sdk.name": "opentelemetry",
+        "telemetry.sdk.version": sdk_version,
+    }
+    # The export writes resource attributes as a single-quoted pseudo-JSON dict.
+    return "{" + ",".join(f"'{key}':'{value}'" for key, value in attributes.items()) + "}"
+
+
+def order_blob(order_id, rng):
+    currency = CURRENCIES[int(rng.integers(len(CURRENCIES)))]
+    street, city, state, country, zip_code = ADDRESSES[int(rng.integers(len(ADDRESSES)))]
+
+    def money():
+        return {"currencyCode": currency, "units": str(int(rng.pareto(2.0) * 50)), "nanos": int(rng.integers(1e9))}
+
+    order = {
+        "orderId": order_id,
+        "shippingTrackingId": random_uuid(rng),
+        "shippingCost": money(),
+        "shippingAddress": {"streetAddress": street, "city": city, "state": state, "country": country, "zipCode": zip_code},
+        "items": [
+            {"item": {"productId": PRODUCT_IDS[int(rng.integers(len(PRODUCT_IDS)))], "quantity": int(rng.integers(1, 6))},
+             "cost": money()}
+            for _ in range(int(rng.integers(1, 5)))
+        ],
+    }
+    return "{'@OrderResult':'" + json.dumps(order) + "'}"
+
+
+class LogGenerator:
+    """Rows in testlog.csv's layout, generated chunk by chunk from one seed"""
+
+    def __init__(self, rows, seed=0, rows_per_second=20.0):
+        self.rows = rows
+        self.rows_per_second = rows_per_second
+        self.rng = np.random.default_rng(seed)
+        self.services = list(SERVICES)
+        self.service_weights = np.array([SERVICES[name][0] for name in self.services])
+        self.service_weights /= self.service_weights.sum()
+        self.pods = {}
+        for name in self.services:
+            _, runtime, replicas, _ = SERVICES[name]
+            self.pods[name] = [
+                resource_blob(name, runtime, f"{name}-{self.rng.integers(16**9):09x}-{self.rng.integers(36**5):05x}", self.rng)
+                for _ in range(replicas)
+            ]
+        self.clock = START.value
+        self.position = 0
+
+    def _messages(self, service, count, incident):
+        templates = SERVICES[service][3]
+        weights = np.array([weight for *_, weight in templates], dtype=float)
+        failing = np.array([severity in ("WARN", "ERROR") for severity, *_ in templates])
+        normal = weights / weights.sum()
+        boosted = np.where(failing, weights * INCIDENT_FACTOR, weights)
+        boosted /= boosted.sum()
+        picks = np.where(
+            incident & (service == INCIDENT_SERVICE),
+            self.rng.choice(len(templates), size=count, p=boosted),
+            self.rng.choice(len(templates), size=count, p=normal),
+        )
+        return picks
+
+    def _fill(self, template, count):
+        if "{}" not in template:
+            return [template] * count
+        if template in SLOTS:
+            pool = SLOTS[template]
+            return [template.format(pool[i]) for i in self.rng.integers(len(pool), size=count)]
+        # Identifiers: unique per row (order ids, transactions) or from a few thousand users.
+        if "userId" in template or "email" in template:
+            suffix = "@example.com" if "email" in template else ""
+            return [template.format(f"user-{i:04d}{suffix}") for i in self.rng.zipf(1.3, size=count) % 5000]
+        slots = template.count("{}")
+        ids = hex_ids(self.rng, count * slots, 8)
+        return [template.format(*ids[i * slots:(i + 1) * slots]) for i in range(count)]
+
+    def chunk(self, size):
+        """The next size rows as a DataFrame with COLUMN_NAMES columns"""
+        # Exponential gaps: a Poisson arrival process at rows_per_second.
+        gaps = self.rng.exponential(1e9 / self.rows_per_second, size=size).astype(np.int64)
+        stamps = self.clock + np.cumsum(gaps)
+        self.clock = int(stamps[-1])
+        progress = (self.position + np.arange(size)) / max(self.rows, 1)
+        incident = (progress >= INCIDENT_WINDOW[0]) & (progress < INCIDENT_WINDOW[1])
+        self.position += size
+
+        services = self.rng.choice(len(self.services), size=size, p=self.service_weights)
+        frame = pd.DataFrame(index=range(size), columns=COLUMN_NAMES, dtype=object)
+        # Many rows share a second, so format each second once.
+        seconds, second_codes = np.unique(stamps // 1_000_000_000, return_inverse=True)
+        simple = pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)[second_codes]
+        frame["timestamp_simple"] = simple
+        frame["timestamp_full"] = simple + np.array([f".{ns:09d}" for ns in (stamps % 1_000_000_000).tolist()], dtype=object)
+        frame["unknown5"] = ""
+        frame["unknown6"] = ""
+        frame["unknown7"] = "{}"
+        frame["order_result_json"] = "{}"
+
+        # A third of rows carry no trace context; the rest come ~3 rows per trace.
+        traced = self.rng.random(size) > 0.3
+        traces = np.array(hex_ids(self.rng, size // 3 + 1, 16), dtype=object)[np.arange(size) // 3]
+        frame["unknown1"] = np.where(traced, traces, "")
+        frame["unknown2"] = np.where(traced, np.array(hex_ids(self.rng, size, 8), dtype=object), "")
+        frame["unknown3"] = traced.astype(int)
+
+        for code, name in enumerate(self.services):
+            rows = np.flatnonzero(services == code)
+            if not len(rows):
+                continue
+            _, runtime, _, templates = SERVICES[name]
+            frame.loc[rows, "ServiceName"] = name
+            frame.loc[rows, "schema_url"] = runtime[5]
+            pods = self.pods[name]
+            frame.loc[rows, "metadata_json"] = [pods[i] for i in self.rng.integers(len(pods), size=len(rows))]
+            picks = self._messages(name, len(rows), incident[rows])
+            for pick, (severity, class_name, template, _) in enumerate(templates):
+                selected = rows[picks == pick]
+                if not len(selected):
+                    continue
+                frame.loc[selected, "SeverityText"] = severity
+                frame.loc[selected, "unknown4"] = SEVERITY_NUMBERS[severity]
+                frame.loc[selected, "class_name"] = class_name
+                frame.loc[selected, "message"] = self._fill(template, len(selected))
+                if template == "Order details: {@OrderResult}.":
+                    frame.loc[selected, "order_result_json"] = [
+                        order_blob(random_uuid(self.rng), self.rng) for _ in range(len(selected))
+                    ]
+        frame["unknown4"] = frame["unknown4"].astype(int)
+        return frame
+
+    def write(self, path, chunk_size=100_000):
+        with open(path, "w", newline="") as f:
+            remaining = self.rows
+            while remaining > 0:
+                size = min(chunk_size, remaining)
+                # Same quoting as the export: strings quoted, the two integer columns bare.
+                self.chunk(size).to_csv(f, header=False, index=False, quoting=csv.QUOTE_NONNUMERIC)
+                remaining -= size
+        return path
+
+
+def generate(rows, path, seed=0, rows_per_second=20.0, chunk_size=100_000):
+    """Write rows synthetic logs to path; the same seed always gives the same file"""
+    return LogGenerator(rows, seed=seed, rows_per_second=rows_per_second).write(path, chunk_size)
+
+
+def parse_rows(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic OTel logs in testlog.csv's layout")
+    parser.add_argument("--rows", type=parse_rows, default="10k", help="row count, or one of 10k, 1m, 10m")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rows-per-second", type=float, default=20.0, help="mean log rate the timestamps follow")
+    args = parser.parse_args()
+    generate(args.rows, args.out, args.seed, args.rows_per_second)
+    print(f"Wrote {args.rows} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
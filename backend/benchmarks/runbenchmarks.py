@@ -0,0 +1,460 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import httpx
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from benchmarks.generatelogs import generate, parse_rows
+
+# python benchmarks/runbenchmarks.py --rows 1m                      all suites on a generated 1M-row log
+# python benchmarks/runbenchmarks.py --suites filters,aggregation --baseline old.json
+# python benchmarks/runbenchmarks.py --suites http --recordings llm.json --record   (needs API_KEY, calls OpenAI)
+# Results go to <workdir>/results-<commit>.json; suite output to <workdir>/<suite>.log.
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SUITES = ("filters", "aggregation", "ingest", "search", "http")
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "log-assistant-benchmarks")
+
+SEARCH_PROMPTS = [
+    "errors in the cart service",
+    "WARN logs from ad",
+    "payment failed with an invalid token",
+    "redis connection problems",
+    "high CPU load pattern",
+    "targeted ad requests for telescopes",
+    "order confirmation email failures",
+    "expired cards in payment",
+]
+HTTP_PROMPTS = [
+    "How many errors per service?",
+    "Show me warnings from the ad service",
+    "What is the p95 shipping cost by currency?",
+    "Why is the cart service failing?",
+    "How many distinct pods are logging?",
+    "Count checkout errors per hour",
+]
+
+
+def summarize(suite, case, latencies, wall_seconds, **extra):
+    """One result row: latency percentiles in ms and completed calls per second"""
+    latencies = np.asarray(latencies, dtype=float) * 1000
+    return {
+        "suite": suite,
+        "case": case,
+        "n": len(latencies),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "mean_ms": round(float(latencies.mean()), 3),
+        "throughput_per_s": round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+        **extra,
+    }
+
+
+def measure(suite, case, fn, iterations, warmup=1, **extra):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(suite, case, latencies, time.perf_counter() - started, **extra)
+
+
+async def ameasure(suite, case, make_call, requests, concurrency, **extra):
+    """requests calls of make_call(i), at most concurrency at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            call_started = time.perf_counter()
+            await make_call(i)
+            latencies.append(time.perf_counter() - call_started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(suite, case, latencies, time.perf_counter() - started, concurrency=concurrency, **extra)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# Fixtures. Every suite runs in its own process (see main), pointed at the work dir by environment.
+
+def open_store(args):
+    if args.layout == "partitioned":
+        from DataRetrievalTools.PartitionedStore import PartitionedLogStore
+        return PartitionedLogStore.load(args.csv, os.path.join(args.workdir, "partitions"))
+    from DataRetrievalTools.LogStore import LogStore
+    return LogStore.load(args.csv, os.path.join(args.workdir, "store"))
+
+
+def ensure_index(args):
+    """The search index over args.csv, built with the stand-in embedding; incremental, so reruns are free"""
+    from DataRetrievalTools.embeddings import ingest
+    from DataRetrievalTools.VectorStore import default_index_dir
+    from benchmarks.standins import HashEmbedding
+    ingest(args.csv, default_index_dir(), chunk_size=args.chunk_size, embed_model=HashEmbedding())
+
+
+def use_stand_in_embedding():
+    # The query-side model is the stand-in too, so query vectors match the index. The query
+    # cache keys on the real model's name, which is why EMBEDDING_CACHE_PATH is in the work dir.
+    from DataRetrievalTools.LlamaSearch import embedding_model
+    from benchmarks.standins import HashEmbedding
+    embedding_model.set(HashEmbedding())
+
+
+def time_window(store, start_fraction, end_fraction):
+    first, last = store.time_bounds()
+    to_text = lambda value: str(np.datetime64(int(value), "ns")).replace("T", " ")
+    return {"start": to_text(first + (last - first) * start_fraction), "end": to_text(first + (last - first) * end_fraction)}
+
+
+# Suites
+
+def bench_filters(args):
+    from DataRetrievalTools.QuerySearch import apply_filters
+    store = open_store(args)
+    cases = {
+        "severity": {"SeverityText_exact": "ERROR"},
+        "service": {"ServiceName_exact": "frontend"},
+        "service+severity": {"ServiceName_exact": "cart", "SeverityText_exact": "ERROR"},
+        "time_window_10pct": {"timestamp_full_range": time_window(store, 0.45, 0.55)},
+        "time+service": {"timestamp_full_range": time_window(store, 0.45, 0.55), "ServiceName_exact": "cart"},
+        "attribute": {"k8s.deployment.name_exact": "checkout"},
+        "no_match": {"ServiceName_exact": "does-not-exist"},
+    }
+    results = [measure("filters", name, lambda f=filters: apply_filters(store, f), args.iterations)
+               for name, filters in cases.items()]
+    results.append(measure("filters", "deep_page", lambda: apply_filters(store, {"ServiceName_exact": "ad"}, offset=5000),
+                           args.iterations))
+    return results
+
+
+def bench_aggregation(args):
+    from DataRetrievalTools.QuerySearch import apply_aggregation, apply_filters
+    store = open_store(args)
+    cases = {
+        "count": ({}, {"count": True}),
+        "count_by_service": ({}, {"group_by": "ServiceName", "count": True}),
+        "count_by_service_errors": ({"SeverityText_exact": "ERROR"}, {"group_by": "ServiceName", "count": True}),
+        "hourly_by_service": ({}, {"group_by": ["timestamp_full", "ServiceName"], "time_bucket": "1h", "count": True}),
+        "minutely_window": ({"timestamp_full_range": time_window(store, 0.45, 0.5)},
+                            {"group_by": ["timestamp_full"], "time_bucket": "1m", "count": True}),
+        "p95_shipping_by_currency": ({}, {"group_by": "order.currencyCode",
+                                          "metrics": [{"op": "p95", "column": "order.shippingCost"}]}),
+        "approx_distinct_pods": ({}, {"metrics": [{"op": "approx_distinct", "column": "k8s.pod.name"}]}),
+    }
+    results = [measure("aggregation", name, lambda f=filters, a=aggregation: apply_filters(store, f, a), args.iterations)
+               for name, (filters, aggregation) in cases.items()]
+    if args.layout == "partitioned":
+        return results
+    # The pandas path on its own, as the rollups and bitmaps fall back to it.
+    frame = store.df
+    for name, aggregation in [("pandas_count_by_pod", {"group_by": "k8s.pod.name", "count": True}),
+                              ("pandas_grouped_samples", {"group_by": "ServiceName"})]:
+        results.append(measure("aggregation", name, lambda a=aggregation: apply_aggregation(store, frame, a), args.iterations))
+    return results
+
+
+def bench_ingest(args):
+    from DataRetrievalTools.embeddings import ingest
+    from benchmarks.standins import HashEmbedding
+    rows = sum(1 for _ in open(args.csv, "rb"))
+    persist_dir = os.path.join(args.workdir, "ingest")
+    results = []
+    for case, fresh_cache, rebuild in [("cold", True, True), ("warm_embedding_cache", False, True), ("no_new_rows", False, False)]:
+        latencies = []
+        for i in range(args.ingest_iterations):
+            if fresh_cache:
+                os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(args.workdir, f"ingest-embeddings-{i}.sqlite")
+                if os.path.exists(os.environ["EMBEDDING_CACHE_PATH"]):
+                    os.remove(os.environ["EMBEDDING_CACHE_PATH"])
+            started = time.perf_counter()
+            ingest(args.csv, persist_dir, chunk_size=args.chunk_size, rebuild=rebuild, embed_model=HashEmbedding())
+            latencies.append(time.perf_counter() - started)
+        result = summarize("ingest", case, latencies, sum(latencies))
+        result["rows_per_s"] = round(rows * len(latencies) / sum(latencies), 1)
+        results.append(result)
+    return results
+
+
+def bench_search(args):
+    ensure_index(args)
+    use_stand_in_embedding()
+    from DataRetrievalTools.LlamaSearch import search_logs_llama, spec_cache, vector_index
+
+    async def run():
+        started = time.perf_counter()
+        await vector_index.aget()
+        results = [summarize("search", "open_index", [time.perf_counter() - started], None)]
+        # First sight of each prompt: filters inferred (rules, else the stand-in LLM).
+        spec_cache.clear()
+        results.append(await ameasure("search", "cold_prompts", lambda i: search_logs_llama(SEARCH_PROMPTS[i]),
+                                      len(SEARCH_PROMPTS), 1))
+        prompts = [SEARCH_PROMPTS[i % len(SEARCH_PROMPTS)] for i in range(args.iterations)]
+        results.append(await ameasure("search", "repeat_prompts", lambda i: search_logs_llama(prompts[i]), len(prompts), 1))
+        results.append(await ameasure("search", "concurrent", lambda i: search_logs_llama(prompts[i]),
+                                      len(prompts), args.concurrency))
+        return results
+
+    return asyncio.run(run())
+
+
+def bench_http(args):
+    ensure_index(args)
+    use_stand_in_embedding()
+    from DataRetrievalTools.QuerySearch import log_store
+    log_store.set(open_store(args))
+    import uvicorn
+    from app import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("app failed to start")
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+
+    async def run():
+        # One session per concurrent user, each asking a series of questions.
+        sessions = [f"bench-{i}" for i in range(args.concurrency)]
+        prompts = [HTTP_PROMPTS[i % len(HTTP_PROMPTS)] for i in range(args.iterations)]
+        first_token = []
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+            async def ask(i):
+                response = await client.post("/get_prompt", json={"prompt": prompts[i]},
+                                             headers={"X-Session-Id": sessions[i % len(sessions)]})
+                response.raise_for_status()
+
+            async def ask_streaming(i):
+                started = time.perf_counter()
+                async with client.stream("POST", "/get_prompt/stream", json={"prompt": prompts[i]},
+                                         headers={"X-Session-Id": sessions[i % len(sessions)]}) as response:
+                    response.raise_for_status()
+                    seen_token = False
+                    async for line in response.aiter_lines():
+                        if line == "event: token" and not seen_token:
+                            seen_token = True
+                            first_token.append(time.perf_counter() - started)
+
+            # Session start-up (agent creation) happens once per user; keep it out of the turn numbers.
+            started = time.perf_counter()
+            await asyncio.gather(*(client.post("/get_prompt", json={"prompt": "hello"}, headers={"X-Session-Id": s})
+                                   for s in sessions))
+            results = [summarize("http", "session_start", [time.perf_counter() - started], None, concurrency=len(sessions))]
+            results.append(await ameasure("http", "POST /get_prompt", ask, len(prompts), args.concurrency))
+            results.append(await ameasure("http", "POST /get_prompt/stream", ask_streaming, len(prompts), args.concurrency))
+            if first_token:
+                results.append(summarize("http", "stream first token", first_token, None, concurrency=args.concurrency))
+            return results
+
+    try:
+        return asyncio.run(run())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=30)
+
+
+def prepare(args):
+    """Build the log store and search index up front, so no suite's numbers include them"""
+    open_store(args)
+    if {"search", "http"} & set(args.suites.split(",")):
+        ensure_index(args)
+    return []
+
+
+BENCHMARKS = {"prepare": prepare, "filters": bench_filters, "aggregation": bench_aggregation, "ingest": bench_ingest,
+              "search": bench_search, "http": bench_http}
+
+
+# Orchestration
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def suite_environment(args, llm_url):
+    """Point the app's indexes, caches and LLM clients at the work dir and the stand-in LLM"""
+    env = dict(os.environ)
+    env.update({
+        "VECTOR_INDEX_ROOT": os.path.join(args.workdir, "index"),
+        "EMBEDDING_CACHE_PATH": os.path.join(args.workdir, "embeddings.sqlite"),
+        "PLAN_CACHE_PATH": os.path.join(args.workdir, "plan_cache.sqlite"),
+        "PROMETHEUS_MULTIPROC_DIR": os.path.join(args.workdir, "metrics"),
+        "LOG_TOOLS_TRANSPORT": "inprocess",
+        # Every turn runs the agent; cached answers would hide the path being measured.
+        "CHAT_RESPONSE_CACHE_TTL_SECONDS": "0",
+        "CHAT_MAX_SESSIONS": str(max(8, args.concurrency)),
+        # QuerySearch's and fast-agent's AsyncOpenAI read OPENAI_BASE_URL, LlamaIndex's OpenAI reads OPENAI_API_BASE.
+        "OPENAI_BASE_URL": llm_url + "/v1",
+        "OPENAI_API_BASE": llm_url + "/v1",
+        "API_KEY": "stand-in",
+        "OPENAI_API_KEY": "stand-in",
+    })
+    env.pop("TRACE_DUMP_PATH", None)
+    return env
+
+
+def start_llm(args):
+    port = free_port()
+    command = [sys.executable, os.path.join(os.path.dirname(__file__), "standins.py"), "--port", str(port),
+               "--mode", "record" if args.record else "replay", "--latency-ms", str(args.llm_latency_ms),
+               "--tokens-per-second", str(args.llm_tokens_per_second)]
+    if args.recordings:
+        command += ["--recordings", args.recordings]
+    process = subprocess.Popen(command, stderr=open(os.path.join(args.workdir, "llm.log"), "w"))
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url + "/stats")
+            return process, url
+        except httpx.TransportError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"stand-in LLM did not start, see {args.workdir}/llm.log")
+
+
+def run_child(args):
+    """Run one suite in this process and write its rows, each with this process's peak RSS"""
+    results = BENCHMARKS[args.only](args)
+    for result in results:
+        result["peak_rss_mb"] = peak_rss_mb()
+    with open(args.result_file, "w") as f:
+        json.dump(results, f)
+
+
+def print_table(results):
+    header = f"{'suite':<12} {'case':<28} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'per s':>10} {'peak MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        throughput = r.get("rows_per_s") or r.get("throughput_per_s")
+        print(f"{r['suite']:<12} {r['case'][:28]:<28} {r['n']:>5} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+              f"{r['p99_ms']:>10.2f} {throughput if throughput is not None else '-':>10} {r.get('peak_rss_mb', '-'):>9}")
+
+
+def print_comparison(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["suite"], r["case"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path} (negative is faster):")
+    for r in results:
+        old = baseline.get((r["suite"], r["case"]))
+        if old and old["p50_ms"] and old["p95_ms"]:
+            print(f"{r['suite']:<12} {r['case'][:28]:<28} p50 {100 * (r['p50_ms'] / old['p50_ms'] - 1):+7.1f}%  "
+                  f"p95 {100 * (r['p95_ms'] / old['p95_ms'] - 1):+7.1f}%  "
+                  f"peak MB {r.get('peak_rss_mb', 0) - old.get('peak_rss_mb', 0):+.1f}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the log tools on synthetic logs with a stand-in LLM and embedding")
+    parser.add_argument("--rows", type=parse_rows, default="10k", help="rows to generate: a count, or 10k, 1m, 10m")
+    parser.add_argument("--csv", default=None, help="benchmark this CSV instead of generating one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layout", choices=["memory", "partitioned"], default="memory",
+                        help="log store layout to query (see DataRetrievalTools.PartitionedStore)")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per case")
+    parser.add_argument("--ingest-iterations", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent callers in search and http")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="ingest CSV chunk size")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="generated logs, indexes and caches; reused across runs")
+    parser.add_argument("--recordings", default=None, help="recorded LLM answers to replay (JSON)")
+    parser.add_argument("--record", action="store_true", help="call OpenAI with API_KEY and add its answers to --recordings")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="stand-in LLM delay per call")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0.0, help="stand-in LLM generation speed; 0 is instant")
+    parser.add_argument("--out", default=None, help="write results JSON here (default: <workdir>/results-<commit>.json)")
+    parser.add_argument("--baseline", default=None, help="results JSON of an earlier run to compare against")
+    parser.add_argument("--only", choices=BENCHMARKS, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.record and not args.recordings:
+        parser.error("--record needs --recordings")
+
+    if args.only:
+        return run_child(args)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    if args.csv is None:
+        args.csv = os.path.join(args.workdir, f"logs-{args.rows}-{args.seed}.csv")
+        if not os.path.exists(args.csv):
+            print(f"Generating {args.rows} rows into {args.csv}")
+            generate(args.rows, args.csv + ".tmp", seed=args.seed)
+            os.replace(args.csv + ".tmp", args.csv)
+    args.csv = os.path.abspath(args.csv)
+
+    llm, llm_url = start_llm(args)
+    env = suite_environment(args, llm_url)
+    results = []
+    try:
+        for suite in ["prepare", *args.suites.split(",")]:
+            result_file = os.path.join(args.workdir, f"{suite}.json")
+            log_path = os.path.join(args.workdir, f"{suite}.log")
+            print(f"Preparing fixtures ..." if suite == "prepare" else f"Running {suite} ...", flush=True)
+            with open(log_path, "w") as log_file:
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--csv", args.csv,
+                     "--only", suite, "--result-file", result_file],
+                    cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+                )
+            if completed.returncode != 0:
+                print(f"  {suite} failed (exit {completed.returncode}), see {log_path}")
+                continue
+            with open(result_file) as f:
+                results.extend(json.load(f))
+        llm_stats = httpx.get(llm_url + "/stats").json()
+    finally:
+        llm.terminate()
+
+    commit = git_commit()
+    report = {
+        "meta": {"rows": sum(1 for _ in open(args.csv, "rb")), "csv": args.csv, "seed": args.seed, "commit": commit,
+                 "python": platform.python_version(), "cpus": os.cpu_count(), "iterations": args.iterations,
+                 "concurrency": args.concurrency, "layout": args.layout, "llm": llm_stats, "finished": time.strftime("%Y-%m-%d %H:%M:%S")},
+        "results": results,
+    }
+    out = args.out or os.path.join(args.workdir, f"results-{commit or 'local'}.json")
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    print_table(results)
+    print(f"\nLLM calls: {llm_stats}. Results written to {out}")
+    if args.baseline:
+        print_comparison(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import List
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+# Kept free of DataRetrievalTools imports: the runner has to configure the
+# environment (index root, caches, OPENAI_BASE_URL) before those load.
+
+EMBED_DIM = 384
+UPSTREAM_URL = "https://api.openai.com/v1/chat/completions"
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbedding(BaseEmbedding):
+    """Deterministic stand-in for all-MiniLM-L6-v2: hashed word and word-pair features.
+
+    Same dimension and unit norm as the real model, no download and no torch,
+    so index builds and retrieval can be timed anywhere. Texts sharing words
+    land close together, which keeps filtered/top-k retrieval meaningful.
+    """
+
+    def __init__(self, dim=EMBED_DIM, **kwargs):
+        super().__init__(model_name=f"hash-{dim}", **kwargs)
+        self._dim = dim
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashEmbedding"
+
+    def vector(self, text):
+        words = _WORD.findall(text.lower())
+        vector = np.zeros(self._dim, dtype=np.float32)
+        for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self._dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self.vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self.vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self.vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self.vector(text) for text in texts]
+
+
+def request_key(body):
+    """Recordings are keyed on everything that decides the answer, not on stream/options"""
+    relevant = {key: body.get(key) for key in ("model", "messages", "tools", "temperature")}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _text(content):
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+AGGREGATE_WORDS = re.compile(r"\b(how many|count|number of|average|avg|sum|total|p\d\d|percentile|per|by|group|distinct|trend|over time)\b", re.I)
+SEVERITIES = {"error": "ERROR", "errors": "ERROR", "warn": "WARN", "warning": "WARN", "warnings": "WARN", "info": "INFO"}
+SERVICES = ["frontend", "ad", "cart", "accounting", "checkout", "payment", "recommendation", "shipping", "email", "fraud-detection"]
+
+
+def query_plan_for(question):
+    """The QueryPlan a careful model would write for the benchmark's questions"""
+    lowered = question.lower()
+    filters = {}
+    for word, severity in SEVERITIES.items():
+        if re.search(rf"\b{word}\b", lowered):
+            filters["SeverityText_exact"] = severity
+            break
+    for service in SERVICES:
+        # "shipping cost" is an order metric, not the shipping service.
+        if re.search(rf"\b{re.escape(service)}\b", lowered.replace("shipping cost", "")):
+            filters["ServiceName_exact"] = service
+            break
+    plan = {"filters": filters}
+    if "shipping cost" in lowered:
+        plan["aggregation"] = {"group_by": "order.currencyCode",
+                               "metrics": [{"op": "p95", "column": "order.shippingCost"}, {"op": "avg", "column": "order.shippingCost"}]}
+    elif "pod" in lowered:
+        plan["aggregation"] = {"metrics": [{"op": "approx_distinct", "column": "k8s.pod.name"}]}
+    elif re.search(r"\b(per|each|every) (hour|minute)\b|over time|trend", lowered):
+        bucket = "1m" if "minute" in lowered else "1h"
+        plan["aggregation"] = {"group_by": ["timestamp_full", "ServiceName"], "time_bucket": bucket, "count": True}
+    elif re.search(r"\b(per|by|each) service\b", lowered):
+        plan["aggregation"] = {"group_by": "ServiceName", "count": True}
+    elif AGGREGATE_WORDS.search(lowered):
+        plan["aggregation"] = {"count": True}
+    else:
+        plan["limit"] = 20
+    return plan
+
+
+def rule_response(body):
+    """(message, finish_reason) from fixed rules, for requests with no recording"""
+    messages = body.get("messages") or []
+    last = messages[-1] if messages else {}
+    tools = [tool["function"]["name"] for tool in body.get("tools") or []]
+    system = " ".join(_text(m.get("content")) for m in messages if m.get("role") == "system")
+
+    if tools and last.get("role") == "user":
+        # Agent turn: call the structured-query tool for aggregate questions, semantic search otherwise.
+        question = _text(last.get("content"))
+        wanted = "QueryLogs" if AGGREGATE_WORDS.search(question) else "SearchLogs"
+        name = next((tool for tool in tools if tool.startswith(wanted)), tools[0])
+        call = {"id": "call_" + request_key(body)[:24], "type": "function",
+                "function": {"name": name, "arguments": json.dumps({"prompt": question})}}
+        return {"role": "assistant", "content": None, "tool_calls": [call]}, "tool_calls"
+    if last.get("role") == "tool":
+        result = _text(last.get("content"))
+        return {"role": "assistant", "content": "Here is what the logs show:\n\n" + result[:600]}, "stop"
+    if "QueryPlan" in system:
+        question = _text(last.get("content"))
+        try:
+            question = json.loads(question)
+        except json.JSONDecodeError:
+            pass
+        return {"role": "assistant", "content": json.dumps(query_plan_for(str(question)))}, "stop"
+    prompt = _text(last.get("content"))
+    if prompt.rstrip().endswith("Structured Request:"):
+        # LlamaIndex auto-retriever: no filters, query as asked.
+        query = prompt.rsplit("User Query:", 1)[-1].rsplit("Structured Request:", 1)[0].strip()
+        spec = {"query": query, "filters": [], "top_k": None}
+        return {"role": "assistant", "content": "```json\n" + json.dumps(spec) + "\n```"}, "stop"
+    return {"role": "assistant", "content": "OK"}, "stop"
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StandInLLM:
+    """OpenAI chat completions answered from recordings, or from rule_response when none matches.
+
+    mode "replay" never leaves the machine. mode "record" forwards each request
+    to OpenAI (non-streaming) and stores the answer under request_key, so a later
+    replay of the same benchmark run gets the real model's plans and tool calls.
+    """
+
+    def __init__(self, recordings_path=None, mode="replay", latency_ms=0.0, tokens_per_second=0.0, upstream_api_key=None):
+        self.recordings_path = recordings_path
+        self.mode = mode
+        self.latency = latency_ms / 1000
+        self.token_delay = 1 / tokens_per_second if tokens_per_second else 0.0
+        self.upstream_api_key = upstream_api_key
+        self.recordings = {}
+        self.counts = {"replayed": 0, "recorded": 0, "rules": 0}
+        self._lock = threading.Lock()
+        if recordings_path and os.path.exists(recordings_path):
+            with open(recordings_path) as f:
+                self.recordings = json.load(f)
+
+    def save(self):
+        with self._lock, open(self.recordings_path + ".tmp", "w") as f:
+            json.dump(self.recordings, f, indent=1, sort_keys=True)
+        os.replace(self.recordings_path + ".tmp", self.recordings_path)
+
+    async def answer(self, body):
+        """(message, finish_reason, usage)"""
+        key = request_key(body)
+        recorded = self.recordings.get(key)
+        if recorded is not None:
+            self.counts["replayed"] += 1
+        elif self.mode == "record":
+            recorded = await self._record(key, body)
+            self.counts["recorded"] += 1
+        if recorded is not None:
+            return recorded["message"], recorded["finish_reason"], recorded["usage"]
+        self.counts["rules"] += 1
+        message, finish_reason = rule_response(body)
+        prompt = sum(_tokens(_text(m.get("content"))) for m in body.get("messages") or [])
+        completion = _tokens(message.get("content") or json.dumps(message.get("tool_calls")))
+        return message, finish_reason, {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+    async def _record(self, key, body):
+        request = {k: v for k, v in body.items() if k not in ("stream", "stream_options")}
+        async with httpx.AsyncClient(timeout=120) as client:
+            response = await client.post(UPSTREAM_URL, json=request,
+                                         headers={"Authorization": f"Bearer {self.upstream_api_key}"})
+        response.raise_for_status()
+        choice = response.json()["choices"][0]
+        message = {k: v for k, v in choice["message"].items() if k in ("role", "content", "tool_calls")}
+        usage = response.json().get("usage") or {}
+        recorded = {"message": message, "finish_reason": choice["finish_reason"],
+                    "usage": {k: usage.get(k, 0) for k in ("prompt_tokens", "completion_tokens", "total_tokens")}}
+        self.recordings[key] = recorded
+        self.save()
+        return recorded
+
+    async def stream(self, body, message, finish_reason, usage):
+        """The answer as OpenAI's server-sent chunks: role, content pieces or tool calls, finish, usage"""
+        base = {"id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": body.get("model", "gpt-4o")}
+
+        def chunk(delta, finish=None):
+            return "data: " + json.dumps(dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish}])) + "\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        content = message.get("content") or ""
+        for start in range(0, len(content), 16):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay * 4)
+            yield chunk({"content": content[start:start + 16]})
+        for index, call in enumerate(message.get("tool_calls") or []):
+            yield chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                         "function": {"name": call["function"]["name"], "arguments": call["function"]["arguments"]}}]})
+        yield chunk({}, finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield "data: " + json.dumps(dict(base, choices=[], usage=usage)) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    def app(self):
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        @app.post("/chat/completions")
+        async def chat_completions(request: Request):
+            body = await request.json()
+            message, finish_reason, usage = await self.answer(body)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if body.get("stream"):
+                return StreamingResponse(self.stream(body, message, finish_reason, usage), media_type="text/event-stream")
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay * usage["completion_tokens"])
+            return JSONResponse({
+                "id": "chatcmpl-" + uuid.uuid4().hex, "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "gpt-4o"),
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        @app.get("/stats")
+        async def stats():
+            return self.counts
+
+        return app
+
+
+def serve(llm, host="127.0.0.1", port=8765):
+    uvicorn.run(llm.app(), host=host, port=port, log_level="warning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in LLM for the benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", default=None, help="JSON file of recorded answers")
+    parser.add_argument("--mode", choices=("replay", "record"), default="replay")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="added before every answer, like network + queueing")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="simulated generation speed; 0 is instant")
+    args = parser.parse_args()
+    if args.mode == "record" and not args.recordings:
+        parser.error("--mode record needs --recordings")
+    # Recording talks to the real API with the key the app would use.
+    llm = StandInLLM(args.recordings, args.mode, args.latency_ms, args.tokens_per_second,
+                     upstream_api_key=os.getenv("OPENAI_RECORD_API_KEY") or os.getenv("API_KEY"))
+    serve(llm, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+# QuerySearch builds its OpenAI client at import; the tests never call it.
+os.environ.setdefault("API_KEY", "unused")
+
+# Slow enough that the logs span a few hours, so the partitioned layout gets several partitions.
+LOG_ROWS = 6000
+ROWS_PER_SECOND = 0.5
+
+
+@pytest.fixture(scope="session")
+def log_csv(tmp_path_factory):
+    from benchmarks.generatelogs import generate
+    return generate(LOG_ROWS, str(tmp_path_factory.mktemp("logs") / "logs.csv"), seed=7, rows_per_second=ROWS_PER_SECOND)
+
+
+@pytest.fixture(scope="session")
+def memory_store(log_csv, tmp_path_factory):
+    from DataRetrievalTools.LogStore import LogStore
+    return LogStore.build(log_csv, str(tmp_path_factory.mktemp("store")))
+
+
+@pytest.fixture(scope="session")
+def partitioned_store(log_csv, tmp_path_factory):
+    from DataRetrievalTools.PartitionedStore import PartitionedLogStore
+    return PartitionedLogStore.build(log_csv, str(tmp_path_factory.mktemp("partitions")))
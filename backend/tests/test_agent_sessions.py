@@ -0,0 +1,35 @@
+import asyncio
+import os
+import pytest
+
+# conftest fills API_KEY with a placeholder so QuerySearch imports; that is not a usable key.
+if os.getenv("API_KEY") in (None, "", "unused", "stand-in"):
+    pytest.skip("needs API_KEY and the configured MCP servers", allow_module_level=True)
+pytest.importorskip("FastAgent.agent", exc_type=ImportError)
+
+from FastAgent.agent import AGENT_NAME, fast, new_agent_app, record_turn, release_agents
+
+
+def test_record_turn_adds_one_pair():
+    async def run():
+        async with fast.run():
+            agent_app, agents = await new_agent_app()
+            await record_turn(agent_app, "how many errors?", "12")
+            history = agent_app[AGENT_NAME].message_history
+            assert [m.role for m in history] == ["user", "assistant"]
+            release_agents(agents)
+
+    asyncio.run(run())
+
+
+def test_reset_session_keeps_other_sessions_tools():
+    async def run():
+        async with fast.run():
+            _, first_agents = await new_agent_app()
+            second, _ = await new_agent_app()
+            release_agents(first_agents)
+            assert fast.context._connection_manager is not None
+            result = await second[AGENT_NAME].call_tool("SearchLogsServer-search_logs", {"prompt": "error logs"})
+            assert not result.isError
+
+    asyncio.run(run())
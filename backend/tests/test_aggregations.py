@@ -0,0 +1,26 @@
+import pytest
+from DataRetrievalTools.Aggregations import parse_metric
+from DataRetrievalTools.QuerySearch import apply_filters
+
+
+@pytest.mark.parametrize("op", ["sum", "avg", "min", "max", "median", "p95", "p99.9", "distinct", "approx_distinct"])
+def test_metrics_other_than_count_need_a_column(op):
+    with pytest.raises(ValueError, match="needs a column"):
+        parse_metric({"op": op})
+
+
+def test_count_and_quantiles_parse():
+    assert parse_metric({"op": "count"}) == ("count", None, None)
+    assert parse_metric({"op": "MEDIAN", "column": "duration"}) == ("median", "duration", 0.5)
+    assert parse_metric({"op": "p95", "column": "duration"}) == ("p95", "duration", 0.95)
+    with pytest.raises(ValueError, match="Unknown metric op"):
+        parse_metric({"op": "mode", "column": "duration"})
+
+
+@pytest.mark.parametrize("store", ["memory_store", "partitioned_store"])
+@pytest.mark.parametrize("op", ["median", "p95"])
+def test_quantile_without_a_column_is_an_error_result(request, store, op):
+    store = request.getfixturevalue(store)
+    for group_by in (None, "ServiceName"):
+        aggregation = {"group_by": group_by, "metrics": [{"op": op}]}
+        assert apply_filters(store, {}, aggregation) == {"error": f"Metric {op} needs a column"}
@@ -0,0 +1,73 @@
+import pytest
+from llama_index.core.vector_stores.types import FilterOperator
+from DataRetrievalTools.FilterExtractor import FilterExtractor
+
+VOCABULARY = {
+    "ServiceName": ["cart", "checkout", "ad", "UNAVAILABLE"],
+    "SeverityText": ["ERROR", "INFO", "WARN"],
+    "process_runtime": ["OpenJDK Runtime Environment"],
+}
+ANCHOR = "2025-06-08 12:00:00"
+
+
+@pytest.fixture
+def extractor():
+    return FilterExtractor(VOCABULARY, ANCHOR)
+
+
+def filters(spec):
+    return {(f.key, f.operator, str(f.value)) for f in spec.filters}
+
+
+def test_relative_window_and_values(extractor):
+    spec = extractor.extract("error logs from cart in the last 10 minutes")
+    assert filters(spec) == {
+        ("timestamp", FilterOperator.GTE, "2025-06-08 11:50:00"),
+        ("ServiceName", FilterOperator.EQ, "cart"),
+        ("SeverityText", FilterOperator.EQ, "ERROR"),
+    }
+    assert spec.query == ""
+
+
+def test_between_clock_times_cover_the_last_minute(extractor):
+    spec = extractor.extract("checkout warnings between 11:00 and 11:05")
+    assert ("timestamp", FilterOperator.GTE, "2025-06-08 11:00:00") in filters(spec)
+    assert ("timestamp", FilterOperator.LT, "2025-06-08 11:06:00") in filters(spec)
+
+
+def test_at_hour_and_date(extractor):
+    assert filters(extractor.extract("errors at 11am")) >= {
+        ("timestamp", FilterOperator.GTE, "2025-06-08 11:00:00"),
+        ("timestamp", FilterOperator.LT, "2025-06-08 12:00:00"),
+    }
+    assert filters(extractor.extract("logs on 2025-06-07")) == {
+        ("timestamp", FilterOperator.GTE, "2025-06-07 00:00:00"),
+        ("timestamp", FilterOperator.LT, "2025-06-08 00:00:00"),
+    }
+
+
+def test_short_service_names_need_the_word_service(extractor):
+    assert filters(extractor.extract("ad service errors")) >= {("ServiceName", FilterOperator.EQ, "ad")}
+    assert "ServiceName" not in {key for key, _, _ in filters(extractor.extract("errors loading an ad banner"))}
+
+
+@pytest.mark.parametrize("prompt", [
+    "I am seeing errors in cart",
+    "errors after checkout",
+    "payment failed before checkout in cart",
+    "timeouts during checkout",
+    "cart will retry later",
+])
+def test_ordinary_words_are_not_time_cues(extractor, prompt):
+    assert extractor.extract(prompt) is not None
+
+
+@pytest.mark.parametrize("prompt", [
+    "errors from yesterday",
+    "errors after 13pm",
+    "cart errors before noon",
+    "errors since the deploy an hour ago",
+    "errors in the last week",
+])
+def test_unresolved_time_falls_back_to_the_llm(extractor, prompt):
+    assert extractor.extract(prompt) is None
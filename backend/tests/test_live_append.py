@@ -0,0 +1,83 @@
+import json
+import random
+import numpy as np
+from DataRetrievalTools.LiveIngest import parse_rows
+from DataRetrievalTools.LogStore import LogStore, convert_log_frame
+from DataRetrievalTools.QuerySearch import apply_filters
+
+BASE_ROWS = 3600
+CHUNK_ROWS = 700
+
+PLANS = [
+    ({}, {"count": True}),
+    ({"SeverityText_exact": "ERROR"}, {"count": True, "group_by": "ServiceName"}),
+    ({"ServiceName_exact": "cart"}, {"count": True, "group_by": ["timestamp_full", "SeverityText"], "time_bucket": "1m"}),
+    ({}, {"group_by": "order.currencyCode", "metrics": [{"op": "sum", "column": "order.shippingCost"}]}),
+    ({"k8s.deployment.name_exact": "checkout"}, {"count": True}),
+]
+
+
+def dumps(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def live_store(log_csv, tmp_path, shuffle=False):
+    """A store built from the first BASE_ROWS lines, with the rest appended CHUNK_ROWS at a time"""
+    with open(log_csv, "rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    head, tail = lines[:BASE_ROWS], lines[BASE_ROWS:]
+    if shuffle:
+        random.Random(1).shuffle(tail)
+    base_csv = tmp_path / "base.csv"
+    base_csv.write_bytes(b"".join(head))
+    store = LogStore.build(str(base_csv), str(tmp_path / "store"))
+    snapshots = [store]
+    for start in range(0, len(tail), CHUNK_ROWS):
+        rows = parse_rows(str(base_csv), b"".join(tail[start:start + CHUNK_ROWS]))
+        store = store.appended(convert_log_frame(rows), str(base_csv))
+        snapshots.append(store)
+    return snapshots
+
+
+def assert_same_indexes(store, full):
+    assert store.rollup.counts.sum() == full.rollup.counts.sum()
+    for column, index in full.bitmaps.items():
+        appended = store.bitmaps[column]
+        assert appended.n_rows == index.n_rows, column
+        for value, bits in index.bitmaps.items():
+            assert np.array_equal(appended.bitmaps[value], bits), (column, value)
+
+
+def test_in_order_appends_match_a_rebuild(log_csv, memory_store, tmp_path):
+    snapshots = live_store(log_csv, tmp_path)
+    store = snapshots[-1]
+    assert len(store.df) == len(memory_store.df)
+    assert store.sources == {str(tmp_path / "base.csv"): len(memory_store.df)}
+    assert store.df.astype(object).equals(memory_store.df.astype(object))
+    assert_same_indexes(store, memory_store)
+    for filters, aggregation in PLANS + [({"SeverityText_exact": "INFO"}, None)]:
+        assert dumps(apply_filters(store, filters, aggregation, offset=50)) == \
+            dumps(apply_filters(memory_store, filters, aggregation, offset=50))
+    # Every earlier snapshot's row ids still hold, so its cursors do too.
+    assert [s.version for s in snapshots[:-1]] == list(store.ancestors)
+
+
+def test_late_rows_match_a_rebuild(log_csv, memory_store, tmp_path):
+    store = live_store(log_csv, tmp_path, shuffle=True)[-1]
+    assert store.ancestors == ()
+    assert np.all(np.diff(store.timestamps) >= 0)
+    assert_same_indexes(store, memory_store)
+    for filters, aggregation in PLANS:
+        assert dumps(apply_filters(store, filters, aggregation)) == dumps(apply_filters(memory_store, filters, aggregation))
+
+
+def test_checkpoint_reopens_the_same_snapshot(log_csv, tmp_path):
+    store = live_store(log_csv, tmp_path)[-1]
+    saved = store.checkpoint()
+    reopened = LogStore.open(str(tmp_path / "store"))
+    assert saved.version == reopened.version
+    assert store.version in saved.ancestors
+    assert reopened.sources == store.sources
+    assert reopened.df.astype(object).equals(store.df.astype(object))
+    for filters, aggregation in PLANS:
+        assert dumps(apply_filters(reopened, filters, aggregation)) == dumps(apply_filters(store, filters, aggregation))
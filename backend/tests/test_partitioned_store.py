@@ -0,0 +1,71 @@
+import json
+import pytest
+from DataRetrievalTools import PartitionedStore
+from DataRetrievalTools.QuerySearch import apply_filters
+
+
+def rounded(value):
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+def same(a, b):
+    return json.dumps(rounded(a), sort_keys=True, default=str) == json.dumps(rounded(b), sort_keys=True, default=str)
+
+
+def window(store, start_fraction, end_fraction):
+    times = store.df['timestamp_full']
+    return {"start": str(times.iloc[int(start_fraction * (len(times) - 1))]),
+            "end": str(times.iloc[int(end_fraction * (len(times) - 1))])}
+
+
+PLANS = [
+    ({}, None),
+    ({"SeverityText_exact": "ERROR"}, None),
+    ({"ServiceName_exact": "cart"}, {"count": True}),
+    ({"ServiceName_exact": "no-such-service"}, {"count": True}),
+    ({}, {"count": True, "group_by": "ServiceName"}),
+    ({}, {"count": True, "group_by": ["timestamp_full", "SeverityText"], "time_bucket": "15m"}),
+    ({"SeverityText_exact": "INFO"}, {"group_by": "order.currencyCode",
+                                      "metrics": [{"op": "sum", "column": "order.shippingCost"},
+                                                  {"op": "avg", "column": "order.itemCount"},
+                                                  {"op": "distinct", "column": "k8s.pod.name"}]}),
+    ({}, {"metrics": [{"op": "count"}, {"op": "max", "column": "order.totalQuantity"}]}),
+]
+
+
+@pytest.mark.parametrize("filters, aggregation", PLANS)
+@pytest.mark.parametrize("time_range", [None, (0.2, 0.35), (0.1, 0.9)])
+def test_layouts_agree(memory_store, partitioned_store, filters, aggregation, time_range):
+    assert len(partitioned_store.partitions) > 1
+    if time_range:
+        filters = dict(filters, timestamp_full_range=window(memory_store, *time_range))
+    for offset in (0, 37):
+        expected = apply_filters(memory_store, filters, aggregation, limit=25, offset=offset)
+        assert same(apply_filters(partitioned_store, filters, aggregation, limit=25, offset=offset), expected)
+
+
+def test_parallel_scan_agrees(memory_store, partitioned_store, monkeypatch):
+    monkeypatch.setattr(PartitionedStore, "PARALLEL_MIN_ROWS", 0)
+    monkeypatch.setattr(PartitionedStore, "QUERY_WORKERS", 2)
+    try:
+        for filters, aggregation in PLANS:
+            assert same(apply_filters(partitioned_store, filters, aggregation),
+                        apply_filters(memory_store, filters, aggregation))
+        assert PartitionedStore.query_pool.ready
+    finally:
+        if PartitionedStore.query_pool.ready:
+            PartitionedStore.query_pool.get().shutdown()
+        PartitionedStore.query_pool.reset()
+
+
+def test_pruned_windows_count_nothing(memory_store, partitioned_store):
+    filters = {"timestamp_full_range": {"start": "2001-01-01 00:00:00", "end": "2001-01-02 00:00:00"}}
+    for aggregation in (None, {"count": True}, {"metrics": [{"op": "sum", "column": "order.shippingCost"}]}):
+        assert same(apply_filters(partitioned_store, filters, aggregation),
+                    apply_filters(memory_store, filters, aggregation))
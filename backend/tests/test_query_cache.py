@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+from DataRetrievalTools.QueryCache import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PlanCache, canonical_plan, decode_cursor, encode_cursor, plan_key
+)
+
+
+def test_equivalent_plans_share_a_key():
+    a = {
+        "filters": {"SeverityText": "ERROR", "ServiceName": None,
+                    "timestamp_full_range": {"start": "2025-06-08 11:00", "end": None}},
+        "aggregation": {"group_by": "ServiceName", "count": True, "time_bucket": "5m",
+                        "metrics": [{"op": "AVG", "column": "duration"}]},
+        "columns": "message",
+    }
+    b = {
+        "columns": ["message"],
+        "limit": DEFAULT_PAGE_SIZE,
+        "offset": 0,
+        "aggregation": {"count": True, "group_by": "ServiceName", "metrics": [{"column": "duration", "op": "avg"}]},
+        "filters": {"timestamp_full_range": {"start": "2025-06-08T11:00:00"}, "SeverityText": "ERROR"},
+    }
+    assert canonical_plan(a) == canonical_plan(b)
+    assert plan_key(canonical_plan(a)) == plan_key(canonical_plan(b))
+    # time_bucket only matters when grouping by time.
+    assert canonical_plan(a)["aggregation"]["time_bucket"] is None
+
+
+def test_plans_from_another_planner_version_are_not_served(tmp_path):
+    path = str(tmp_path / "plans.sqlite")
+    plan = {"aggregation": {"count": True}}
+    PlanCache(path, version="a").set("How many errors?", None, plan)
+    assert PlanCache(path, version="a").get("How many errors") == plan
+    assert PlanCache(path, version="b").get("How many errors?") is None
+
+
+def test_different_filters_get_different_keys():
+    assert plan_key(canonical_plan({"filters": {"SeverityText": "ERROR"}})) != \
+        plan_key(canonical_plan({"filters": {"SeverityText": "WARN"}}))
+
+
+@pytest.mark.parametrize("limit, offset, expected", [
+    (None, None, (DEFAULT_PAGE_SIZE, 0)),
+    ("all", "none", (DEFAULT_PAGE_SIZE, 0)),
+    ("10 rows", "20", (10, 20)),
+    (25.0, 5, (25, 5)),
+    (0, -3, (DEFAULT_PAGE_SIZE, 0)),
+    (10 ** 6, 0, (MAX_PAGE_SIZE, 0)),
+])
+def test_paging_values_are_parsed_defensively(limit, offset, expected):
+    plan = canonical_plan({"filters": {}, "limit": limit, "offset": offset})
+    assert (plan["limit"], plan["offset"]) == expected
+
+
+def test_cursor_round_trip():
+    plan = canonical_plan({"filters": {"SeverityText": "ERROR"}, "limit": 50, "offset": 100})
+    decoded, version = decode_cursor(encode_cursor(plan, "abc123"))
+    assert decoded == plan and version == "abc123"
+    assert plan_key(decoded) == plan_key(plan)
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", "e30=", ""])
+def test_foreign_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.fixture
+def served_store(memory_store):
+    from DataRetrievalTools import QuerySearch
+    QuerySearch.log_store.set(memory_store)
+    yield memory_store
+    QuerySearch.log_store.reset()
+
+
+def test_cursor_pages_through_every_row(served_store):
+    from DataRetrievalTools.QuerySearch import getquery, run_query_plan
+    plan = {"filters": {"SeverityText_exact": "INFO"}, "limit": 400, "columns": ["timestamp_full", "message"]}
+    page = run_query_plan(served_store, plan)
+    logs = list(page["logs"])
+    while "next_cursor" in page:
+        page = asyncio.run(getquery("ignored: the cursor carries the plan", cursor=page["next_cursor"]))
+        assert "error" not in page
+        logs.extend(page["logs"])
+    expected = served_store.df[served_store.df['SeverityText'] == "INFO"]
+    assert page["count"] == len(logs) == len(expected) > MAX_PAGE_SIZE
+    assert [log["timestamp_full"] for log in logs] == expected['timestamp_full'].astype(str).tolist()
+    assert [log["message"] for log in logs] == expected['message'].tolist()
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+from DataRetrievalTools.QuerySearch import apply_filters, rollup_time_buckets
+
+
+def pandas_buckets(store, start, end, freq, split_by=(), filters=None):
+    df = store.df
+    mask = df['timestamp_full'].between(pd.Timestamp(start), pd.Timestamp(end))
+    for column, value in (filters or {}).items():
+        mask &= df[column] == value
+    rows = df[mask]
+    keys = [rows['timestamp_full'].dt.floor(freq)] + [rows[column] for column in split_by]
+    counts = rows.groupby(keys, observed=True).size()
+    return {
+        (str(key[0]) if isinstance(key, tuple) else str(key),) + (key[1:] if isinstance(key, tuple) else ()): int(n)
+        for key, n in counts.items() if n
+    }
+
+
+def rollup_buckets(result, split_by=()):
+    return {(entry["time_bucket"],) + tuple(entry[c] for c in split_by): entry["count"] for entry in result["results"]}
+
+
+@pytest.mark.parametrize("start_offset, end_offset, whole_minutes", [
+    ("0s", "59min 59.999s", True),
+    ("17.25s", "41min 3.5s", True),    # partial minutes at both edges
+    ("59.999s", "1min 0.001s", False),  # two adjacent partial minutes
+    ("30s", "45s", False),               # inside one minute
+])
+@pytest.mark.parametrize("time_bucket, freq", [("1m", "1min"), ("5m", "5min"), ("1h", "1h")])
+def test_edge_minutes_match_pandas(memory_store, start_offset, end_offset, whole_minutes, time_bucket, freq):
+    base = memory_store.df['timestamp_full'].iloc[len(memory_store.df) // 3].floor("1min")
+    start, end = base + pd.Timedelta(start_offset), base + pd.Timedelta(end_offset)
+    filters = {"timestamp_full_range": {"start": str(start), "end": str(end)}}
+    aggregation = {"group_by": "timestamp_full", "count": True, "time_bucket": time_bucket}
+    # Windows without a whole minute are left to the row scan.
+    assert (rollup_time_buckets(memory_store, filters, aggregation) is not None) == whole_minutes
+    result = apply_filters(memory_store, filters, aggregation)
+    assert rollup_buckets(result) == pandas_buckets(memory_store, start, end, freq)
+
+
+def test_split_and_filtered_buckets_match_pandas(memory_store):
+    first, last = memory_store.df['timestamp_full'].iloc[[100, -100]]
+    start, end = first + pd.Timedelta("7.5s"), last - pd.Timedelta("12.25s")
+    filters = {"timestamp_full_range": {"start": str(start), "end": str(end)}, "SeverityText_exact": "INFO"}
+    aggregation = {"group_by": ["timestamp_full", "ServiceName"], "count": True, "time_bucket": "15m"}
+    result = rollup_time_buckets(memory_store, filters, aggregation)
+    assert result is not None
+    expected = pandas_buckets(memory_store, start, end, "15min", ["ServiceName"], {"SeverityText": "INFO"})
+    assert rollup_buckets(result, ["ServiceName"]) == expected
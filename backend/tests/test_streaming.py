@@ -0,0 +1,31 @@
+import asyncio
+from FastAgent.streaming import TurnStream
+
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def test_follower_gets_shared_turn_events_from_the_start():
+    leader = TurnStream()
+    own, joined = asyncio.Queue(), asyncio.Queue()
+    with leader.capture(own), leader.shared():
+        leader.emit("token", {"text": "Twelve"})
+        with leader.follow(joined):
+            leader.emit("token", {"text": " errors"})
+        leader.emit("token", {"text": "."})
+    assert [data["text"] for _, data in drain(own)] == ["Twelve", " errors", "."]
+    assert [data["text"] for _, data in drain(joined)] == ["Twelve", " errors"]
+    assert leader.replay is None and leader.followers == []
+
+
+def test_unshared_turn_is_not_kept():
+    stream = TurnStream()
+    joined = asyncio.Queue()
+    stream.emit("token", {"text": "x"})
+    with stream.follow(joined):
+        stream.emit("token", {"text": "y"})
+    assert drain(joined) == []
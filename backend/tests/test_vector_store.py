@@ -0,0 +1,124 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from DataRetrievalTools.VectorStore import VECTORS_FILE, MmapVectorStore
+
+
+def nodes(start, count, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dim))
+    return [TextNode(id_=f"n{start + i}", text=f"row {start + i}", embedding=vector.tolist())
+            for i, vector in enumerate(vectors)]
+
+
+def test_retraining_leaves_an_open_reader_untouched(tmp_path):
+    writer = MmapVectorStore(str(tmp_path))
+    writer.add(nodes(0, 400))
+    writer.train()
+    reader = MmapVectorStore(str(tmp_path), read_only=True)
+    reader.warm()
+    before = np.array(reader._assignments)
+
+    writer.add(nodes(400, 2000, seed=1))
+    writer.train()
+
+    assert np.array_equal(np.asarray(reader._assignments), before)
+    assert not np.array_equal(np.asarray(writer._assignments)[:400], before)
+    reopened = MmapVectorStore(str(tmp_path), read_only=True)
+    assert np.array_equal(np.asarray(reopened._assignments), np.asarray(writer._assignments))
+
+
+def test_only_the_writer_cuts_uncommitted_rows(tmp_path):
+    writer = MmapVectorStore(str(tmp_path))
+    writer.add(nodes(0, 200))
+    vectors = tmp_path / VECTORS_FILE
+    committed = vectors.stat().st_size
+    # The writer has appended ten rows' vectors but not yet committed them.
+    with open(vectors, "ab") as f:
+        f.write(np.zeros((10, 16), dtype=np.float32).tobytes())
+
+    reader = MmapVectorStore(str(tmp_path), read_only=True)
+    assert reader.size() == 200
+    assert vectors.stat().st_size == committed + 10 * 16 * 4
+    with pytest.raises(ValueError):
+        MmapVectorStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        reader.add(nodes(200, 1))
+
+    writer.close()
+    MmapVectorStore(str(tmp_path)).close()
+    assert vectors.stat().st_size == committed
+
+
+def test_refresh_picks_up_committed_rows(tmp_path):
+    writer = MmapVectorStore(str(tmp_path))
+    writer.add(nodes(0, 200))
+    reader = MmapVectorStore(str(tmp_path), read_only=True)
+    added = nodes(200, 50, seed=3)
+    writer.add(added)
+    query = VectorStoreQuery(query_embedding=added[0].embedding, similarity_top_k=1)
+
+    assert reader.size() == 200
+    assert reader.query(query).ids != ["n200"]
+    reader.refresh()
+    assert reader.size() == 250
+    assert reader.query(query).ids == ["n200"]
+
+
+def test_async_queries_run_off_the_event_loop(tmp_path, monkeypatch):
+    store = MmapVectorStore(str(tmp_path))
+    store.add(nodes(0, 200))
+    query = VectorStoreQuery(query_embedding=nodes(0, 1, seed=5)[0].embedding, similarity_top_k=3)
+    query_once = MmapVectorStore._query
+
+    def slow_query(self, query):
+        time.sleep(0.3)
+        return query_once(self, query)
+
+    monkeypatch.setattr(MmapVectorStore, "_query", slow_query)
+
+    async def run():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.perf_counter()
+        results = await asyncio.gather(*(store.aquery(query) for _ in range(4)))
+        elapsed = time.perf_counter() - started
+        ticker.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(run())
+    assert all(len(result.nodes) == 3 for result in results)
+    # Four 0.3 s searches in well under 1.2 s, with the loop free to run other work meanwhile.
+    assert elapsed < 0.9
+    assert ticks >= 10
+
+
+def test_concurrent_searches_score_in_parallel(tmp_path, monkeypatch):
+    store = MmapVectorStore(str(tmp_path))
+    store.add(nodes(0, 200))
+    query = VectorStoreQuery(query_embedding=nodes(0, 1, seed=5)[0].embedding, similarity_top_k=3)
+    score_once = MmapVectorStore._score
+
+    def slow_score(self, *args):
+        time.sleep(0.3)
+        return score_once(self, *args)
+
+    monkeypatch.setattr(MmapVectorStore, "_score", slow_score)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: store.query(query), range(4)))
+    elapsed = time.perf_counter() - started
+
+    assert all(len(result.nodes) == 3 for result in results)
+    # Serialised on the store lock these would take at least 1.2 s.
+    assert elapsed < 0.9
@@ -5,6 +5,7 @@ function App() {
   const [conversation, setConversation] = useState<Message[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState('');
+  const [toolStatus, setToolStatus] = useState('');
 
 interface UserMessage {
     type: 'user';
@@ -26,6 +27,30 @@ interface ErrorMessage {
 
 type Message = UserMessage | AgentMessage | ErrorMessage;
 
+// Parses the server-sent events of /get_prompt/stream, calling onEvent for each one.
+const readEvents = async (body: ReadableStream<Uint8Array>, onEvent: (event: string, data: any) => void): Promise<void> => {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary: number;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const raw = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of raw.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice('event: '.length);
+                else if (line.startsWith('data: ')) data += line.slice('data: '.length);
+            }
+            if (data) onEvent(event, JSON.parse(data));
+        }
+    }
+};
+
 const handleSubmit = async (e: React.FormEvent<HTMLFormElement> | React.KeyboardEvent<HTMLInputElement>): Promise<void> => {
     e.preventDefault();
     
@@ -40,46 +65,60 @@ const handleSubmit = async (e: React.FormEvent<HTMLFormElement> | React.Keyboard
     const currentPrompt = prompt;
     setPrompt(''); 
 
+    // Empty until the first token arrives; filled in as the answer streams.
+    const agentMessage: AgentMessage = { type: 'agent', content: '', timestamp: new Date() };
+    setConversation((prev: Message[]) => [...prev, agentMessage]);
+
+    const updateAgentMessage = (update: (content: string) => string) => {
+        setConversation((prev: Message[]) => {
+            const last = prev[prev.length - 1];
+            if (!last || last.type !== 'agent') return prev;
+            return [...prev.slice(0, -1), { ...last, content: update(last.content) }];
+        });
+    };
+
     try {
-        const response: Response = await fetch("http://localhost:8000/get_prompt", {
+        const response: Response = await fetch("http://localhost:8000/get_prompt/stream", {
             method: 'POST',
+            // Sends the session cookie so the backend keeps this tab's conversation.
+            credentials: 'include',
             headers: {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({ prompt: currentPrompt }),
         });
         
-        if (!response.ok) {
+        if (!response.ok || !response.body) {
             throw new Error(`Failed to fetch: ${response.status}`);
         }
         
-        const data = await response.json();
-                
-        
-        if (data.type === 'human_input_required' || data.status === 'requires_input') {
-            const agentMessage: AgentMessage = {
-                type: 'agent',
-                content: data.prompt,
-                timestamp: new Date()
-            };
-            setConversation((prev: Message[]) => [...prev, agentMessage]);
-        }
-        
-        else if (data.status === 'success' || data.type === 'normal_response') {
-            const agentMessage: AgentMessage = {
-                type: 'agent',
-                content: data.result,
-                timestamp: new Date()
-            };
-            setConversation((prev: Message[]) => [...prev, agentMessage]);
-        }
-       
-        
-        console.log("Agent response:", data);
+        await readEvents(response.body, (event: string, data: any) => {
+            if (event === 'token') {
+                setToolStatus('');
+                updateAgentMessage((content) => content + data.text);
+            }
+            else if (event === 'tool_start') {
+                setToolStatus(`Running ${data.name}...`);
+            }
+            else if (event === 'tool_end') {
+                setToolStatus(data.is_error ? `${data.name} failed` : 'Thinking...');
+            }
+            else if (event === 'human_input_required') {
+                updateAgentMessage(() => data.prompt);
+            }
+            else if (event === 'normal_response') {
+                // The final answer replaces text streamed by earlier LLM calls in the turn.
+                updateAgentMessage(() => data.result);
+            }
+            else if (event === 'error') {
+                throw new Error(data.detail);
+            }
+        });
         
     } catch (err: any) {
         console.error(err);
         setError(`Error: ${err.message}`);
+        setConversation((prev: Message[]) => prev.filter((message) => message !== agentMessage || message.content));
         
         const errorMessage: ErrorMessage = { 
             type: 'error', 
@@ -89,6 +128,7 @@ const handleSubmit = async (e: React.FormEvent<HTMLFormElement> | React.Keyboard
         setConversation((prev: Message[]) => [...prev, errorMessage]);
     } finally {
         setIsLoading(false);
+        setToolStatus('');
     }
 };
 
@@ -97,6 +137,7 @@ const handleSubmit = async (e: React.FormEvent<HTMLFormElement> | React.Keyboard
       setIsLoading(true);
       const response = await fetch("http://localhost:8000/reset_conversation", {
         method: 'POST',
+        credentials: 'include',
         headers: {
           'Content-Type': 'application/json',
         },
@@ -144,7 +185,7 @@ const handleKeyPress = (e: KeyPressEvent): void => {
             </div>
           ) : (
             <div className="space-y-4">
-              {conversation.map((message, index) => (
+              {conversation.map((message, index) => message.content && (
                 <div key={index} className={`flex ${message.type === 'user' ? 'justify-end' : 'justify-start'}`}>
                   <div className={`max-w-3xl p-3 rounded-lg ${
                     message.type === 'user' 
@@ -168,7 +209,7 @@ const handleKeyPress = (e: KeyPressEvent): void => {
                   <div className="bg-gray-100 text-gray-800 p-3 rounded-lg">
                     <div className="flex items-center space-x-2">
                       <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-blue-500"></div>
-                      <span>Searching logs...</span>
+                      <span>{toolStatus || 'Searching logs...'}</span>
                     </div>
                   </div>
                 </div>